@@ -1,29 +1,69 @@
-from ninja import Router
+from datetime import datetime
+from typing import Optional
+
+from ninja import Router, Query
 from ninja.errors import HttpError
-from django.contrib.auth import authenticate
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.db import transaction
 from enum import Enum
-from ninja_jwt.authentication import JWTAuth
 from ninja_jwt.tokens import RefreshToken
 
-from .models import User, UserProfile
+from gymbackend.auth import AsyncJWTAuth
+from gymbackend.idempotency import idempotent
+
+from .models import User, UserProfile, BodyMeasurement
+from .metrics import METRIC_INPUT_FIELDS, refresh_body_metrics
+from .measurements import PROFILE_MEASUREMENT_FIELDS, record_profile_measurement, measurement_series
 from .schemas import (
     UserCreateSchemaIn, UserSchemaOut, AuthResponseSchema, LoginPayload,
     ProfileUpdateSchemaIn, ProfileSchemaOut, UserWithProfileResponse,
+    BodyMeasurementSchemaIn, BodyMeasurementSchemaOut, MeasurementChartSchemaOut, MeasurementMetric,
     ErrorDetail
 )
 
 auth_router = Router()
-profile_router = Router(auth=JWTAuth())
+profile_router = Router(auth=AsyncJWTAuth())
+
+
+def _profile_schema_data(profile: UserProfile) -> dict:
+    metrics = getattr(profile, 'metrics', None)
+    return {
+        "city": profile.city,
+        "birthday_date": profile.birthday_date,
+        "sex": profile.get_sex_display() if profile.sex else None,
+        "goal": profile.get_goal_display() if profile.goal else None,
+        "fitness_level": profile.get_fitness_level_display() if profile.fitness_level else None,
+        "height": profile.height,
+        "weight": profile.weight,
+        "age": metrics.age if metrics else profile.age,
+        "bmi": metrics.bmi if metrics else None,
+        "bmr": metrics.bmr if metrics else None,
+        "tdee": metrics.tdee if metrics else None,
+        "target_calories": metrics.target_calories if metrics else None,
+    }
+
+
+def _issue_tokens(user) -> dict:
+    refresh = RefreshToken.for_user(user)
+    return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+
+async def _reissue_signup_tokens(data: dict) -> dict:
+    # Replayed signups get fresh tokens; the cached response never holds credentials
+    return {"tokens": _issue_tokens(await User.objects.aget(pk=data["user"]["id"]))}
 
 
 @auth_router.post("/signup", response={201: AuthResponseSchema, 400: ErrorDetail})
-def signup(request, payload: UserCreateSchemaIn):
-    if User.objects.filter(email=payload.email).exists():
+@idempotent("accounts.signup", redact=("tokens",), reissue=_reissue_signup_tokens)
+async def signup(request, payload: UserCreateSchemaIn):
+    if await User.objects.filter(email=payload.email).aexists():
         raise HttpError(400, "Email already registered.")
-    if User.objects.filter(username=payload.username).exists():
+    if await User.objects.filter(username=payload.username).aexists():
         raise HttpError(400, "Username already taken.")
 
-    user = User.objects.create_user(
+    # Password hashing and the profile signal run in a worker thread, off the event loop
+    user = await sync_to_async(User.objects.create_user)(
         email=payload.email,
         username=payload.username,
         name=payload.name,
@@ -31,56 +71,56 @@ def signup(request, payload: UserCreateSchemaIn):
         password=payload.password
     )
 
-    refresh = RefreshToken.for_user(user)
-    tokens = {"access": str(refresh.access_token), "refresh": str(refresh)}
     user_out = UserSchemaOut.from_orm(user)
-    return 201, AuthResponseSchema(user=user_out, tokens=tokens)
+    return 201, AuthResponseSchema(user=user_out, tokens=_issue_tokens(user))
 
 
 @auth_router.post("/login", response={200: AuthResponseSchema, 401: ErrorDetail})
-def custom_login(request, payload: LoginPayload):
-    user = authenticate(request, username=payload.email, password=payload.password)
+async def custom_login(request, payload: LoginPayload):
+    user = await aauthenticate(request, username=payload.email, password=payload.password)
     if user is not None:
-        refresh = RefreshToken.for_user(user)
-        tokens = {"access": str(refresh.access_token), "refresh": str(refresh)}
         user_out = UserSchemaOut.from_orm(user)
-        return 200, AuthResponseSchema(user=user_out, tokens=tokens)
+        return 200, AuthResponseSchema(user=user_out, tokens=_issue_tokens(user))
     else:
         raise HttpError(401, "Invalid credentials")
 
 
 @profile_router.get("/profile", response={200: UserWithProfileResponse, 404: ErrorDetail})
-def get_user_profile(request):
+async def get_user_profile(request):
     user = request.auth
     try:
-        profile = UserProfile.objects.select_related('user').get(user=user)
+        profile = await UserProfile.objects.select_related('user', 'metrics').aget(user=user)
     except UserProfile.DoesNotExist:
         raise HttpError(404, "User profile not found.")
 
     user_data = UserSchemaOut.from_orm(user)
-    profile_data_for_schema = {
-        "city": profile.city,
-        "birthday_date": profile.birthday_date,
-        "sex": profile.get_sex_display() if profile.sex else None,
-        "goal": profile.get_goal_display() if profile.goal else None,
-        "fitness_level": profile.get_fitness_level_display() if profile.fitness_level else None,
-        "height": profile.height,
-        "weight": profile.weight,
-        "age": profile.age,
-    }
-    profile_out = ProfileSchemaOut(**profile_data_for_schema)
+    profile_out = ProfileSchemaOut(**_profile_schema_data(profile))
     return 200, UserWithProfileResponse(user=user_data, profile=profile_out)
 
 
+@transaction.atomic
+def _save_profile_update(user, profile, previous_measurements: dict, refresh_metrics: bool):
+    # The profile, the measurement it implies and the derived metrics are committed together
+    profile.save()
+    record_profile_measurement(
+        user, previous_measurements, {field: getattr(profile, field) for field in PROFILE_MEASUREMENT_FIELDS}
+    )
+    if refresh_metrics:
+        profile.metrics = refresh_body_metrics(profile)
+
+
 @profile_router.put("/profile", response={200: ProfileSchemaOut, 400: ErrorDetail, 404: ErrorDetail})
-def update_user_profile(request, payload: ProfileUpdateSchemaIn):
+@idempotent("accounts.profile_update")
+async def update_user_profile(request, payload: ProfileUpdateSchemaIn):
     user = request.auth
     try:
-        profile = UserProfile.objects.get(user=user)
+        profile = await UserProfile.objects.select_related('metrics').aget(user=user)
     except UserProfile.DoesNotExist:
         raise HttpError(404, "User profile not found to update.")
 
+    previous_measurements = {field: getattr(profile, field) for field in PROFILE_MEASUREMENT_FIELDS}
     updated_fields_count = 0
+    metric_inputs_changed = False
     for attr, value in payload.dict(exclude_unset=True).items():
         if value is not None:
             if hasattr(value, 'name') and isinstance(value, Enum):
@@ -88,18 +128,23 @@ def update_user_profile(request, payload: ProfileUpdateSchemaIn):
             else:
                 setattr(profile, attr, value)
             updated_fields_count += 1
+            metric_inputs_changed = metric_inputs_changed or attr in METRIC_INPUT_FIELDS
 
     if updated_fields_count > 0:
-        profile.save()
+        await sync_to_async(_save_profile_update)(user, profile, previous_measurements, metric_inputs_changed)
 
-    profile_data_for_schema = {
-        "city": profile.city,
-        "birthday_date": profile.birthday_date,
-        "sex": profile.get_sex_display() if profile.sex else None,
-        "goal": profile.get_goal_display() if profile.goal else None,
-        "fitness_level": profile.get_fitness_level_display() if profile.fitness_level else None,
-        "height": profile.height,
-        "weight": profile.weight,
-        "age": profile.age,
-    }
-    return 200, ProfileSchemaOut(**profile_data_for_schema)
\ No newline at end of file
+    return 200, ProfileSchemaOut(**_profile_schema_data(profile))
+
+
+@profile_router.post("/measurements", response={201: BodyMeasurementSchemaOut, 400: ErrorDetail})
+async def log_measurement(request, payload: BodyMeasurementSchemaIn):
+    values = payload.dict(exclude_none=True)
+    if len(values.keys() - {'measured_at'}) == 0:
+        raise HttpError(400, "At least one measurement is required.")
+    return 201, await BodyMeasurement.objects.acreate(user=request.auth, **values)
+
+
+@profile_router.get("/measurements/chart", response=MeasurementChartSchemaOut)
+async def get_measurement_chart(request, metric: MeasurementMetric = 'weight', points: int = Query(300, ge=3, le=2000),
+                                start: Optional[datetime] = None, end: Optional[datetime] = None):
+    return await sync_to_async(measurement_series)(request.auth.id, metric, points, start=start, end=end)
\ No newline at end of file
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Sequence, Tuple
+
+from .models import BodyMeasurement, MeasurementSourceChoices
+
+MEASUREMENT_FIELDS = ('weight', 'height', 'body_fat_percentage', 'waist', 'hips', 'chest', 'arm', 'thigh')
+
+# Profile fields that are also tracked as a measurement series
+PROFILE_MEASUREMENT_FIELDS = ('weight', 'height')
+
+
+def record_profile_measurement(user, previous: dict, current: dict) -> Optional[BodyMeasurement]:
+    changed = {
+        field: current[field] for field in PROFILE_MEASUREMENT_FIELDS
+        if current.get(field) is not None and current.get(field) != previous.get(field)
+    }
+    if not changed:
+        return None
+    return BodyMeasurement.objects.create(user=user, source=MeasurementSourceChoices.PROFILE.name, **changed)
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """
+    Largest-Triangle-Three-Buckets downsampling of (x, y) points sorted by x. Keeps the first and last point and,
+    per bucket, the point forming the largest triangle with the previously kept point and the next bucket's mean,
+    which preserves peaks and dips that plain averaging would flatten.
+    """
+    size = len(points)
+    if threshold >= size or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (size - 2) / (threshold - 2)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, size)
+        next_count = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / next_count
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / next_count
+
+        ax, ay = points[kept]
+        best_area, best_index = -1.0, start
+        for index in range(start, end):
+            x, y = points[index]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area, best_index = area, index
+        sampled.append(points[best_index])
+        kept = best_index
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def measurement_series(user_id: int, metric: str, max_points: int, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> dict:
+    qs = BodyMeasurement.objects.filter(user_id=user_id, **{f"{metric}__isnull": False})
+    if start:
+        qs = qs.filter(measured_at__gte=start)
+    if end:
+        qs = qs.filter(measured_at__lte=end)
+    rows = qs.order_by('measured_at').values_list('measured_at', metric)
+    points = [(measured_at.timestamp(), value) for measured_at, value in rows.iterator(chunk_size=5000)]
+    return {
+        "metric": metric,
+        "total_points": len(points),
+        "points": [{"measured_at": datetime.fromtimestamp(t, tz=dt_timezone.utc), "value": v}
+                   for t, v in lttb(points, max_points)],
+    }
@@ -0,0 +1,104 @@
+from datetime import date
+from typing import Iterable, Optional
+
+from django.utils import timezone
+
+from .models import UserProfile, BodyMetrics
+
+# Mifflin-St Jeor activity multipliers, keyed by FitnessLevelChoices name
+ACTIVITY_MULTIPLIERS = {
+    'BEGINNER': 1.375,
+    'INTERMEDIATE': 1.55,
+    'ADVANCED': 1.725,
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+# Daily calorie adjustment applied on top of TDEE, keyed by GoalChoices name
+GOAL_CALORIE_ADJUSTMENTS = {
+    'WEIGHT_LOSS': -500,
+    'MUSCLE_GAIN': 300,
+    'GENERAL_FITNESS': 0,
+    'STRENGTH_TRAINING': 200,
+    'ENDURANCE': 100,
+}
+
+# Profile fields the metrics are derived from; a change to any of them makes the row stale
+METRIC_INPUT_FIELDS = ('birthday_date', 'sex', 'goal', 'fitness_level', 'height', 'weight')
+
+METRIC_OUTPUT_FIELDS = ('age', 'bmi', 'bmr', 'tdee', 'target_calories', 'computed_at')
+
+
+def age_on(birthday_date: Optional[date], today: date) -> Optional[int]:
+    if not birthday_date:
+        return None
+    return today.year - birthday_date.year - ((today.month, today.day) < (birthday_date.month, birthday_date.day))
+
+
+def compute_body_metrics(birthday_date, sex, goal, fitness_level, height, weight, today: date) -> dict:
+    age = age_on(birthday_date, today)
+    bmi = bmr = tdee = target_calories = None
+
+    if height and weight:
+        height_m = height / 100
+        bmi = round(weight / (height_m * height_m), 1)
+
+    if height and weight and age is not None and sex:
+        sex_offset = 5 if sex == 'MALE' else -161
+        bmr = round(10 * weight + 6.25 * height - 5 * age + sex_offset)
+        tdee = round(bmr * ACTIVITY_MULTIPLIERS.get(fitness_level, DEFAULT_ACTIVITY_MULTIPLIER))
+        target_calories = tdee + GOAL_CALORIE_ADJUSTMENTS.get(goal, 0)
+
+    return {"age": age, "bmi": bmi, "bmr": bmr, "tdee": tdee, "target_calories": target_calories}
+
+
+def _upsert(rows: Iterable[BodyMetrics]):
+    BodyMetrics.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['profile'],
+        update_fields=list(METRIC_OUTPUT_FIELDS),
+    )
+
+
+def refresh_body_metrics(profile: UserProfile) -> BodyMetrics:
+    now = timezone.now()
+    values = compute_body_metrics(*(getattr(profile, field) for field in METRIC_INPUT_FIELDS), today=now.date())
+    metrics = BodyMetrics(profile=profile, computed_at=now, **values)
+    _upsert([metrics])
+    return metrics
+
+
+def _recompute_rows(rows: list, now) -> None:
+    _upsert([
+        BodyMetrics(profile_id=pk, computed_at=now, **compute_body_metrics(*inputs, today=now.date()))
+        for pk, *inputs in rows
+    ])
+
+
+def recompute_all_body_metrics(chunk_size: int = 2000) -> int:
+    """Recompute the metrics table for every profile in keyset-paginated chunks, one upsert per chunk."""
+    now = timezone.now()
+    last_pk = 0
+    processed = 0
+    while True:
+        chunk = list(
+            UserProfile.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', *METRIC_INPUT_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            break
+        _recompute_rows(chunk, now)
+        processed += len(chunk)
+        last_pk = chunk[-1][0]
+    return processed
+
+
+def recompute_body_metrics_for_users(user_id_from: int, user_id_to: int) -> int:
+    """Recompute the metrics of the profiles of users with ids in [user_id_from, user_id_to), in one upsert."""
+    rows = list(
+        UserProfile.objects.filter(user_id__gte=user_id_from, user_id__lt=user_id_to)
+        .values_list('pk', *METRIC_INPUT_FIELDS)
+    )
+    _recompute_rows(rows, timezone.now())
+    return len(rows)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_userprofile_sex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BodyMetrics',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to='accounts.userprofile')),
+                ('age', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('bmi', models.FloatField(blank=True, null=True)),
+                ('bmr', models.FloatField(blank=True, null=True)),
+                ('tdee', models.FloatField(blank=True, null=True)),
+                ('target_calories', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Body metrics',
+                'indexes': [models.Index(fields=['age'], name='accounts_bo_age_03b114_idx'), models.Index(fields=['bmi'], name='accounts_bo_bmi_893df3_idx'), models.Index(fields=['tdee'], name='accounts_bo_tdee_9dcb67_idx'), models.Index(fields=['target_calories'], name='accounts_bo_target__b255e2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_bodymetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BodyMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measured_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('weight', models.FloatField(blank=True, null=True)),
+                ('height', models.FloatField(blank=True, null=True)),
+                ('body_fat_percentage', models.FloatField(blank=True, null=True)),
+                ('waist', models.FloatField(blank=True, null=True)),
+                ('hips', models.FloatField(blank=True, null=True)),
+                ('chest', models.FloatField(blank=True, null=True)),
+                ('arm', models.FloatField(blank=True, null=True)),
+                ('thigh', models.FloatField(blank=True, null=True)),
+                ('source', models.CharField(choices=[('PROFILE', 'Profile update'), ('MANUAL', 'Manual entry')], default='MANUAL', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='body_measurements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'measured_at'], name='accounts_bo_user_id_d9f494_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Serves the admin's email prefix search (`user__email__istartswith`), which PostgreSQL compiles to
+# UPPER(email::text) LIKE 'X%'. text_pattern_ops lets LIKE prefixes use the index under any collation. Other
+# databases have no operator classes and keep using a scan.
+INDEX_NAME = 'accounts_user_email_prefix_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        table = schema_editor.quote_name(apps.get_model('accounts', 'User')._meta.db_table)
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON {table} (UPPER(email::text) text_pattern_ops)'
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY cannot run inside a transaction, and keeps the users table writable while the index builds
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0004_body_measurement'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
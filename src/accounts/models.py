@@ -24,6 +24,10 @@ class FitnessLevelChoices(Enum):
     INTERMEDIATE = "Intermediate"
     ADVANCED = "Advanced"
 
+class MeasurementSourceChoices(Enum):
+    PROFILE = "Profile update"
+    MANUAL = "Manual entry"
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, username, name, family_name, password=None, **extra_fields):
         if not email:
@@ -82,6 +86,52 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class BodyMetrics(models.Model):
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    age = models.PositiveSmallIntegerField(blank=True, null=True)
+    bmi = models.FloatField(blank=True, null=True)
+    bmr = models.FloatField(blank=True, null=True)
+    tdee = models.FloatField(blank=True, null=True)
+    target_calories = models.FloatField(blank=True, null=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "Body metrics"
+        indexes = [
+            models.Index(fields=['age']),
+            models.Index(fields=['bmi']),
+            models.Index(fields=['tdee']),
+            models.Index(fields=['target_calories']),
+        ]
+
+    def __str__(self):
+        return f"Metrics for profile {self.profile_id} (computed {self.computed_at:%Y-%m-%d})"
+
+
+class BodyMeasurement(models.Model):
+    """Append-only history of body measurements; lengths in cm, weight in kg."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='body_measurements')
+    measured_at = models.DateTimeField(default=timezone.now)
+    weight = models.FloatField(blank=True, null=True)
+    height = models.FloatField(blank=True, null=True)
+    body_fat_percentage = models.FloatField(blank=True, null=True)
+    waist = models.FloatField(blank=True, null=True)
+    hips = models.FloatField(blank=True, null=True)
+    chest = models.FloatField(blank=True, null=True)
+    arm = models.FloatField(blank=True, null=True)
+    thigh = models.FloatField(blank=True, null=True)
+    source = models.CharField(max_length=20, choices=[(tag.name, tag.value) for tag in MeasurementSourceChoices],
+                              default=MeasurementSourceChoices.MANUAL.name)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'measured_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} measurement at {self.measured_at:%Y-%m-%d}"
+
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -1,6 +1,6 @@
 from ninja import Schema
 from pydantic import EmailStr, Field, BaseModel as PydanticBaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import date, datetime
 from .models import SexChoices, GoalChoices, FitnessLevelChoices
 
@@ -53,7 +53,45 @@ class ProfileSchemaOut(Schema):
     height: Optional[float] = None
     weight: Optional[float] = None
     age: Optional[int] = None
+    bmi: Optional[float] = None
+    bmr: Optional[float] = None
+    tdee: Optional[float] = None
+    target_calories: Optional[float] = None
 
 class UserWithProfileResponse(Schema):
     user: UserSchemaOut
-    profile: ProfileSchemaOut
\ No newline at end of file
+    profile: ProfileSchemaOut
+
+class BodyMeasurementSchemaIn(Schema):
+    measured_at: Optional[datetime] = None
+    weight: Optional[float] = Field(None, gt=0, lt=500)
+    body_fat_percentage: Optional[float] = Field(None, ge=0, le=100)
+    waist: Optional[float] = Field(None, gt=0, lt=300)
+    hips: Optional[float] = Field(None, gt=0, lt=300)
+    chest: Optional[float] = Field(None, gt=0, lt=300)
+    arm: Optional[float] = Field(None, gt=0, lt=150)
+    thigh: Optional[float] = Field(None, gt=0, lt=200)
+
+class BodyMeasurementSchemaOut(Schema):
+    id: int
+    measured_at: datetime
+    weight: Optional[float] = None
+    height: Optional[float] = None
+    body_fat_percentage: Optional[float] = None
+    waist: Optional[float] = None
+    hips: Optional[float] = None
+    chest: Optional[float] = None
+    arm: Optional[float] = None
+    thigh: Optional[float] = None
+    source: str
+
+MeasurementMetric = Literal['weight', 'height', 'body_fat_percentage', 'waist', 'hips', 'chest', 'arm', 'thigh']
+
+class ChartPointSchema(Schema):
+    measured_at: datetime
+    value: float
+
+class MeasurementChartSchemaOut(Schema):
+    metric: str
+    total_points: int
+    points: List[ChartPointSchema]
\ No newline at end of file
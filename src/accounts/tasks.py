@@ -0,0 +1,23 @@
+import logging
+
+from celery import shared_task
+
+from gymbackend import batch_jobs
+from .metrics import recompute_body_metrics_for_users
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_BODY_METRICS_JOB = "accounts.recompute_body_metrics"
+
+
+@batch_jobs.sharded_job(RECOMPUTE_BODY_METRICS_JOB, chunk_size=2000)
+def _recompute_body_metrics_range(user_id_from, user_id_to):
+    return {"recomputed": recompute_body_metrics_for_users(user_id_from, user_id_to)}
+
+
+@shared_task(name="accounts.tasks.recompute_body_metrics")
+def recompute_body_metrics():
+    shards = batch_jobs.dispatch(RECOMPUTE_BODY_METRICS_JOB)
+    logger.info("Dispatched %s shards of %s", shards, RECOMPUTE_BODY_METRICS_JOB,
+                extra={"event": "accounts.body_metrics_dispatched", "count": shards})
+    return f"Dispatched {shards} shards."
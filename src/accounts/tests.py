@@ -1,9 +1,13 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 import json
-from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-from .models import SexChoices
+from .models import SexChoices, BodyMetrics, BodyMeasurement
+from .measurements import lttb
+from .metrics import compute_body_metrics, recompute_all_body_metrics
 
 User = get_user_model()
 
@@ -102,6 +106,23 @@ class AccountAPITests(TestCase):
         self.assertEqual(response.status_code, 400, response.content.decode())
         self.assertIn("Email already registered", response.json()["detail"])
 
+    def test_user_signup_retry_with_idempotency_key_is_replayed(self):
+        cache.clear()
+        with mock.patch.object(cache, "aset", wraps=cache.aset) as stored:
+            responses = [self.client.post(
+                self.SIGNUP_URL,
+                data=json.dumps(self.user_data_raw),
+                content_type="application/json",
+                headers={"Idempotency-Key": "signup-1"}
+            ) for _ in range(2)]
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(responses[0].json()["user"], responses[1].json()["user"])
+        self.assertIn("access", responses[1].json()["tokens"])
+        self.assertEqual(User.objects.filter(email=self.user_data_raw["email"]).count(), 1)
+        # Tokens are re-issued on replay rather than kept in the cache
+        self.assertNotEqual(responses[0].json()["tokens"], responses[1].json()["tokens"])
+        self.assertEqual([call.args[1]["data"].keys() for call in stored.call_args_list], [{"user"}])
+
     def test_custom_login_success(self):
         User.objects.create_user(**self.user_data_raw)
         response = self.client.post(
@@ -200,4 +221,127 @@ class AccountAPITests(TestCase):
 
         user_obj = User.objects.get(email=self.user_data_raw["email"])
         self.assertEqual(user_obj.profile.city, "Testville")
-        self.assertEqual(user_obj.profile.sex, SexChoices.MALE.name)
\ No newline at end of file
+        self.assertEqual(user_obj.profile.sex, SexChoices.MALE.name)
+
+class BodyMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="metrics@example.com", username="metricsuser", name="Metrics",
+            family_name="User", password="SecurePassword123!"
+        )
+
+    def test_compute_body_metrics(self):
+        metrics = compute_body_metrics(
+            date(1995, 6, 15), "MALE", "WEIGHT_LOSS", "INTERMEDIATE", 180.0, 80.0, today=date(2025, 6, 14)
+        )
+        self.assertEqual(metrics["age"], 29)
+        self.assertEqual(metrics["bmi"], 24.7)
+        self.assertEqual(metrics["bmr"], 1785)
+        self.assertEqual(metrics["tdee"], 2767)
+        self.assertEqual(metrics["target_calories"], 2267)
+
+    def test_compute_body_metrics_incomplete_profile(self):
+        metrics = compute_body_metrics(None, None, None, None, 170.0, 70.0, today=date(2025, 1, 1))
+        self.assertEqual(metrics["bmi"], 24.2)
+        self.assertIsNone(metrics["age"])
+        self.assertIsNone(metrics["tdee"])
+
+    def test_recompute_all_body_metrics(self):
+        profile = self.user.profile
+        profile.height, profile.weight = 170.0, 70.0
+        profile.save()
+        self.assertEqual(recompute_all_body_metrics(chunk_size=1), 1)
+        self.assertEqual(BodyMetrics.objects.get(profile=profile).bmi, 24.2)
+
+        profile.weight = 80.0
+        profile.save()
+        recompute_all_body_metrics()
+        self.assertEqual(BodyMetrics.objects.count(), 1)
+        self.assertEqual(BodyMetrics.objects.get(profile=profile).bmi, 27.7)
+
+    def test_update_profile_refreshes_metrics(self):
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "metrics@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        auth_header = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+        response = self.client.put(
+            "/api/users/profile",
+            data=json.dumps({"height": 180.0, "weight": 81.0}),
+            content_type="application/json",
+            **auth_header
+        )
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(response.json()["bmi"], 25.0)
+        self.assertEqual(BodyMetrics.objects.get(profile__user=self.user).bmi, 25.0)
+
+        response = self.client.get("/api/users/profile", **auth_header)
+        self.assertEqual(response.json()["profile"]["bmi"], 25.0)
+
+    def test_profile_update_is_all_or_nothing(self):
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "metrics@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        auth_header = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+        with mock.patch("accounts.api.refresh_body_metrics", side_effect=RuntimeError("metrics unavailable")), \
+                self.assertRaises(RuntimeError):
+            self.client.put("/api/users/profile", data=json.dumps({"height": 180.0, "weight": 81.0}),
+                            content_type="application/json", **auth_header)
+        self.user.profile.refresh_from_db()
+        self.assertIsNone(self.user.profile.weight)
+        self.assertFalse(BodyMeasurement.objects.filter(user=self.user).exists())
+
+
+class BodyMeasurementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="measure@example.com", username="measureuser", name="Measure",
+            family_name="User", password="SecurePassword123!"
+        )
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "measure@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        self.auth_header = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        points = [(float(x), 80.0) for x in range(1000)]
+        points[500] = (500.0, 95.0)
+        sampled = lttb(points, 50)
+        self.assertEqual(len(sampled), 50)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+        self.assertIn((500.0, 95.0), sampled)
+        self.assertEqual(lttb(points[:10], 50), points[:10])
+
+    def test_profile_weight_changes_are_appended(self):
+        for weight in (82.0, 82.0, 81.5):
+            self.client.put("/api/users/profile", data=json.dumps({"weight": weight}),
+                            content_type="application/json", **self.auth_header)
+        self.assertEqual(
+            list(BodyMeasurement.objects.order_by('id').values_list('weight', 'source')),
+            [(82.0, 'PROFILE'), (81.5, 'PROFILE')]
+        )
+
+    def test_log_and_downsampled_chart(self):
+        response = self.client.post("/api/users/measurements", data=json.dumps({"waist": 84.0}),
+                                    content_type="application/json", **self.auth_header)
+        self.assertEqual(response.status_code, 201, response.content.decode())
+        self.assertEqual(response.json()["source"], "MANUAL")
+
+        start = datetime(2022, 1, 1, tzinfo=dt_timezone.utc)
+        BodyMeasurement.objects.bulk_create(
+            BodyMeasurement(user=self.user, measured_at=start + timedelta(days=day), weight=90 - day / 100)
+            for day in range(1000)
+        )
+        chart = self.client.get("/api/users/measurements/chart", {"metric": "weight", "points": 100},
+                                **self.auth_header).json()
+        self.assertEqual(chart["total_points"], 1000)
+        self.assertEqual(len(chart["points"]), 100)
+        self.assertEqual(chart["points"][0]["value"], 90)
+
+        response = self.client.get("/api/users/measurements/chart", {"metric": "shoe_size"}, **self.auth_header)
+        self.assertEqual(response.status_code, 422)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import RollupWatermark
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,61 @@
+from datetime import date
+from typing import Optional
+
+from django.db.models import Sum
+from ninja import Router
+from ninja_jwt.authentication import JWTAuth
+
+from .models import DailyRevenue, DailySubscriptionStats, RollupWatermark
+from .rollups import REVENUE, SUBSCRIPTIONS
+from .schemas import RevenueReportSchemaOut, SubscriptionReportSchemaOut, ErrorDetailSchema
+
+analytics_router = Router(auth=JWTAuth())
+
+MAX_RANGE_DAYS = 366
+
+
+def _check_request(request, start: date, end: date):
+    """Returns an error response for non-staff callers and bad ranges, or None."""
+    if not request.auth.is_staff:
+        return 403, {"detail": "Staff access required."}
+    if end <= start:
+        return 400, {"detail": "end must be after start."}
+    if (end - start).days > MAX_RANGE_DAYS:
+        return 400, {"detail": f"The range can span at most {MAX_RANGE_DAYS} days."}
+    return None
+
+
+def _as_of(name: str):
+    return RollupWatermark.objects.filter(name=name).values_list("value", flat=True).first()
+
+
+# Both reports read only the rollup tables, never payments or subscriptions; they are as fresh as `as_of`
+@analytics_router.get("/revenue", response={200: RevenueReportSchemaOut, 400: ErrorDetailSchema,
+                                            403: ErrorDetailSchema})
+def revenue_report(request, start: date, end: date, plan_tier_id: Optional[int] = None):
+    """Daily revenue in [start, end) (UTC days), per plan tier and currency, with totals per currency."""
+    if error := _check_request(request, start, end):
+        return error
+    rows = DailyRevenue.objects.filter(day__gte=start, day__lt=end)
+    if plan_tier_id is not None:
+        rows = rows.filter(plan_tier_id=plan_tier_id)
+    days = list(rows.order_by("day", "plan_tier_id", "currency").values(
+        "day", "plan_tier_id", "currency", "payments", "failed_payments", "revenue"))
+    totals = list(rows.values("currency").annotate(
+        payments=Sum("payments"), failed_payments=Sum("failed_payments"), revenue=Sum("revenue")
+    ).order_by("currency"))
+    return 200, {"days": days, "totals": totals, "as_of": _as_of(REVENUE)}
+
+
+@analytics_router.get("/subscriptions", response={200: SubscriptionReportSchemaOut, 400: ErrorDetailSchema,
+                                                  403: ErrorDetailSchema})
+def subscription_report(request, start: date, end: date, plan_tier_id: Optional[int] = None):
+    """Active, new, renewed and churned subscribers per plan tier for each day in [start, end) (UTC days)."""
+    if error := _check_request(request, start, end):
+        return error
+    rows = DailySubscriptionStats.objects.filter(day__gte=start, day__lt=end)
+    if plan_tier_id is not None:
+        rows = rows.filter(plan_tier_id=plan_tier_id)
+    days = list(rows.order_by("day", "plan_tier_id").values(
+        "day", "plan_tier_id", "active_subscribers", "new_subscribers", "renewals", "churned"))
+    return 200, {"days": days, "as_of": _as_of(SUBSCRIPTIONS)}
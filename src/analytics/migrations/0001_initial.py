@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('subscription', '0006_rollup_source_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('failed_payments', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=16)),
+                ('plan_tier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='subscription.plantier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'plan_tier'], name='analytics_d_day_034cab_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySubscriptionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('active_subscribers', models.IntegerField(default=0)),
+                ('new_subscribers', models.IntegerField(default=0)),
+                ('renewals', models.IntegerField(default=0)),
+                ('churned', models.IntegerField(default=0)),
+                ('plan_tier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='subscription.plantier')),
+            ],
+            options={
+                'verbose_name_plural': 'daily subscription stats',
+                'constraints': [models.UniqueConstraint(fields=('day', 'plan_tier'), name='analytics_subscription_stats_unique_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubscriptionPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subscription_id', models.BigIntegerField()),
+                ('start_day', models.DateField()),
+                ('end_day', models.DateField()),
+                ('renewal', models.BooleanField(default=False)),
+                ('continued', models.BooleanField(default=False)),
+                ('plan_tier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='subscription.plantier')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('subscription_id', 'start_day'), name='analytics_period_unique_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import models
+
+from subscription.models import PlanTier
+
+
+class RollupWatermark(models.Model):
+    """How far a rollup has read its source table: rows changed at or before `value` have been folded in."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value:%Y-%m-%d %H:%M:%S}"
+
+
+class DailyRevenue(models.Model):
+    """Payments verified or failed on `day` (UTC), per purchased plan tier and currency."""
+    day = models.DateField()
+    plan_tier = models.ForeignKey(PlanTier, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    currency = models.CharField(max_length=3)
+    payments = models.PositiveIntegerField(default=0)
+    failed_payments = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'plan_tier']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.plan_tier_id} {self.revenue} {self.currency}"
+
+
+class SubscriptionPeriod(models.Model):
+    """
+    One paid period of a subscription, [start_day, end_day). UserSubscription keeps only the latest period, so the
+    history that the daily subscriber counts are built from is mirrored here. `renewal` marks a period that follows on
+    from its predecessor (a renewal, or a plan change that cut the predecessor short); `continued` marks one that has
+    such a successor.
+    """
+    subscription_id = models.BigIntegerField()
+    plan_tier = models.ForeignKey(PlanTier, on_delete=models.CASCADE, related_name='+')
+    start_day = models.DateField()
+    end_day = models.DateField()
+    renewal = models.BooleanField(default=False)
+    continued = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subscription_id', 'start_day'], name='analytics_period_unique_start'),
+        ]
+
+    def __str__(self):
+        return f"Subscription {self.subscription_id}: {self.start_day} - {self.end_day}"
+
+
+class DailySubscriptionStats(models.Model):
+    """
+    Subscribers per plan tier and day (UTC). `active_subscribers` counts periods covering the day; `new_subscribers`
+    and `renewals` count periods starting on it; `churned` counts periods ending on it without a renewal. Days in the
+    future reflect periods already paid for, and churn there is scheduled rather than final.
+    """
+    day = models.DateField()
+    plan_tier = models.ForeignKey(PlanTier, on_delete=models.CASCADE, related_name='+')
+    active_subscribers = models.IntegerField(default=0)
+    new_subscribers = models.IntegerField(default=0)
+    renewals = models.IntegerField(default=0)
+    churned = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily subscription stats'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'plan_tier'], name='analytics_subscription_stats_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.plan_tier_id}: {self.active_subscribers} active"
@@ -0,0 +1,171 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from subscription.models import PaymentTransaction, UserSubscription
+
+from .models import DailyRevenue, DailySubscriptionStats, RollupWatermark, SubscriptionPeriod
+
+REVENUE = "revenue"
+SUBSCRIPTIONS = "subscriptions"
+PAID_STATUSES = (PaymentTransaction.TransactionStatus.VERIFIED, PaymentTransaction.TransactionStatus.SUCCESSFUL)
+# A new watermark starts here, so the first run backfills the whole history
+EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+ONE_DAY = timedelta(days=1)
+
+
+def _utc_day(value: datetime) -> date:
+    return value.astimezone(dt_timezone.utc).date()
+
+
+def _fold_changes(name: str, queryset, field: str, values: tuple, apply, batch_size: int) -> int:
+    """
+    Feeds rows of `queryset` whose `field` timestamp is past the watermark `name` to `apply`, in keyset batches
+    ordered by (field, id). The watermark is read back by ANALYTICS_WATERMARK_OVERLAP_SECONDS, so rows committed
+    slightly out of timestamp order are not missed; `apply` must therefore be idempotent. Each batch runs in one
+    transaction holding the watermark row locked, so concurrent refreshes queue instead of double-counting.
+    """
+    overlap = timedelta(seconds=settings.ANALYTICS_WATERMARK_OVERLAP_SECONDS)
+    RollupWatermark.objects.get_or_create(name=name, defaults={"value": EPOCH})
+    processed = 0
+    cursor = None
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(name=name)
+            if cursor is None:
+                cursor = (watermark.value - overlap, 0)
+            rows = list(
+                queryset.filter(Q(**{f"{field}__gt": cursor[0]}) | Q(**{field: cursor[0], "id__gt": cursor[1]}))
+                .order_by(field, "id").values("id", field, *values)[:batch_size]
+            )
+            if not rows:
+                return processed
+            apply(rows)
+            cursor = (rows[-1][field], rows[-1]["id"])
+            if cursor[0] > watermark.value:
+                watermark.value = cursor[0]
+                watermark.save(update_fields=["value", "updated_at"])
+        processed += len(rows)
+        if len(rows) < batch_size:
+            return processed
+
+
+def _rebuild_revenue_days(rows):
+    """Recomputes every day touched by `rows` from scratch, which is what makes re-reading a row harmless."""
+    paid = Q(status__in=PAID_STATUSES)
+    failed = Q(status=PaymentTransaction.TransactionStatus.FAILED)
+    for day in sorted({_utc_day(row["verification_timestamp"]) for row in rows}):
+        start = datetime.combine(day, time.min, dt_timezone.utc)
+        totals = (
+            PaymentTransaction.objects
+            .filter(paid | failed, verification_timestamp__gte=start, verification_timestamp__lt=start + ONE_DAY)
+            .values("plan_tier_purchased_id", "currency")
+            .annotate(payments=Count("id", filter=paid), failed_payments=Count("id", filter=failed),
+                      revenue=Sum("amount", filter=paid))
+            .order_by()
+        )
+        DailyRevenue.objects.filter(day=day).delete()
+        DailyRevenue.objects.bulk_create(
+            DailyRevenue(day=day, plan_tier_id=total["plan_tier_purchased_id"], currency=total["currency"],
+                         payments=total["payments"], failed_payments=total["failed_payments"],
+                         revenue=total["revenue"] or 0)
+            for total in totals
+        )
+
+
+def _add_period(deltas, period: SubscriptionPeriod, sign: int):
+    tier = period.plan_tier_id
+    day = period.start_day
+    while day < period.end_day:
+        deltas[day, tier]["active_subscribers"] += sign
+        day += ONE_DAY
+    deltas[period.start_day, tier]["renewals" if period.renewal else "new_subscribers"] += sign
+    if not period.continued:
+        deltas[period.end_day, tier]["churned"] += sign
+
+
+def _replace_period(deltas, period: SubscriptionPeriod, **changes):
+    _add_period(deltas, period, -1)
+    for attr, value in changes.items():
+        setattr(period, attr, value)
+    _add_period(deltas, period, 1)
+    period.save(update_fields=list(changes))
+
+
+def _record_period(deltas, history: list, subscription_id: int, plan_tier_id: int, start: date, end: date):
+    """Brings the mirrored `history` (ordered by start_day) in line with the subscription's current period."""
+    current = next((period for period in history if period.start_day == start), None)
+    if current is not None:
+        if (current.plan_tier_id, current.end_day) != (plan_tier_id, end):
+            _replace_period(deltas, current, plan_tier_id=plan_tier_id, end_day=end)
+        return
+
+    earlier = [period for period in history if period.start_day < start]
+    previous = earlier[-1] if earlier else None
+    follows_on = previous is not None and previous.end_day >= start
+    if follows_on:
+        # A plan change restarts the period early; the remainder of the old one is superseded
+        _replace_period(deltas, previous, end_day=min(previous.end_day, start), continued=True)
+    period = SubscriptionPeriod.objects.create(subscription_id=subscription_id, plan_tier_id=plan_tier_id,
+                                               start_day=start, end_day=end, renewal=follows_on)
+    _add_period(deltas, period, 1)
+    history.append(period)
+    history.sort(key=lambda item: item.start_day)
+
+
+def _apply_subscription_deltas(deltas):
+    deltas = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not deltas:
+        return
+    days = [day for day, _ in deltas]
+    existing = {
+        (stats.day, stats.plan_tier_id): stats
+        for stats in DailySubscriptionStats.objects.filter(day__gte=min(days), day__lte=max(days),
+                                                           plan_tier_id__in={tier for _, tier in deltas})
+    }
+    to_create, to_update = [], []
+    for (day, tier), counts in deltas.items():
+        stats = existing.get((day, tier))
+        if stats is None:
+            stats = DailySubscriptionStats(day=day, plan_tier_id=tier)
+            to_create.append(stats)
+        else:
+            to_update.append(stats)
+        for field, delta in counts.items():
+            setattr(stats, field, getattr(stats, field) + delta)
+    DailySubscriptionStats.objects.bulk_create(to_create, batch_size=1000)
+    DailySubscriptionStats.objects.bulk_update(
+        to_update, ["active_subscribers", "new_subscribers", "renewals", "churned"], batch_size=1000)
+
+
+def _sync_subscription_periods(rows):
+    histories = defaultdict(list)
+    for period in SubscriptionPeriod.objects.filter(subscription_id__in=[row["id"] for row in rows]).order_by(
+            "start_day"):
+        histories[period.subscription_id].append(period)
+    deltas = defaultdict(Counter)
+    for row in rows:
+        if not (row["plan_tier_id"] and row["start_date"] and row["expire_date"]):
+            continue
+        start = _utc_day(row["start_date"])
+        end = max(_utc_day(row["expire_date"]), start)
+        _record_period(deltas, histories[row["id"]], row["id"], row["plan_tier_id"], start, end)
+    _apply_subscription_deltas(deltas)
+
+
+def refresh_rollups(batch_size: int = 1000) -> dict:
+    """
+    Folds payment and subscription changes since the last run into the daily rollups. Only rows changed after the
+    watermarks are read; returns how many rows each rollup processed.
+    """
+    return {
+        REVENUE: _fold_changes(
+            REVENUE, PaymentTransaction.objects.all(), "verification_timestamp", (), _rebuild_revenue_days,
+            batch_size),
+        SUBSCRIPTIONS: _fold_changes(
+            SUBSCRIPTIONS, UserSubscription.objects.all(), "updated_at", ("plan_tier_id", "start_date", "expire_date"),
+            _sync_subscription_periods, batch_size),
+    }
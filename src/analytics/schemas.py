@@ -0,0 +1,44 @@
+from ninja import Schema
+from typing import List, Optional
+from datetime import date, datetime
+from decimal import Decimal
+
+
+class DailyRevenueSchemaOut(Schema):
+    day: date
+    plan_tier_id: Optional[int] = None
+    currency: str
+    payments: int
+    failed_payments: int
+    revenue: Decimal
+
+
+class RevenueTotalSchemaOut(Schema):
+    currency: str
+    payments: int
+    failed_payments: int
+    revenue: Decimal
+
+
+class RevenueReportSchemaOut(Schema):
+    days: List[DailyRevenueSchemaOut]
+    totals: List[RevenueTotalSchemaOut]
+    as_of: Optional[datetime] = None
+
+
+class DailySubscriptionStatsSchemaOut(Schema):
+    day: date
+    plan_tier_id: int
+    active_subscribers: int
+    new_subscribers: int
+    renewals: int
+    churned: int
+
+
+class SubscriptionReportSchemaOut(Schema):
+    days: List[DailySubscriptionStatsSchemaOut]
+    as_of: Optional[datetime] = None
+
+
+class ErrorDetailSchema(Schema):
+    detail: str
@@ -0,0 +1,15 @@
+import logging
+
+from celery import shared_task
+
+from . import rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="analytics.tasks.refresh_rollups")
+def refresh_rollups(batch_size=1000):
+    processed = rollups.refresh_rollups(batch_size=batch_size)
+    logger.info("Folded %s payments and %s subscriptions into the analytics rollups", processed["revenue"],
+                processed["subscriptions"], extra={"event": "analytics.rollups_refreshed", **processed})
+    return f"Processed {processed['revenue']} payments and {processed['subscriptions']} subscriptions."
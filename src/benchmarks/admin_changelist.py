@@ -0,0 +1,133 @@
+"""
+Admin changelist cost for payment transactions and subscriptions: the stock ModelAdmin configuration (per-row
+foreign key queries, exact COUNT(*) twice, icontains search over joins, JSON columns loaded) against the tuned
+admins in subscription.admin.
+
+Seeds --users users, each with a subscription and --transactions-per-user transactions carrying gateway responses of
+--blob-bytes, into a throwaway database. Each page is rendered through the admin's changelist_view, as a superuser.
+SQLite has no planner row estimates, so unfiltered counts are capped rather than estimated here.
+
+Usage (from src/):
+    python -m benchmarks.admin_changelist --users 200000 --transactions-per-user 3
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from .utils import setup_django, temporary_database, timed, use_file_sqlite
+
+
+def seed(args):
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+
+    from subscription.models import PaymentTransaction, PlanTier, UserSubscription
+
+    User = get_user_model()
+    now = timezone.now()
+    batch = 5000
+    blob = {"data": {"code": 100, "message": "x" * args.blob_bytes}}
+    tiers = PlanTier.objects.bulk_create([
+        PlanTier(name="Basic", price=50000, currency="IRT", duration_days=30, max_requests=20),
+        PlanTier(name="Premium", price=150000, currency="IRT", duration_days=30, max_requests=100),
+    ])
+    User.objects.bulk_create((User(email=f"member{i}@example.com", username=f"member{i}", name="M", family_name=str(i),
+                                   password="!") for i in range(args.users)), batch_size=batch)
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+    UserSubscription.objects.bulk_create((UserSubscription(
+        user_id=user_id, plan_tier=tiers[user_id % 2], expire_date=now + timedelta(days=10 - user_id % 30),
+        status=UserSubscription.SubscriptionStatus.ACTIVE, latest_payment_transaction_id=f"A{user_id:035d}",
+    ) for user_id in user_ids), batch_size=batch)
+    PaymentTransaction.objects.bulk_create((PaymentTransaction(
+        user_id=user_id, plan_tier_purchased=tiers[user_id % 2], gateway_transaction_id=f"A{user_id * 10 + n:035d}",
+        amount=tiers[user_id % 2].price, status=PaymentTransaction.TransactionStatus.VERIFIED,
+        gateway_response_on_request=blob, gateway_response_on_verify=blob,
+    ) for user_id in user_ids for n in range(args.transactions_per_user)), batch_size=batch)
+    return User.objects.create_superuser(email="admin@example.com", username="admin", name="Ad", family_name="Min",
+                                         password=None)
+
+
+def stock_admins():
+    """The admin configuration before the performance mode, for comparison."""
+    from django.contrib import admin
+
+    from subscription.admin import PaymentTransactionAdmin, UserSubscriptionAdmin
+
+    class StockTransactionAdmin(admin.ModelAdmin):
+        list_display = PaymentTransactionAdmin.list_display
+        list_filter = ('status', 'payment_gateway', 'currency', 'request_timestamp')
+        search_fields = ('user__email', 'gateway_transaction_id', 'plan_tier_purchased__name')
+        amount_display = PaymentTransactionAdmin.amount_display
+
+    class StockSubscriptionAdmin(admin.ModelAdmin):
+        list_display = UserSubscriptionAdmin.list_display
+        list_filter = ('status', 'plan_tier__name')
+        search_fields = ('user__email', 'latest_payment_transaction_id')
+
+    return StockTransactionAdmin, StockSubscriptionAdmin
+
+
+def measure(model_admin, user, params: dict, repeat: int):
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(repeat):
+        request = RequestFactory().get("/", params)
+        request.user = user
+        connection.queries_log.clear()  # The capture counts by log length, which stops growing once the log is full
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            model_admin.changelist_view(request).render()
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--transactions-per-user", type=int, default=3)
+    parser.add_argument("--blob-bytes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib import admin
+
+    from subscription.admin import PaymentTransactionAdmin, UserSubscriptionAdmin
+    from subscription.models import PaymentTransaction, UserSubscription
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_file_sqlite(directory)
+        with temporary_database():
+            results = {}
+            with timed(results, "seed"):
+                superuser = seed(args)
+            print(f"seeded {args.users} users and {args.users * args.transactions_per_user} transactions "
+                  f"in {results['seed']:.1f}s\n")
+
+            stock_transactions, stock_subscriptions = stock_admins()
+            pages = {
+                "first page": {},
+                "page 50": {"p": 49},
+                "status filter": {"status__exact": "verified"},
+                "email search": {"q": f"member{args.users // 2}@"},
+                "authority search": {"q": f"A{(args.users // 2) * 10:035d}"},
+            }
+            print(f"{'changelist':<34}{'stock ms':>10}{'queries':>9}{'tuned ms':>10}{'queries':>9}")
+            for model, stock, tuned in ((PaymentTransaction, stock_transactions, PaymentTransactionAdmin),
+                                        (UserSubscription, stock_subscriptions, UserSubscriptionAdmin)):
+                for name, params in pages.items():
+                    if model is UserSubscription and "status__exact" in params:
+                        params = {"status__exact": "active"}
+                    before = measure(stock(model, admin.site), superuser, params, args.repeat)
+                    after = measure(tuned(model, admin.site), superuser, params, args.repeat)
+                    print(f"{model.__name__ + ' ' + name:<34}{before[0]:>10.1f}{before[1]:>9}"
+                          f"{after[0]:>10.1f}{after[1]:>9}")
+
+
+if __name__ == "__main__":
+    main()
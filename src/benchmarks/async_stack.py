@@ -0,0 +1,191 @@
+"""
+Throughput and memory of the API behind WSGI worker threads versus one ASGI event loop.
+
+Drives POST /api/subscription/initiate-payment (JWT auth, plan lookup, payment gateway call, transaction insert)
+with --connections concurrent clients. The gateway is an in-process stub that answers after --gateway-latency-ms,
+so the run measures how each server model copes with requests that mostly wait on I/O:
+
+  wsgi  Django's WSGIHandler served by --wsgi-threads threads, the way a threaded WSGI server runs it. Every
+        in-flight request holds a thread for the whole gateway wait; the remaining connections queue.
+  asgi  Django's ASGIHandler on a single event loop, every connection in flight at once.
+
+Each mode runs in its own process against a temporary database so peak RSS is comparable. The load generator
+shares the process, so both modes carry its overhead. SQLite serialises writes; set DATABASE_URL to a Postgres
+database for representative numbers.
+
+Usage (from src/):
+    python -m benchmarks.async_stack --connections 1000 --requests 5000 --wsgi-threads 64
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import setup_django, temporary_database, use_file_sqlite
+
+URL = "/api/subscription/initiate-payment"
+
+
+def seed():
+    from django.contrib.auth import get_user_model
+    from ninja_jwt.tokens import AccessToken
+    from subscription.models import PlanTier
+
+    user = get_user_model().objects.create_user(
+        email="bench@example.com", username="bench", name="Bench", family_name="User", password="!")
+    plan = PlanTier.objects.create(name="Bench", price=100000, duration_days=30, max_requests=10, is_active=True)
+    return str(AccessToken.for_user(user)), plan.id
+
+
+def install_gateway_stub(latency: float):
+    import httpx
+    from gymbackend import http_client
+
+    counter = iter(range(10 ** 9))
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"data": {"code": 100, "authority": f"BENCH{next(counter):012d}"}})
+
+    http_client.transport = httpx.MockTransport(handler)
+
+
+class Sampler:
+    """Tracks peak thread count while the load runs."""
+
+    def __init__(self):
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.05):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_wsgi(args, headers, body) -> list:
+    import httpx
+    from django.core.handlers.wsgi import WSGIHandler
+
+    app = WSGIHandler()
+    local = threading.local()
+
+    def one_request(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(transport=httpx.WSGITransport(app=app), base_url="http://testserver")
+        started = time.perf_counter()
+        response = client.post(URL, content=body, headers=headers)
+        return response.status_code, time.perf_counter() - started
+
+    # Connections beyond the thread count wait in the executor queue, as they would in the server's accept backlog
+    with ThreadPoolExecutor(max_workers=min(args.wsgi_threads, args.connections)) as pool:
+        return list(pool.map(one_request, range(args.requests)))
+
+
+def run_asgi(args, headers, body) -> list:
+    import httpx
+    from django.core.handlers.asgi import ASGIHandler
+
+    async def main():
+        app = ASGIHandler()
+        limit = asyncio.Semaphore(args.connections)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver",
+                                     timeout=None) as client:
+            async def one_request():
+                async with limit:
+                    started = time.perf_counter()
+                    response = await client.post(URL, content=body, headers=headers)
+                    return response.status_code, time.perf_counter() - started
+
+            return await asyncio.gather(*(one_request() for _ in range(args.requests)))
+
+    return asyncio.run(main())
+
+
+def run_mode(args) -> dict:
+    setup_django()
+    with tempfile.TemporaryDirectory() as directory:
+        use_file_sqlite(directory)
+        return measure(args)
+
+
+def measure(args) -> dict:
+    with temporary_database():
+        token, plan_id = seed()
+        install_gateway_stub(args.gateway_latency_ms / 1000)
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        body = json.dumps({"plan_tier_id": plan_id})
+        runner = run_wsgi if args.mode == "wsgi" else run_asgi
+
+        runner(argparse.Namespace(**{**vars(args), "requests": 1}), headers, body)  # warm up imports and URL resolver
+        if args.trace_memory:
+            tracemalloc.start()
+        with Sampler() as sampler:
+            started = time.perf_counter()
+            results = runner(args, headers, body)
+            elapsed = time.perf_counter() - started
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "mode": args.mode,
+        "requests": len(results),
+        "errors": sum(1 for status, _ in results if status != 200),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+        "peak_threads": sampler.peak_threads,
+        "peak_python_heap_mb": round(peak_traced / 2 ** 20, 1) if args.trace_memory else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("wsgi", "asgi", "both"), default="both")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--wsgi-threads", type=int, default=64)
+    parser.add_argument("--gateway-latency-ms", type=float, default=100)
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak (slows requests)")
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        print(json.dumps(run_mode(args)))
+        return
+
+    forwarded = [f"--connections={args.connections}", f"--requests={args.requests}",
+                 f"--wsgi-threads={args.wsgi_threads}", f"--gateway-latency-ms={args.gateway_latency_ms}",
+                 *(["--trace-memory"] if args.trace_memory else [])]
+    rows = []
+    for mode in ("wsgi", "asgi"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.async_stack", f"--mode={mode}", *forwarded],
+                                check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.connections} connections, {args.requests} requests, "
+          f"gateway latency {args.gateway_latency_ms:.0f}ms, {args.wsgi_threads} WSGI threads")
+    for key in rows[0]:
+        print(f"{key + ':':<22}" + "".join(f"{str(row[key]):>14}" for row in rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark for the auto-renewal billing run against the local gateway stub.
+
+Seeds --subscriptions subscriptions expiring tomorrow, each with auto-renewal on and a direct debit mandate (one in
+--revoked-every with a revoked mandate), into a throwaway database. Then runs subscription.renewals.renew_user_range
+over the whole user-id range in --chunk-size chunks, as a single shard of the nightly job does, with the gateway
+answering after --gateway-latency-ms and at most --concurrency calls in flight.
+
+Usage (from src/):
+    python -m benchmarks.auto_renewal --subscriptions 20000 --concurrency 20 --gateway-latency-ms 150
+"""
+import argparse
+import tempfile
+from datetime import timedelta
+
+from .gateway_stub import GatewayStub
+from .load_test import configure_offline
+from .utils import temporary_database, timed, use_file_sqlite
+
+
+def seed(args) -> tuple:
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+
+    from subscription.models import PlanTier, SubscriptionRenewal, UserSubscription
+
+    User = get_user_model()
+    batch = 5000
+    expire = timezone.now() + timedelta(days=1)
+    plan = PlanTier.objects.create(name="Basic", price=50000, currency="IRT", duration_days=30)
+    User.objects.bulk_create((User(email=f"member{i}@example.com", username=f"member{i}", name="M", family_name=str(i),
+                                   password="!") for i in range(args.subscriptions)), batch_size=batch)
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+    UserSubscription.objects.bulk_create((UserSubscription(
+        user_id=user_id, plan_tier=plan, start_date=expire - timedelta(days=30), expire_date=expire,
+        status=UserSubscription.SubscriptionStatus.ACTIVE,
+    ) for user_id in user_ids), batch_size=batch)
+    SubscriptionRenewal.objects.bulk_create((SubscriptionRenewal(
+        subscription_id=subscription_id,
+        mandate_signature="revoked" if subscription_id % args.revoked_every == 0 else f"mandate-{subscription_id}",
+    ) for subscription_id in UserSubscription.objects.values_list("id", flat=True)), batch_size=batch)
+    return user_ids[0], user_ids[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--gateway-latency-ms", type=float, default=150.0)
+    parser.add_argument("--revoked-every", type=int, default=50)
+    args = parser.parse_args()
+
+    configure_offline()
+    from collections import Counter
+
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+
+    from subscription.renewals import renew_user_range
+
+    gateway = GatewayStub(latency=args.gateway_latency_ms / 1000, revoked_signatures={"revoked"}).start()
+    results = {}
+    counts = Counter()
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(RENEWAL_CONCURRENCY=args.concurrency, **gateway.settings()):
+        use_file_sqlite(directory)
+        with temporary_database():
+            with timed(results, "seed"):
+                low, high = seed(args)
+            as_of = timezone.now().isoformat()
+            with CaptureQueriesContext(connection) as queries, timed(results, "renew"):
+                for start in range(low, high + 1, args.chunk_size):
+                    counts.update(renew_user_range(start, start + args.chunk_size, as_of))
+    gateway.shutdown()
+
+    charged = counts["renewed"] + counts["failed"] + counts["gave_up"]
+    print(f"subscriptions seeded: {args.subscriptions} in {results['seed']:.1f}s")
+    print(f"renewed:              {counts['renewed']}")
+    print(f"failed (retrying):    {counts['failed']}")
+    print(f"unsettled:            {counts['unsettled']}")
+    print(f"billing time:         {results['renew']:.1f}s ({charged / results['renew']:.0f} renewals/s)")
+    print(f"queries executed:     {len(queries.captured_queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the Zarinpal v4 payment API, so payment flows can be exercised and load tested offline.
+
+Answers POST .../payment/request.json with a fresh authority, POST .../payman/checkout.json (direct debit charges
+of auto-renewals) with code 100 unless the mandate signature is revoked, and POST .../payment/verify.json with code
+100 the first time an authority is verified and 101 after that, after --latency-ms. Point the app at it with the
+ZARINPAL_* settings it prints on startup.
+
+Usage (from src/):
+    python -m benchmarks.gateway_stub --port 8765 --latency-ms 150
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GatewayStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency: float = 0.0, revoked_signatures=()):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.revoked_signatures = set(revoked_signatures)
+        self._authorities = itertools.count(1)
+        self._ref_ids = itertools.count(100000)
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def settings(self) -> dict:
+        return {
+            "ZARINPAL_API_REQUEST_URL": f"{self.base_url}/pg/v4/payment/request.json",
+            "ZARINPAL_API_VERIFY_URL": f"{self.base_url}/pg/v4/payment/verify.json",
+            "ZARINPAL_API_DIRECT_DEBIT_URL": f"{self.base_url}/pg/v4/payman/checkout.json",
+            "ZARINPAL_STARTPAY_URL_TEMPLATE": f"{self.base_url}/pg/StartPay/{{}}",
+        }
+
+    def start(self) -> "GatewayStub":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def request_payment(self, body: dict) -> dict:
+        if not body.get("merchant_id") or not body.get("amount") or not body.get("callback_url"):
+            return {"data": [], "errors": {"code": -9, "message": "The input params invalid, validation error."}}
+        return {"data": {"code": 100, "message": "Success", "authority": f"S{next(self._authorities):035d}",
+                         "fee_type": "Merchant", "fee": 0}, "errors": []}
+
+    def charge_mandate(self, body: dict) -> dict:
+        if not body.get("authority") or not body.get("signature"):
+            return {"data": [], "errors": {"code": -9, "message": "The input params invalid, validation error."}}
+        if body["signature"] in self.revoked_signatures:
+            return {"data": [], "errors": {"code": -80, "message": "The direct debit contract is not active."}}
+        return {"data": {"code": 100, "message": "Paid"}, "errors": []}
+
+    def verify_payment(self, body: dict) -> dict:
+        authority = body.get("authority")
+        if not authority or not body.get("amount"):
+            return {"data": [], "errors": {"code": -9, "message": "The input params invalid, validation error."}}
+        with self._lock:
+            code = 101 if authority in self._verified else 100
+            self._verified.add(authority)
+        return {"data": {"code": code, "message": "Verified" if code == 100 else "Verified before",
+                         "ref_id": next(self._ref_ids), "card_pan": "502229******5995", "fee": 0}, "errors": []}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/payment/request.json"):
+            answer = self.server.request_payment(body)
+        elif self.path.endswith("/payman/checkout.json"):
+            answer = self.server.charge_mandate(body)
+        elif self.path.endswith("/payment/verify.json"):
+            answer = self.server.verify_payment(body)
+        else:
+            self.send_error(404)
+            return
+        time.sleep(self.server.latency)
+        payload = json.dumps(answer).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = GatewayStub((args.host, args.port), args.latency_ms / 1000)
+    for name, value in server.settings().items():
+        print(f"export {name}='{value}'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Load test for every endpoint in gymbackend/api.py, compared against a stored baseline.
+
+Seeds a temporary database with --users users with profiles, subscriptions and payment transactions, and gives
+the first --virtual-users of them the activity the endpoints read (measurements, workout plans and sessions, inbox
+notifications, a rendered export). Each endpoint is then driven in turn with --requests requests from
+--concurrency concurrent clients through Django's ASGI handler, one warm-up request first.
+
+Runs fully offline: payment calls go to benchmarks.gateway_stub on localhost, Redis is disabled (local cache and
+in-process event hub) and Celery publishes to an in-memory broker. The load generator shares the process with the
+app and SQLite serialises writes; set DATABASE_URL to a Postgres database for representative numbers.
+
+Reports throughput, p50/p95/p99 latency, unexpected responses and database queries per request for each endpoint.
+--save-baseline stores the results as JSON. --baseline compares the run with stored results and exits with status 1
+if an endpoint's p95 latency or throughput is worse by more than --tolerance, or it issues more queries per request.
+Latency baselines only compare runs on the same machine; query counts compare anywhere.
+
+Usage (from src/):
+    python -m benchmarks.load_test --users 100000 --concurrency 20 --requests 200 \\
+        --save-baseline benchmarks/baselines/load_test.json
+    python -m benchmarks.load_test --endpoint /api/users --baseline benchmarks/baselines/load_test.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, List
+
+from .gateway_stub import GatewayStub
+from .utils import setup_django, temporary_database, timed, use_file_sqlite
+
+PASSWORD = "LoadTest123!"
+
+
+@dataclass
+class VirtualUser:
+    id: int
+    email: str
+    access: str
+    refresh: str
+    plan_id: int
+    notification_ids: List[int]
+
+
+@dataclass
+class Dataset:
+    users: List[VirtualUser]
+    plan_tier_id: int
+    exercise_ids: List[int]
+    export_hash: str
+    export_token: str
+    pending_authorities: List[str]
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+
+    def user(self, index: int) -> VirtualUser:
+        return self.users[index % len(self.users)]
+
+
+@dataclass
+class Endpoint:
+    name: str
+    # (dataset, request index) -> (path, JSON body or None)
+    build: Callable
+    expect: tuple = (200,)
+    auth: bool = True
+
+    @property
+    def method(self) -> str:
+        return self.name.split(" ", 1)[0]
+
+
+def _sessions(dataset: Dataset, index: int) -> dict:
+    exercises = dataset.exercise_ids
+    return {"sessions": [{
+        "client_uuid": str(uuid.uuid4()),
+        "performed_on": time.strftime("%Y-%m-%d"),
+        "sets": [{"exercise_id": exercises[(index + i) % len(exercises)], "reps": 8 + i % 4,
+                  "weight": 40.0 + (index % 20) * 2.5, "rpe": 8.0} for i in range(12)],
+    }]}
+
+
+ENDPOINTS = [
+    Endpoint("POST /api/auth/signup", lambda d, i: ("/api/auth/signup", {
+        "email": f"signup-{d.run_id}-{i}@example.com", "username": f"signup-{d.run_id}-{i}",
+        "name": "Load", "family_name": "Test", "password": PASSWORD}), expect=(201,), auth=False),
+    Endpoint("POST /api/auth/login", lambda d, i: ("/api/auth/login", {"email": d.user(i).email, "password": PASSWORD}),
+             auth=False),
+    Endpoint("POST /api/token/pair", lambda d, i: ("/api/token/pair", {"email": d.user(i).email, "password": PASSWORD}),
+             auth=False),
+    Endpoint("POST /api/token/refresh", lambda d, i: ("/api/token/refresh", {"refresh": d.user(i).refresh}), auth=False),
+    Endpoint("POST /api/token/verify", lambda d, i: ("/api/token/verify", {"token": d.user(i).access}), auth=False),
+    Endpoint("GET /api/users/profile", lambda d, i: ("/api/users/profile", None)),
+    Endpoint("PUT /api/users/profile", lambda d, i: ("/api/users/profile", {
+        "weight": 70 + i % 30, "goal": ("Muscle Gain", "Weight Loss")[i % 2]})),
+    Endpoint("POST /api/users/measurements", lambda d, i: ("/api/users/measurements", {
+        "weight": 70 + i % 30, "waist": 80 + i % 10}), expect=(201,)),
+    Endpoint("GET /api/users/measurements/chart", lambda d, i: ("/api/users/measurements/chart?points=300", None)),
+    Endpoint("GET /api/workouts/plans/current", lambda d, i: ("/api/workouts/plans/current", None)),
+    Endpoint("POST /api/workouts/plans/generate", lambda d, i: ("/api/workouts/plans/generate", {"personalize": False}),
+             expect=(201,)),
+    Endpoint("POST /api/workouts/sessions/batch", lambda d, i: ("/api/workouts/sessions/batch", _sessions(d, i))),
+    Endpoint("GET /api/workouts/progress/records", lambda d, i: ("/api/workouts/progress/records", None)),
+    Endpoint("GET /api/workouts/progress/volume", lambda d, i: ("/api/workouts/progress/volume?weeks=12", None)),
+    Endpoint("GET /api/workouts/progress/exercises/{id}", lambda d, i: (
+        f"/api/workouts/progress/exercises/{d.exercise_ids[i % len(d.exercise_ids)]}", None)),
+    Endpoint("POST /api/exports/workout-plans/{id}", lambda d, i: (
+        f"/api/exports/workout-plans/{d.user(i).plan_id}", None), expect=(200, 202)),
+    Endpoint("GET /api/exports/{hash}", lambda d, i: (f"/api/exports/{d.export_hash}", None)),
+    Endpoint("GET /api/exports/{token}/download", lambda d, i: (f"/api/exports/{d.export_token}/download", None),
+             auth=False),
+    Endpoint("GET /api/notifications/", lambda d, i: ("/api/notifications/?limit=20", None)),
+    Endpoint("GET /api/notifications/unread-count", lambda d, i: ("/api/notifications/unread-count", None)),
+    Endpoint("POST /api/notifications/mark-read", lambda d, i: ("/api/notifications/mark-read", {
+        "ids": d.user(i).notification_ids[i % 5::5]})),
+    Endpoint("POST /api/notifications/mark-all-read", lambda d, i: ("/api/notifications/mark-all-read", None)),
+    Endpoint("GET /api/subscription/tiers", lambda d, i: ("/api/subscription/tiers", None)),
+    Endpoint("GET /api/subscription/status", lambda d, i: ("/api/subscription/status", None)),
+    Endpoint("POST /api/subscription/initiate-payment", lambda d, i: (
+        "/api/subscription/initiate-payment", {"plan_tier_id": d.plan_tier_id})),
+    Endpoint("GET /api/payment/callback", lambda d, i: (
+        f"/api/payment/callback?Authority={d.pending_authorities[i % len(d.pending_authorities)]}&Status=OK", None),
+             auth=False),
+    Endpoint("POST /api/subscription/cancel-immediately", lambda d, i: ("/api/subscription/cancel-immediately", None),
+             expect=(200, 400)),
+]
+
+
+def seed(args) -> Dataset:
+    """Bulk-inserts the population; only the virtual users get tokens and per-user activity."""
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from django.core.files.base import ContentFile
+    from django.utils import timezone
+    from ninja_jwt.tokens import RefreshToken
+
+    from accounts.models import BodyMeasurement, UserProfile
+    from exports.models import PlanExport, PlanExportLink
+    from notifications.models import InboxNotification
+    from subscription.models import PaymentTransaction, PlanTier, UserSubscription
+    from workout import progress
+    from workout.models import Exercise
+    from workout.services import generate_workout_plan
+    from workout.templating import ExerciseLibrary
+
+    User = get_user_model()
+    now = timezone.now()
+    batch = 5000
+    password = make_password(PASSWORD)  # One hash for everyone; hashing 100k passwords would dominate the seed
+    tiers = PlanTier.objects.bulk_create([
+        PlanTier(name="Basic", price=50000, currency="IRT", duration_days=30, max_requests=20, priority=1),
+        PlanTier(name="Premium", price=150000, currency="IRT", duration_days=30, max_requests=100, priority=5),
+    ])
+
+    User.objects.bulk_create((User(email=f"load{i}@example.com", username=f"load{i}", name="Load", family_name=str(i),
+                                   password=password) for i in range(args.users)), batch_size=batch)
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+    UserProfile.objects.bulk_create((UserProfile(
+        user_id=user_id, city="Tehran", sex=("MALE", "FEMALE")[user_id % 2], goal="GENERAL_FITNESS",
+        fitness_level=("BEGINNER", "INTERMEDIATE", "ADVANCED")[user_id % 3], height=160 + user_id % 40,
+        weight=55 + user_id % 50, birthday_date=(now - timedelta(days=365 * (20 + user_id % 40))).date(),
+    ) for user_id in user_ids), batch_size=batch)
+
+    # 60% subscribed: half of them active, half expired; every subscriber paid at least once
+    subscribed = [user_id for user_id in user_ids if user_id % 5 < 3]
+    UserSubscription.objects.bulk_create((UserSubscription(
+        user_id=user_id, plan_tier=tiers[user_id % 2], start_date=now - timedelta(days=20 + user_id % 30),
+        expire_date=now + timedelta(days=10 - user_id % 30),
+        status=UserSubscription.SubscriptionStatus.ACTIVE if user_id % 2 else UserSubscription.SubscriptionStatus.EXPIRED,
+    ) for user_id in subscribed), batch_size=batch)
+    PaymentTransaction.objects.bulk_create((PaymentTransaction(
+        user_id=user_id, plan_tier_purchased=tiers[user_id % 2], gateway_transaction_id=f"SEED{user_id:08d}{n}",
+        amount=tiers[user_id % 2].price, currency="IRT", status=PaymentTransaction.TransactionStatus.VERIFIED,
+        verification_timestamp=now - timedelta(days=20 + n * 30),
+    ) for user_id in subscribed for n in range(1 + user_id % 2)), batch_size=batch)
+
+    virtual_ids = user_ids[:args.virtual_users]
+    library = ExerciseLibrary.load()
+    exercise_ids = list(Exercise.objects.filter(is_active=True).order_by("id").values_list("id", flat=True))
+    BodyMeasurement.objects.bulk_create((BodyMeasurement(
+        user_id=user_id, measured_at=now - timedelta(days=day), weight=80 - day / 20, waist=90 - day / 30,
+    ) for user_id in virtual_ids for day in range(180)), batch_size=batch)
+    InboxNotification.objects.bulk_create((InboxNotification(
+        user_id=user_id, kind="plan_ready", title="Your plan is ready", body=f"Week {n} is ready.",
+        data={"week_number": n}, created_at=now - timedelta(hours=n),
+    ) for user_id in virtual_ids for n in range(50)), batch_size=batch)
+    # One pending payment per callback request, so each callback verifies and activates a subscription
+    authorities = [f"LOAD{i:031d}" for i in range(args.requests + 1)]
+    PaymentTransaction.objects.bulk_create(PaymentTransaction(
+        user_id=virtual_ids[i % len(virtual_ids)], plan_tier_purchased=tiers[1], gateway_transaction_id=authority,
+        amount=tiers[1].price, currency="IRT", status=PaymentTransaction.TransactionStatus.PENDING,
+    ) for i, authority in enumerate(authorities))
+
+    notification_ids = {}
+    for user_id, notification_id in InboxNotification.objects.filter(user_id__in=virtual_ids).values_list(
+            "user_id", "id"):
+        notification_ids.setdefault(user_id, []).append(notification_id)
+    users = []
+    for user in User.objects.filter(id__in=virtual_ids).order_by("id"):
+        plan = generate_workout_plan(user, library)
+        progress.record_sessions(user, [{
+            "client_uuid": uuid.uuid4(), "performed_on": (now - timedelta(days=day)).date(),
+            "sets": [{"exercise_id": exercise_ids[(day + n) % len(exercise_ids)], "reps": 8, "weight": 40.0 + day,
+                      "rpe": 8.0} for n in range(10)],
+        } for day in range(2, 60, 3)])
+        refresh = RefreshToken.for_user(user)
+        users.append(VirtualUser(user.id, user.email, str(refresh.access_token), str(refresh), plan.id,
+                                 notification_ids[user.id]))
+
+    export = PlanExport(content_hash="0" * 64, kind=PlanExport.ExportKind.WORKOUT_PLAN,
+                        status=PlanExport.ExportStatus.READY, rendered_at=now)
+    export.file.save("load-test.docx", ContentFile(os.urandom(64 * 1024)), save=False)
+    export.size = export.file.size
+    export.save()
+    links = PlanExportLink.objects.bulk_create(PlanExportLink(export=export, user_id=user.id) for user in users)
+    return Dataset(users, tiers[1].id, exercise_ids, export.content_hash, links[0].token, authorities)
+
+
+class QueryCounter:
+    """Counts queries on every connection; the endpoints run one at a time, so the total divides per request."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def drive(endpoints: List[Endpoint], dataset: Dataset, args, counter: QueryCounter) -> dict:
+    import httpx
+    from django.core.handlers.asgi import ASGIHandler
+
+    results = {}
+    transport = httpx.ASGITransport(app=ASGIHandler())
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=None) as client:
+        for endpoint in endpoints:
+            limit = asyncio.Semaphore(args.concurrency)
+            samples = []
+
+            async def one(index):
+                path, body = endpoint.build(dataset, index)
+                headers = {"Authorization": f"Bearer {dataset.user(index).access}"} if endpoint.auth else {}
+                async with limit:
+                    started = time.perf_counter()
+                    response = await client.request(endpoint.method, path, json=body, headers=headers)
+                    elapsed = time.perf_counter() - started
+                if response.status_code not in endpoint.expect and not samples:
+                    samples.append(f"{response.status_code} {response.text[-300:]}")
+                return response.status_code, elapsed
+
+            await one(args.requests)  # Warm-up: first-call imports, schema and URL resolver caches
+            samples.clear()
+            counter.count = 0
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(one(index) for index in range(args.requests)))
+            elapsed = time.perf_counter() - started
+            latencies = sorted(latency for _, latency in responses)
+            results[endpoint.name] = {
+                "requests": len(responses),
+                "errors": sum(1 for status, _ in responses if status not in endpoint.expect),
+                "throughput_rps": round(len(responses) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "queries_per_request": round(counter.count / len(responses), 2),
+                **({"sample_error": samples[0]} if samples else {}),
+            }
+            print(f"  {endpoint.name:<46}{results[endpoint.name]['throughput_rps']:>8} rps", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} rps")
+        # Query counts are deterministic up to cache state; a whole extra query per request is a real change
+        if current["queries_per_request"] > before["queries_per_request"] + 0.5:
+            regressions.append(f"{name}: queries/request {before['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: unexpected responses {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+def configure_offline():
+    # Must run before Django settings load: REDIS_URL="" selects the local cache and in-process event hub
+    os.environ.update(REDIS_URL="", CELERY_BROKER_URL="memory://", CELERY_RESULT_BACKEND="cache+memory://")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    setup_django()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--virtual-users", type=int, default=200, help="users that send requests")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--gateway-latency-ms", type=float, default=50)
+    parser.add_argument("--endpoint", action="append", help="only endpoints whose name contains this (repeatable)")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    configure_offline()
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import override_settings
+
+    endpoints = [endpoint for endpoint in ENDPOINTS
+                 if not args.endpoint or any(part in endpoint.name for part in args.endpoint)]
+    counter = QueryCounter()
+    connection_created.connect(counter.install)
+    gateway = GatewayStub(latency=args.gateway_latency_ms / 1000).start()
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory, **gateway.settings()):
+        use_file_sqlite(directory)
+        with temporary_database():
+            with timed(timings, "seed"):
+                dataset = seed(args)
+            for connection in connections.all(initialized_only=True):
+                counter.install(connection)
+            print(f"seeded {args.users} users in {timings['seed']:.1f}s", file=sys.stderr)
+            results = asyncio.run(drive(endpoints, dataset, args, counter))
+    gateway.shutdown()
+
+    print(f"\n{'endpoint':<46}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}{'errors':>8}")
+    for name, row in results.items():
+        print(f"{name:<46}{row['throughput_rps']:>8}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+              f"{row['queries_per_request']:>7}{row['errors']:>8}")
+    for name, row in results.items():
+        if "sample_error" in row:
+            print(f"{name}: unexpected response {row['sample_error']}")
+
+    config = {key: getattr(args, key) for key in ("users", "virtual_users", "concurrency", "requests",
+                                                  "gateway_latency_ms")}
+    report = {"config": config, "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                                            "cpus": os.cpu_count()}, "endpoints": results}
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nbaseline saved to {args.save_baseline}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["config"] != config:
+            print(f"\nnote: baseline was recorded with {baseline['config']}")
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+        for line in regressions:
+            print(f"  {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Caller-side cost of a log line: print() and a plain StreamHandler against gymbackend.logs.QueueingHandler.
+
+Writes go to a stream that sleeps --write-delay-ms per write, standing in for a stdout pipe under back-pressure
+(a slow log collector or a full pipe buffer). Only the time spent in the calling thread is measured, which is what
+a request worker pays; the queueing handler's background thread absorbs the slow writes.
+
+Usage (from src/):
+    python -m benchmarks.logging_overhead --lines 2000 --write-delay-ms 0.5
+"""
+import argparse
+import logging
+import time
+
+from .utils import setup_django
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def time_lines(emit, lines: int) -> float:
+    started = time.perf_counter()
+    for index in range(lines):
+        emit(index)
+    return (time.perf_counter() - started) / lines * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--write-delay-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    setup_django()
+    from gymbackend.logs import ContextFilter, JSONFormatter, QueueingHandler, log_context
+
+    stream = SlowStream(args.write_delay_ms / 1000)
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JSONFormatter())
+    # Large enough that nothing is dropped, so the comparison is like for like
+    queueing_handler = QueueingHandler(stream=stream, queue_size=args.lines + 1)
+    queueing_handler.setFormatter(JSONFormatter())
+    queueing_handler.addFilter(ContextFilter())
+
+    results = {"print()": time_lines(lambda i: print(f"Payment A{i} verified", file=stream), args.lines)}
+    for name, handler in (("StreamHandler + JSON", stream_handler), ("QueueingHandler + JSON", queueing_handler)):
+        logger = logging.getLogger(f"benchmarks.logging_overhead.{name}")
+        logger.propagate = False
+        logger.addHandler(handler)
+        with log_context(request_id="bench", transaction_id="A0"):
+            results[name] = time_lines(
+                lambda i: logger.info("Payment %s verified", f"A{i}", extra={"event": "payment.verified"}), args.lines)
+
+    started = time.perf_counter()
+    queueing_handler.stop()
+    drain = time.perf_counter() - started
+
+    print(f"{'path':<26}{'caller us/line':>16}")
+    for name, per_line in results.items():
+        print(f"{name:<26}{per_line:>16.1f}")
+    print(f"\nbackground thread still draining after the run: {drain:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
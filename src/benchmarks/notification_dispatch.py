@@ -0,0 +1,59 @@
+"""
+Benchmark for draining the notification outbox.
+
+Seeds a temporary database with one "your plan expires in 3 days" reminder per user,
+then times notifications.dispatcher.dispatch_pending against the local stub channel.
+
+Usage (from src/):
+    python -m benchmarks.notification_dispatch --notifications 100000 --batch-size 1000
+"""
+import argparse
+
+from .utils import setup_django, temporary_database, timed
+
+
+def seed(count: int, batch_size: int = 5000):
+    from django.contrib.auth import get_user_model
+    from notifications.models import NotificationOutbox
+
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        [User(email=f"bench{i}@example.com", username=f"bench{i}", password="!") for i in range(count)],
+        batch_size=batch_size,
+    )
+    payload = {"title": "Your plan expires soon", "body": "Your plan expires in 3 days."}
+    NotificationOutbox.objects.bulk_create(
+        [NotificationOutbox(user=user, channel="stub", kind="subscription_expiring", payload=payload,
+                            dedupe_key=f"stub:bench:{user.id}") for user in users],
+        batch_size=batch_size,
+    )
+    return len(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from notifications.channels import LocalStubChannel
+    from notifications.dispatcher import dispatch_pending
+
+    results = {}
+    with temporary_database():
+        with timed(results, "seed"):
+            seeded = seed(args.notifications)
+        with timed(results, "dispatch"):
+            totals = dispatch_pending(batch_size=args.batch_size, time_budget_seconds=3600)
+
+    print(f"notifications seeded: {seeded}")
+    print(f"seed time:            {results['seed']:.2f}s")
+    print(f"sent:                 {totals['sent']} (stub received {len(LocalStubChannel.sent)})")
+    print(f"failed:               {totals['failed']}")
+    print(f"dispatch time:        {results['dispatch']:.2f}s")
+    print(f"throughput:           {totals['sent'] / results['dispatch']:.0f} notifications/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark for the daily workout plan activation job.
+
+Seeds a temporary database with one active plan from last week and one scheduled
+plan starting today per user, then times workout.services.activate_due_workout_plans.
+
+Usage (from src/):
+    python -m benchmarks.plan_activation --plans 100000 --chunk-size 5000
+"""
+import argparse
+from datetime import timedelta
+
+from .utils import setup_django, temporary_database, timed
+
+
+def seed(plans: int, batch_size: int = 5000):
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from workout.models import WorkoutPlan
+
+    User = get_user_model()
+    today = timezone.now().date()
+    users = User.objects.bulk_create(
+        [User(email=f"bench{i}@example.com", username=f"bench{i}", password="!") for i in range(plans // 2)],
+        batch_size=batch_size,
+    )
+    rows = []
+    for user in users:
+        rows.append(WorkoutPlan(user=user, state=WorkoutPlan.PlanState.ACTIVE,
+                                start_date=today - timedelta(days=7), end_date=today - timedelta(days=1)))
+        rows.append(WorkoutPlan(user=user, state=WorkoutPlan.PlanState.SCHEDULED,
+                                start_date=today, end_date=today + timedelta(days=6)))
+    WorkoutPlan.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from workout.services import activate_due_workout_plans
+
+    results = {}
+    with temporary_database():
+        with timed(results, "seed"):
+            seeded = seed(args.plans)
+        with CaptureQueriesContext(connection) as queries, timed(results, "activate"):
+            counts = activate_due_workout_plans(chunk_size=args.chunk_size)
+
+    print(f"plans seeded:      {seeded}")
+    print(f"seed time:         {results['seed']:.2f}s")
+    print(f"activated:         {counts['activated']}")
+    print(f"archived:          {counts['archived']}")
+    print(f"activation time:   {results['activate']:.2f}s")
+    print(f"queries executed:  {len(queries.captured_queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Serialization cost per endpoint: Ninja's stdlib JSONRenderer/Parser against gymbackend.renderers (orjson).
+
+Builds a representative payload for each endpoint, runs it through the endpoint's response schema the way Ninja
+does before rendering (validate, then dump to Python), and times rendering the result with both renderers. Request
+parsing is timed the same way for the endpoints that take large bodies. No database is needed.
+
+Usage (from src/):
+    python -m benchmarks.serialization --repeat 2000
+"""
+import argparse
+import timeit
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from .utils import setup_django
+
+
+def response_payloads() -> dict:
+    from typing import List
+
+    from accounts.schemas import MeasurementChartSchemaOut, UserWithProfileResponse
+    from notifications.schemas import InboxPageSchemaOut
+    from subscription.schemas import PlanTierSchema, UserSubscriptionSchema
+    from workout.schemas import ExerciseProgressSchemaOut
+
+    now = datetime(2025, 6, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+    tier = {"id": 1, "name": "Premium", "price": 150000.0, "currency": "IRR", "duration_days": 30,
+            "max_requests": 100, "description": "Personalised plans and priority generation", "is_active": True}
+    rollup = {"sets": 12, "reps": 96, "volume": 5120.5, "top_weight": 102.5, "best_e1rm": 118.4}
+    return {
+        "GET /subscription/tiers": (List[PlanTierSchema], [dict(tier, id=i) for i in range(20)]),
+        "GET /subscription/status": (UserSubscriptionSchema, {
+            "id": 1, "plan_tier": tier, "status": "active", "start_date": now,
+            "expire_date": now + timedelta(days=30), "is_active": True, "latest_payment_transaction_id": "A0001",
+        }),
+        "GET /users/profile": (UserWithProfileResponse, {
+            "user": {"id": 1, "email": "user@example.com", "username": "user", "name": "Sam", "family_name": "Lee",
+                     "is_active": True, "date_joined": now},
+            "profile": {"city": "Tehran", "birthday_date": date(1995, 4, 2), "sex": "Male", "goal": "Lose weight",
+                        "fitness_level": "Beginner", "height": 178.0, "weight": 82.5, "age": 30, "bmi": 26.04,
+                        "bmr": 1790.5, "tdee": 2775.3, "target_calories": 2275.3},
+        }),
+        "GET /notifications (100)": (InboxPageSchemaOut, {
+            "items": [{"id": i, "kind": "plan_ready", "title": "Your plan is ready", "body": "Week 3 is ready.",
+                       "data": {"plan_id": i, "week_number": 3}, "is_read": i % 3 == 0,
+                       "created_at": now - timedelta(minutes=i)} for i in range(100)],
+            "next_cursor": "MjAyNS0wNi0wMVQxMjozMDoxNXwxMDA=", "unread_count": 66,
+        }),
+        "GET /users/measurements/chart (2000)": (MeasurementChartSchemaOut, {
+            "metric": "weight", "total_points": 2000,
+            "points": [{"measured_at": now - timedelta(hours=i), "value": 80 + (i % 50) / 10} for i in range(2000)],
+        }),
+        "GET /workouts/progress/exercises/{id}": (ExerciseProgressSchemaOut, {
+            "exercise_id": 7,
+            "daily": [dict(rollup, day=date(2025, 6, 1) - timedelta(days=i)) for i in range(90)],
+            "weekly": [dict(rollup, week_start=date(2025, 6, 2) - timedelta(weeks=i)) for i in range(26)],
+            "personal_record": {"exercise_id": 7, "max_weight": 110.0, "max_weight_reps": 3,
+                                "max_weight_on": date(2025, 5, 20), "best_e1rm": 121.0,
+                                "best_e1rm_on": date(2025, 5, 20)},
+        }),
+    }
+
+
+def request_bodies() -> dict:
+    from ninja.renderers import JSONRenderer
+
+    session = {
+        "client_uuid": None, "performed_on": "2025-06-01", "started_at": "2025-06-01T18:00:00Z",
+        "ended_at": "2025-06-01T19:05:00Z", "notes": "",
+        "sets": [{"exercise_id": i % 8 + 1, "reps": 8, "weight": 60.0, "rpe": 8.0} for i in range(20)],
+    }
+    batch = {"sessions": [dict(session, client_uuid=str(uuid.uuid4())) for _ in range(50)]}
+    render = JSONRenderer().render
+    return {
+        "POST /workouts/sessions/batch (50x20)": render(None, batch, response_status=200).encode(),
+        "POST /notifications/mark-read (100)": render(None, {"ids": list(range(100))}, response_status=200).encode(),
+    }
+
+
+def per_call_us(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from ninja.parser import Parser
+    from ninja.renderers import JSONRenderer
+    from pydantic import TypeAdapter
+
+    from gymbackend.renderers import ORJSONParser, ORJSONRenderer
+
+    stdlib, fast = JSONRenderer(), ORJSONRenderer()
+    print(f"{'response':<40}{'schema us':>11}{'json us':>10}{'orjson us':>11}{'speedup':>9}{'bytes':>9}")
+    for name, (schema, payload) in response_payloads().items():
+        adapter = TypeAdapter(schema)
+        data = adapter.dump_python(adapter.validate_python(payload))
+        schema_us = per_call_us(lambda: adapter.dump_python(adapter.validate_python(payload)), args.repeat)
+        json_us = per_call_us(lambda: stdlib.render(None, data, response_status=200), args.repeat)
+        orjson_us = per_call_us(lambda: fast.render(None, data, response_status=200), args.repeat)
+        size = len(fast.render(None, data, response_status=200))
+        print(f"{name:<40}{schema_us:>11.1f}{json_us:>10.1f}{orjson_us:>11.1f}{json_us / orjson_us:>8.1f}x{size:>9}")
+
+    factory = RequestFactory()
+    print(f"\n{'request':<40}{'json us':>10}{'orjson us':>11}{'speedup':>9}{'bytes':>9}")
+    for name, body in request_bodies().items():
+        request = factory.post("/", data=body, content_type="application/json")
+        json_us = per_call_us(lambda: Parser().parse_body(request), args.repeat)
+        orjson_us = per_call_us(lambda: ORJSONParser().parse_body(request), args.repeat)
+        print(f"{name:<40}{json_us:>10.1f}{orjson_us:>11.1f}{json_us / orjson_us:>8.1f}x{len(body):>9}")
+
+
+if __name__ == "__main__":
+    main()
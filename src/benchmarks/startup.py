@@ -0,0 +1,38 @@
+"""
+Import-time audit and cold start time for the web and worker process roles (PROCESS_ROLE).
+
+Each run starts a fresh interpreter that does what the role does before serving: the web role sets Django up and
+imports the URLconf (and with it every API module), the worker role sets Django up and imports the Celery task
+modules. Reports the fastest of --runs cold starts, the top-level packages that took the most import time (self
+time, from -X importtime) and any module that the role should have deferred but loaded anyway.
+
+Usage (from src/):
+    python -m benchmarks.startup --runs 5 --top 15
+"""
+import argparse
+
+from gymbackend.startup import ROLE_ENTRYPOINTS, STARTUP_BUDGET_SECONDS, measure_startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--role", choices=sorted(ROLE_ENTRYPOINTS), action="append")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for role in args.role or sorted(ROLE_ENTRYPOINTS):
+        reports = [measure_startup(role) for _ in range(args.runs)]
+        audit = measure_startup(role, import_times=True)
+        fastest = min(report.seconds for report in reports)
+        print(f"{role}: cold start {fastest:.3f}s (fastest of {args.runs}, "
+              f"budget {STARTUP_BUDGET_SECONDS[role]:.1f}s)")
+        print(f"  should be deferred but loaded: {', '.join(audit.unexpected_modules) or 'none'}")
+        print(f"  {'package':<28}{'import ms':>10}")
+        for package, seconds in list(audit.import_seconds.items())[:args.top]:
+            print(f"  {package:<28}{seconds * 1000:>10.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
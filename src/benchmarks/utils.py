@@ -0,0 +1,47 @@
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gymbackend.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def temporary_database():
+    """Run the block against a freshly created test database so benchmarks never touch real data."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def use_file_sqlite(directory: str):
+    """
+    The in-memory SQLite test database fails concurrent writers immediately; a file database waits for the lock.
+    IMMEDIATE transactions take the write lock up front, since a transaction that upgrades from reading to writing
+    fails at once rather than waiting when another writer holds it.
+    """
+    from django.db import connection
+
+    if connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "bench.sqlite3")
+        connection.settings_dict["OPTIONS"].update(
+            timeout=60, transaction_mode="IMMEDIATE",
+            init_command="PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;")
+
+
+@contextmanager
+def timed(results: dict, key: str):
+    started = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - started
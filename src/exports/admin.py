@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import PlanExport, PlanExportLink
+
+
+@admin.register(PlanExport)
+class PlanExportAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'kind', 'status', 'size', 'created_at', 'rendered_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('=content_hash',)
+    readonly_fields = ('created_at', 'rendered_at')
+
+
+@admin.register(PlanExportLink)
+class PlanExportLinkAdmin(admin.ModelAdmin):
+    list_display = ('export', 'user', 'created_at')
+    raw_id_fields = ('export', 'user')
+    readonly_fields = ('token', 'created_at')
@@ -0,0 +1,60 @@
+from ninja import Router
+from ninja_jwt.authentication import JWTAuth
+from django.urls import reverse
+
+from workout.models import WorkoutPlan
+from .models import PlanExport, PlanExportLink
+from .schemas import PlanExportSchemaOut, ErrorDetailSchema
+from .services import request_plan_export, share_export
+from .streaming import ranged_file_response
+
+exports_router = Router(auth=JWTAuth())
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def _export_schema_data(export: PlanExport, link: PlanExportLink) -> dict:
+    ready = export.status == PlanExport.ExportStatus.READY
+    return {
+        "content_hash": export.content_hash,
+        "kind": export.kind,
+        "status": export.status,
+        "size": export.size,
+        "download_url": reverse('api-1.0.0:download_export', args=[link.token]) if ready else None,
+    }
+
+
+@exports_router.post("/workout-plans/{plan_id}", response={200: PlanExportSchemaOut, 202: PlanExportSchemaOut,
+                                                             404: ErrorDetailSchema})
+def export_workout_plan(request, plan_id: int):
+    plan = WorkoutPlan.objects.filter(id=plan_id, user=request.auth).first()
+    if not plan:
+        return 404, {"detail": "Workout plan not found."}
+    title = f"Workout Plan - Week {plan.week_number} ({plan.start_date} to {plan.end_date})"
+    export = request_plan_export(PlanExport.ExportKind.WORKOUT_PLAN, title, plan.content)
+    link = share_export(export, request.auth)
+    return (200 if export.status == PlanExport.ExportStatus.READY else 202), _export_schema_data(export, link)
+
+
+@exports_router.get("/{content_hash}", response={200: PlanExportSchemaOut, 404: ErrorDetailSchema})
+def get_export_status(request, content_hash: str):
+    link = PlanExportLink.objects.select_related('export').filter(
+        export__content_hash=content_hash, user=request.auth).first()
+    if not link:
+        return 404, {"detail": "Export not found."}
+    return 200, _export_schema_data(link.export, link)
+
+
+# The random link token is the capability, not the content hash, which can be derived from a guessable plan.
+# Downloads are shareable links and never trigger rendering.
+@exports_router.get("/{token}/download", auth=None, url_name="download_export", response={404: ErrorDetailSchema})
+def download_export(request, token: str):
+    link = PlanExportLink.objects.select_related('export').filter(
+        token=token, export__status=PlanExport.ExportStatus.READY).first()
+    if not link:
+        return 404, {"detail": "Export not found or not ready yet."}
+    export = link.export
+    return ranged_file_response(
+        request, export.file.open('rb'), export.size, DOCX_CONTENT_TYPE,
+        filename=f"{export.kind}-{export.content_hash[:12]}.docx", etag=export.content_hash,
+    )
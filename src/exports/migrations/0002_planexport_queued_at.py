@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planexport',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
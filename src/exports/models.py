@@ -0,0 +1,53 @@
+import secrets
+
+from django.conf import settings
+from django.db import models
+
+
+class PlanExport(models.Model):
+    class ExportKind(models.TextChoices):
+        WORKOUT_PLAN = 'workout_plan', 'Workout Plan'
+
+    class ExportStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
+    content_hash = models.CharField(max_length=64, unique=True,
+                                    help_text="SHA-256 of the rendered plan content and renderer version")
+    kind = models.CharField(max_length=20, choices=ExportKind.choices)
+    status = models.CharField(max_length=20, choices=ExportStatus.choices, default=ExportStatus.PENDING)
+    file = models.FileField(upload_to='exports/', blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the last render was queued; a PENDING export not rendered within PLAN_EXPORT_RENDER_TIMEOUT_SECONDS is
+    # queued again, since the task may have been lost
+    queued_at = models.DateTimeField(null=True, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} export {self.content_hash[:12]} ({self.status})"
+
+
+def new_share_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class PlanExportLink(models.Model):
+    """
+    A user's access to a content-addressed export. Identical plans share one render, so the export itself has no
+    owner; status lookups go through the requesting user's link and anonymous downloads through its random token.
+    """
+    export = models.ForeignKey(PlanExport, on_delete=models.CASCADE, related_name='links')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='plan_export_links')
+    token = models.CharField(max_length=64, unique=True, default=new_share_token, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['export', 'user'], name='one_export_link_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.export} for {self.user_id}"
@@ -0,0 +1,47 @@
+import io
+
+RENDERER_VERSION = "docx-v1"
+
+
+def render_workout_plan_docx(title: str, content: dict) -> bytes:
+    # python-docx pulls in lxml; keep it out of web process startup
+    from docx import Document
+
+    document = Document()
+    document.add_heading(title, level=0)
+    document.add_paragraph(
+        f"Goal: {content.get('goal', '-')}    Level: {content.get('fitness_level', '-')}    "
+        f"Week {content.get('week_number', '-')} ({content.get('phase', '-')})"
+    )
+
+    for day in content.get("days", []):
+        document.add_heading(f"{day.get('title', '')} - {day.get('date', '')}", level=1)
+        exercises = day.get("exercises", [])
+        if not exercises:
+            document.add_paragraph("Rest day")
+            continue
+        table = document.add_table(rows=1, cols=5)
+        table.style = 'Light Grid Accent 1'
+        for cell, label in zip(table.rows[0].cells, ("Exercise", "Sets", "Reps", "Rest (s)", "Intensity")):
+            cell.text = label
+        for exercise in exercises:
+            cells = table.add_row().cells
+            cells[0].text = exercise.get("name", "")
+            cells[1].text = str(exercise.get("sets", ""))
+            cells[2].text = str(exercise.get("reps", ""))
+            cells[3].text = str(exercise.get("rest_seconds", ""))
+            intensity = exercise.get("intensity")
+            cells[4].text = f"{intensity:.0%} 1RM" if intensity else ""
+
+    if content.get("coach_notes"):
+        document.add_heading("Coach notes", level=1)
+        document.add_paragraph(content["coach_notes"])
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'workout_plan': render_workout_plan_docx,
+}
@@ -0,0 +1,14 @@
+from ninja import Schema
+from typing import Optional
+
+
+class PlanExportSchemaOut(Schema):
+    content_hash: str
+    kind: str
+    status: str
+    size: Optional[int] = None
+    download_url: Optional[str] = None
+
+
+class ErrorDetailSchema(Schema):
+    detail: str
@@ -0,0 +1,57 @@
+import hashlib
+import json
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PlanExport, PlanExportLink
+from .rendering import RENDERER_VERSION
+from .tasks import render_plan_export
+
+
+def plan_content_hash(kind: str, title: str, content: dict) -> str:
+    canonical = json.dumps(
+        {"renderer": RENDERER_VERSION, "kind": kind, "title": title, "content": content},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _needs_render(export: PlanExport, now) -> bool:
+    """
+    Claims a re-render for a FAILED export, a PENDING one whose render was queued too long ago (the broker call failed
+    or the worker lost the task), or a READY one whose file is gone from storage. The conditional update makes only
+    one of several concurrent requests queue it.
+    """
+    Status = PlanExport.ExportStatus
+    same_row = PlanExport.objects.filter(pk=export.pk, status=export.status, queued_at=export.queued_at)
+    if export.status == Status.PENDING:
+        cutoff = now - timedelta(seconds=settings.PLAN_EXPORT_RENDER_TIMEOUT_SECONDS)
+        if export.queued_at is not None and export.queued_at >= cutoff:
+            return False
+    elif export.status == Status.READY and export.file and default_storage.exists(export.file.name):
+        return False
+    return bool(same_row.update(status=Status.PENDING, error="", queued_at=now))
+
+
+def request_plan_export(kind: str, title: str, content: dict) -> PlanExport:
+    """Return the export for this exact plan content, queueing a render only if no usable artifact exists."""
+    content_hash = plan_content_hash(kind, title, content)
+    now = timezone.now()
+    export, created = PlanExport.objects.get_or_create(content_hash=content_hash,
+                                                       defaults={"kind": kind, "queued_at": now})
+    if created or _needs_render(export, now):
+        export.status = PlanExport.ExportStatus.PENDING
+        export.queued_at = now
+        transaction.on_commit(lambda: render_plan_export.delay(export.id, title, content))
+    return export
+
+
+def share_export(export: PlanExport, user) -> PlanExportLink:
+    """Return the user's link to the export, creating it on their first request."""
+    link, _ = PlanExportLink.objects.get_or_create(export=export, user=user)
+    return link
@@ -0,0 +1,76 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def _aiter_file(file, start: int, length: int):
+    # Under ASGI, Django buffers a sync iterator whole before sending it, so chunks are read in a worker thread. Reads
+    # never touch the database, so they need not wait for the thread sync views run on.
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def _parse_range(header: str, size: int):
+    """Return (start, end) for a single satisfiable byte range, None for no/ignored range, or False if unsatisfiable."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def ranged_file_response(request, file, size: int, content_type: str, filename: str, etag: str):
+    """Stream an immutable stored file to its requester, honouring conditional GETs and single byte-range requests."""
+    quoted_etag = f'"{etag}"'
+    common_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": quoted_etag,
+        # Private: the link is a capability, so shared caches must not keep a copy
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if request.headers.get("If-None-Match") == quoted_etag:
+        file.close()
+        return HttpResponse(status=304, headers=common_headers)
+
+    byte_range = _parse_range(request.headers.get("Range", ""), size)
+    if byte_range is False:
+        file.close()
+        return HttpResponse(status=416, headers={**common_headers, "Content-Range": f"bytes */{size}"})
+    if byte_range and request.headers.get("If-Range", quoted_etag) != quoted_etag:
+        byte_range = None
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _aiter_file(file, start, length), status=206 if byte_range else 200, content_type=content_type,
+        headers={
+            **common_headers,
+            "Content-Length": str(length),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        },
+    )
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,29 @@
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import PlanExport
+from .rendering import RENDERERS
+
+
+@shared_task(name="exports.tasks.render_plan_export")
+def render_plan_export(export_id, title, content):
+    export = PlanExport.objects.filter(id=export_id).first()
+    if not export or export.status == PlanExport.ExportStatus.READY:
+        return f"Export {export_id} needs no rendering."
+
+    try:
+        document = RENDERERS[export.kind](title, content)
+        name = f"exports/{export.content_hash}.docx"
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        stored_name = default_storage.save(name, ContentFile(document))
+    except Exception as e:
+        PlanExport.objects.filter(id=export_id).update(status=PlanExport.ExportStatus.FAILED, error=str(e))
+        raise
+
+    PlanExport.objects.filter(id=export_id).update(
+        status=PlanExport.ExportStatus.READY, file=stored_name, size=len(document), rendered_at=timezone.now()
+    )
+    return f"Rendered export {export_id} ({len(document)} bytes)."
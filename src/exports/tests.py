@@ -0,0 +1,140 @@
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from ninja_jwt.tokens import AccessToken
+
+from workout.models import WorkoutPlan
+from . import streaming
+from .models import PlanExport
+from .services import plan_content_hash, request_plan_export
+from .tasks import render_plan_export
+
+User = get_user_model()
+
+PLAN_CONTENT = {
+    "goal": "MUSCLE_GAIN", "fitness_level": "BEGINNER", "week_number": 1, "phase": "build",
+    "days": [{"date": "2025-06-09", "title": "Full Body A", "exercises": [
+        {"exercise_id": 1, "name": "Goblet Squat", "sets": 4, "reps": 8, "rest_seconds": 90, "intensity": 0.7},
+    ]}],
+}
+
+
+class PlanExportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            email="exporter@example.com", username="exporter", name="Export", family_name="User",
+            password="SecurePassword123!"
+        )
+        start_date = date(2025, 6, 9)
+        self.plan = WorkoutPlan.objects.create(
+            user=self.user, state=WorkoutPlan.PlanState.ACTIVE, start_date=start_date,
+            end_date=start_date + timedelta(days=6), content=PLAN_CONTENT
+        )
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "exporter@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        self.auth_headers = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+
+    def _download(self, url, **headers):
+        async def download():
+            response = await AsyncClient().get(url, headers=headers)
+            return response, [chunk async for chunk in response.streaming_content] if response.streaming else []
+        return async_to_sync(download)()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_content_hash_is_order_independent(self):
+        reordered = dict(reversed(list(PLAN_CONTENT.items())))
+        self.assertEqual(plan_content_hash("workout_plan", "T", PLAN_CONTENT),
+                         plan_content_hash("workout_plan", "T", reordered))
+        self.assertNotEqual(plan_content_hash("workout_plan", "T", PLAN_CONTENT),
+                            plan_content_hash("workout_plan", "Other", PLAN_CONTENT))
+
+    def test_identical_plans_share_one_render(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            first = request_plan_export("workout_plan", "Title", PLAN_CONTENT)
+            second = request_plan_export("workout_plan", "Title", PLAN_CONTENT)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_lost_renders_and_missing_files_are_queued_again(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            export = request_plan_export("workout_plan", "Title", PLAN_CONTENT)
+        PlanExport.objects.filter(pk=export.pk).update(queued_at=timezone.now() - timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            request_plan_export("workout_plan", "Title", PLAN_CONTENT)
+            request_plan_export("workout_plan", "Title", PLAN_CONTENT)
+        self.assertEqual(len(callbacks), 1)
+
+        render_plan_export(export.id, "Title", PLAN_CONTENT)
+        export.refresh_from_db()
+        default_storage.delete(export.file.name)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertEqual(request_plan_export("workout_plan", "Title", PLAN_CONTENT).status,
+                             PlanExport.ExportStatus.PENDING)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_exports_are_only_visible_to_users_who_requested_them(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            content_hash = self.client.post(f"/api/exports/workout-plans/{self.plan.id}",
+                                            **self.auth_headers).json()["content_hash"]
+        other = User.objects.create_user(email="other@example.com", username="other", name="O", family_name="U",
+                                         password=None)
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(other)}"}
+        self.assertEqual(self.client.get(f"/api/exports/{content_hash}", **headers).status_code, 404)
+        self.assertEqual(self.client.get(f"/api/exports/{content_hash}", **self.auth_headers).status_code, 200)
+
+    def test_export_render_and_ranged_download(self):
+        url = f"/api/exports/workout-plans/{self.plan.id}"
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(url, **self.auth_headers)
+        self.assertEqual(response.status_code, 202, response.content.decode())
+        content_hash = response.json()["content_hash"]
+
+        export = PlanExport.objects.get(content_hash=content_hash)
+        title = f"Workout Plan - Week 1 ({self.plan.start_date} to {self.plan.end_date})"
+        render_plan_export(export.id, title, PLAN_CONTENT)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(url, **self.auth_headers)
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(len(callbacks), 0)
+        download_url = response.json()["download_url"]
+
+        full, chunks = self._download(download_url)
+        self.assertEqual(full.status_code, 200)
+        body = b"".join(chunks)
+        self.assertTrue(body.startswith(b"PK"))
+
+        partial, chunks = self._download(download_url, Range="bytes=10-19")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], f"bytes 10-19/{len(body)}")
+        self.assertEqual(b"".join(chunks), body[10:20])
+
+        self.assertEqual(self._download(download_url, Range=f"bytes={len(body)}-")[0].status_code, 416)
+        self.assertEqual(self._download(download_url, **{"If-None-Match": f'"{content_hash}"'})[0].status_code, 304)
+        self.assertTrue(full["Cache-Control"].startswith("private"))
+        self.assertEqual(self.client.get(f"/api/exports/{content_hash}/download").status_code, 404)
+
+        # Served under ASGI the file goes out chunk by chunk, not read into memory first
+        with mock.patch.object(streaming, "STREAM_CHUNK_SIZE", 1024):
+            full, chunks = self._download(download_url)
+        self.assertTrue(full.is_async)
+        self.assertEqual([len(chunk) for chunk in chunks[:-1]], [1024] * (len(chunks) - 1))
+        self.assertEqual(b"".join(chunks), body)
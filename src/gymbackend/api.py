@@ -1,13 +1,22 @@
 from ninja_extra import NinjaExtraAPI
-from ninja_jwt.controller import NinjaJWTDefaultController
+from ninja_jwt.controller import AsyncNinjaJWTDefaultController
 from accounts.api import auth_router as accounts_auth_router
 from accounts.api import profile_router as accounts_profile_router
 from subscription.api import SubscriptionController, PaymentCallbackController
+from workout.api import workout_router
+from exports.api import exports_router
+from notifications.api import notifications_router
+from analytics.api import analytics_router
+from .renderers import ORJSONParser, ORJSONRenderer
 
 
-api = NinjaExtraAPI(version="1.0.0", csrf=True)
+api = NinjaExtraAPI(version="1.0.0", csrf=True, renderer=ORJSONRenderer(), parser=ORJSONParser())
 api.add_router("/auth", accounts_auth_router, tags=["Authentication"])
 api.add_router("/users", accounts_profile_router, tags=["User & Profile"])
+api.add_router("/workouts", workout_router, tags=["Workouts"])
+api.add_router("/exports", exports_router, tags=["Exports"])
+api.add_router("/notifications", notifications_router, tags=["Notifications"])
+api.add_router("/analytics", analytics_router, tags=["Analytics"])
 api.register_controllers(SubscriptionController, PaymentCallbackController)
 
-api.register_controllers(NinjaJWTDefaultController)
+api.register_controllers(AsyncNinjaJWTDefaultController)
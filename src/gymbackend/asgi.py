@@ -3,6 +3,9 @@ ASGI config for gymbackend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The server-sent event stream (``/api/events/stream``) holds connections open and
+must be served through this module rather than WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
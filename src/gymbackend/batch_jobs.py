@@ -0,0 +1,125 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_jobs = {}
+
+
+@dataclass(frozen=True)
+class ShardedJob:
+    name: str
+    handler: Callable[..., dict]  # handler(user_id_from, user_id_to, **params) -> counts for ids in [from, to)
+    bounds: Callable[..., tuple]  # bounds(**params) -> (lowest, highest) user id with work, or (None, None)
+    chunk_size: int
+
+
+def user_id_bounds(**params) -> tuple:
+    bounds = get_user_model().objects.aggregate(low=Min('id'), high=Max('id'))
+    return bounds['low'], bounds['high']
+
+
+def sharded_job(name: str, bounds: Callable[..., tuple] = user_id_bounds, chunk_size: int = 1000):
+    """
+    Registers a handler as the sharded job `name`. The handler is called with consecutive user-id ranges of
+    `chunk_size` ids and the run's params, and returns a dict of counts. A shard that is interrupted repeats its
+    current chunk on resume, so handlers must be safe to run twice on the same range.
+    """
+    def register(handler):
+        _jobs[name] = ShardedJob(name, handler, bounds, chunk_size)
+        return handler
+    return register
+
+
+def split(low: int, high: int, shards: int) -> list:
+    """Splits the ids low..high into at most `shards` contiguous [start, end) ranges of equal width."""
+    width = max(1, -(-(high - low + 1) // shards))
+    return [[start, min(start + width, high + 1)] for start in range(low, high + 1, width)]
+
+
+def _run_key(name: str, run: str) -> str:
+    return f"batch_jobs:{name}:{run}"
+
+
+def _shard_key(name: str, run: str, index: int) -> str:
+    return f"batch_jobs:{name}:{run}:{index}"
+
+
+def dispatch(name: str, run: Optional[str] = None, shards: Optional[int] = None, **params) -> int:
+    """
+    Starts run `run` of job `name` (by default, one run per UTC day) as a chord of one task per shard, followed by
+    finish_sharded_job. The first dispatch of a run fixes its shard ranges and params; dispatching the same run again
+    skips the finished shards and resumes the others from their last completed chunk. Returns the number of shards.
+    Params must be JSON-serializable.
+    """
+    job = _jobs[name]
+    run = run or timezone.now().date().isoformat()
+    plan = cache.get(_run_key(name, run))
+    if plan is None:
+        low, high = job.bounds(**params)
+        plan = {
+            "ranges": [] if low is None else split(low, high, shards or settings.BATCH_JOB_SHARDS),
+            "params": params,
+        }
+        # Of two concurrent first dispatches, both go on with the plan stored first
+        cache.add(_run_key(name, run), plan, settings.BATCH_JOB_PROGRESS_TTL_SECONDS)
+        plan = cache.get(_run_key(name, run), plan)
+    if not plan["ranges"]:
+        finish_sharded_job([], name, run)
+        return 0
+    chord(
+        process_shard.s(name, run, index, start, end, plan["params"])
+        for index, (start, end) in enumerate(plan["ranges"])
+    )(finish_sharded_job.s(name, run))
+    return len(plan["ranges"])
+
+
+def progress(name: str, run: Optional[str] = None) -> Optional[dict]:
+    """The shard ranges of a run and each shard's checkpoint (None for shards that have not started)."""
+    run = run or timezone.now().date().isoformat()
+    plan = cache.get(_run_key(name, run))
+    if plan is None:
+        return None
+    return {
+        "ranges": plan["ranges"],
+        "shards": [cache.get(_shard_key(name, run, index)) for index in range(len(plan["ranges"]))],
+    }
+
+
+@shared_task(bind=True, name="gymbackend.batch_jobs.process_shard", acks_late=True, max_retries=3,
+             default_retry_delay=60)
+def process_shard(self, name, run, index, start, end, params):
+    job = _jobs[name]
+    key = _shard_key(name, run, index)
+    checkpoint = cache.get(key) or {"next": start, "done": start >= end, "counts": {}}
+    counts = Counter(checkpoint["counts"])
+    try:
+        while not checkpoint["done"]:
+            chunk_end = min(checkpoint["next"] + job.chunk_size, end)
+            counts.update(job.handler(checkpoint["next"], chunk_end, **params))
+            checkpoint = {"next": chunk_end, "done": chunk_end >= end, "counts": dict(counts)}
+            cache.set(key, checkpoint, settings.BATCH_JOB_PROGRESS_TTL_SECONDS)
+    except Exception as exc:
+        # The retry resumes after the last completed chunk
+        raise self.retry(exc=exc)
+    return checkpoint["counts"]
+
+
+@shared_task(name="gymbackend.batch_jobs.finish_sharded_job")
+def finish_sharded_job(shard_counts, name, run):
+    totals = Counter()
+    for counts in shard_counts:
+        totals.update(counts)
+    logger.info("Sharded job %s (run %s) finished %s shards: %s", name, run, len(shard_counts), dict(totals),
+                extra={"event": "batch_job.finished", "job": name, "run": run, "shards": len(shard_counts),
+                       "counts": dict(totals)})
+    return {"job": name, "run": run, "shards": len(shard_counts), "counts": dict(totals)}
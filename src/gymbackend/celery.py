@@ -1,7 +1,16 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from decouple import config
+
+from gymbackend.logs import current_context, reset_context, set_context
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gymbackend.settings')
+# Django's system checks import the URLconf and every API module. Worker processes skip them at startup; they run
+# under the web role on deploy (manage.py check).
+if config('PROCESS_ROLE', default='web') == 'worker':
+    os.environ.setdefault('CELERY_SKIP_CHECKS', 'true')
 app = Celery('gymbackend')
 
 # Using a string here means the worker doesn't have to serialize
@@ -13,20 +22,81 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Workers and beat run with PROCESS_ROLE=worker (see settings.INSTALLED_APPS).
+# LLM-bound tasks are routed per subscription tier (gymbackend.llm_queues) and should run on their own workers:
+#   PROCESS_ROLE=worker celery -A gymbackend worker -Q llm_premium,llm_standard   (interactive, premium drained first)
+#   PROCESS_ROLE=worker celery -A gymbackend worker -Q llm_batch                  (nightly jobs)
+
+
+@before_task_publish.connect
+def propagate_request_id(headers=None, **kwargs):
+    # Tasks queued while serving a request log with that request's id
+    request_id = current_context().get('request_id')
+    if request_id and headers is not None:
+        headers.setdefault('request_id', request_id)
+
+
+# Keyed by task id so eager tasks run inside another task restore the outer task's context
+_log_context_tokens = {}
+
+
+@task_prerun.connect
+def bind_task_log_context(task_id=None, task=None, **kwargs):
+    request_id = getattr(task.request, 'request_id', None) or (task.request.headers or {}).get('request_id')
+    _log_context_tokens[task_id] = set_context(
+        task_id=task_id, task=task.name, **({'request_id': request_id} if request_id else {}))
+
+
+@task_postrun.connect
+def unbind_task_log_context(task_id=None, **kwargs):
+    token = _log_context_tokens.pop(task_id, None)
+    if token is not None:
+        reset_context(token)
+
+
 # Optional: Celery Beat Schedulers
 app.conf.beat_schedule = {
+    'recompute-body-metrics-nightly': {
+        'task': 'accounts.tasks.recompute_body_metrics',
+        'schedule': crontab(hour=0, minute=30),  # Run daily at 0:30 AM
+    },
     'trigger-next-week-workout-generation-daily': {
-        'task': 'workout.tasks.schedule_next_workout_week_generation', # We will create this task
+        'task': 'workout.tasks.schedule_next_workout_week_generation',
         'schedule': crontab(hour=1, minute=0),  # Run daily at 1:00 AM
     },
     'activate-upcoming-workout-plans-daily': {
-        'task': 'workout.tasks.activate_upcoming_workout_plans', # We will create this task
+        'task': 'workout.tasks.activate_upcoming_workout_plans',
         'schedule': crontab(hour=2, minute=0), # Run daily at 2:00 AM
     },
     # Add other scheduled tasks here (e.g., subscription status updates, reminders)
-     'update-expired-subscriptions-daily': {
-        'task': 'subscription.tasks.update_expired_subscriptions_status', # We'll need to create this
-        'schedule': crontab(hour=3, minute=0), # Run daily at 3:00 AM
+    'update-expired-subscriptions-daily': {
+        'task': 'subscription.tasks.update_expired_subscriptions_status',
+        # Run daily at 3:00 AM; renewals still held by the 2:30 run are skipped, not expired under it
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'run-auto-renewals-daily': {
+        'task': 'subscription.tasks.run_auto_renewals',
+        'schedule': crontab(hour=2, minute=30),  # Run daily at 2:30 AM, before the expiry job
+    },
+    'queue-subscription-expiry-reminders-daily': {
+        'task': 'subscription.tasks.queue_subscription_expiry_reminders',
+        'schedule': crontab(hour=9, minute=0),  # Run daily at 9:00 AM
+    },
+    'archive-old-gateway-payloads-daily': {
+        'task': 'subscription.tasks.archive_old_gateway_payloads',
+        'schedule': crontab(hour=4, minute=0),  # Run daily at 4:00 AM
+    },
+    'reconcile-coupon-redemptions': {
+        'task': 'subscription.tasks.reconcile_coupon_redemptions',
+        'schedule': crontab(minute='*/5'),  # Run every 5 minutes
+    },
+    'refresh-analytics-rollups': {
+        'task': 'analytics.tasks.refresh_rollups',
+        'schedule': crontab(minute='*/15'),  # Run every 15 minutes
+    },
+    'dispatch-notification-outbox': {
+        'task': 'notifications.tasks.dispatch_notification_outbox',
+        'schedule': 60.0,  # Safety net; enqueueing also triggers a dispatch on commit
     },
 }
 
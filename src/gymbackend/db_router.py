@@ -0,0 +1,146 @@
+import base64
+import json
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = "db_primary_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@dataclass
+class RoutingState:
+    use_replica: bool = False
+    wrote: bool = False
+
+
+# Outside an HTTP request (Celery, management commands, shell) there is no state and every query goes to the primary
+_state: ContextVar[Optional[RoutingState]] = ContextVar("db_routing_state", default=None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to a replica only inside a read-only request from a client that has not written recently. The first
+    write in a request pins the rest of it to the primary, as does an open transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is None or not state.use_replica or not settings.DATABASE_REPLICAS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_primary():
+    token = _state.set(RoutingState(use_replica=False))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def reads_from_primary(view):
+    """
+    Runs a view with every read on the primary. For safe-method views that act on what they read, such as gateway
+    callbacks or status checks that write the row back: a lagging replica would hand them stale or missing rows.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with use_primary():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with use_primary():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+def _pin_key(user_id: str) -> str:
+    return f"db_router:pin:{user_id}"
+
+
+def _token_user_id(request) -> Optional[str]:
+    # Authentication runs after this middleware, so the claim is read without verifying the token. It only decides
+    # where reads go: a forged claim can at most send someone else's reads to the primary.
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme != "Bearer" or token.count(".") != 2:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.split(".")[1] + "=="))
+    except ValueError:
+        return None
+    user_id = payload.get(settings.NINJA_JWT.get("USER_ID_CLAIM", "user_id")) if isinstance(payload, dict) else None
+    return None if user_id is None else str(user_id)
+
+
+def _user_id(request) -> Optional[str]:
+    user = getattr(request, "auth", None)
+    if user is not None and getattr(user, "is_authenticated", False):
+        return str(user.pk)
+    return _token_user_id(request)
+
+
+def _begin(request, user_pinned: bool):
+    pinned = user_pinned or PIN_COOKIE in request.COOKIES
+    state = RoutingState(use_replica=request.method in SAFE_METHODS and not pinned)
+    return state, _state.set(state)
+
+
+def _finish(request, response, state, token) -> Optional[str]:
+    """Returns the cache key to pin the signed-in user to the primary with, if the request wrote"""
+    _state.reset(token)
+    if not state.wrote:
+        return None
+    user_id = _user_id(request)
+    if user_id is not None:
+        return _pin_key(user_id)
+    # JWT clients do not send cookies back, so the cookie only pins anonymous ones
+    response.set_cookie(PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+    return None
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            user_id = _token_user_id(request) if settings.DATABASE_REPLICAS else None
+            state, token = _begin(request, user_id is not None and bool(await cache.aget(_pin_key(user_id))))
+            response = await get_response(request)
+            if pin_key := _finish(request, response, state, token):
+                await cache.aset(pin_key, 1, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+            return response
+    else:
+        def middleware(request):
+            user_id = _token_user_id(request) if settings.DATABASE_REPLICAS else None
+            state, token = _begin(request, user_id is not None and bool(cache.get(_pin_key(user_id))))
+            response = get_response(request)
+            if pin_key := _finish(request, response, state, token):
+                cache.set(pin_key, 1, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+            return response
+    return middleware
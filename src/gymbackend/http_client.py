@@ -0,0 +1,39 @@
+import asyncio
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+
+# Overridable for load tests, which swap the payment gateway for an in-process stub
+transport = None
+
+_clients = weakref.WeakKeyDictionary()
+
+
+async def _mark_start(request: httpx.Request):
+    request.extensions["started_at"] = time.perf_counter()
+
+
+async def _record_duration(response: httpx.Response):
+    # Time to response headers, which is what the request spends waiting
+    metrics.record_outbound_http(time.perf_counter() - response.request.extensions["started_at"])
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    One pooled client per event loop, so calls to the same host reuse keep-alive connections. Under ASGI that is one
+    client per worker; sync callers going through async_to_sync get a short-lived loop and therefore a fresh client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=settings.OUTBOUND_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.OUTBOUND_HTTP_MAX_CONNECTIONS),
+            transport=transport,
+            event_hooks={"request": [_mark_start], "response": [_record_duration]},
+        )
+    return client
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import uuid
+from functools import wraps
+from typing import Awaitable, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from ninja.errors import HttpError
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL_SECONDS = 0.05
+
+
+def _request_from(args, kwargs) -> HttpRequest:
+    # Router views take the request first; controller methods get the controller instance before it
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, HttpRequest):
+            return value
+    raise TypeError("idempotent views must take the request as an argument")
+
+
+def _cache_keys(scope: str, request: HttpRequest, key: str, fingerprint: str):
+    user = getattr(request, "auth", None)
+    if getattr(user, "is_authenticated", False):
+        owner = user.pk
+    else:
+        # Anonymous clients share no identity, so their keys are scoped to the caller's address and the exact body;
+        # a key reused with another body starts a new request instead of being rejected
+        client = f"{request.META.get('REMOTE_ADDR', '')}:{fingerprint}"
+        owner = "anonymous:" + hashlib.sha256(client.encode()).hexdigest()
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    base = f"idempotency:{scope}:{owner}:{digest}"
+    return f"{base}:response", f"{base}:lock"
+
+
+def _stored(fingerprint: str, result, redact: tuple) -> dict:
+    status, data = result if isinstance(result, tuple) else (200, result)
+    if hasattr(data, "model_dump"):
+        data = data.model_dump(mode="json")
+    if redact:
+        data = {name: value for name, value in data.items() if name not in redact}
+    return {"fingerprint": fingerprint, "status": status, "data": data}
+
+
+async def _replay(fingerprint: str, stored: dict, reissue: Optional[Callable[[dict], Awaitable[dict]]]):
+    if stored["fingerprint"] != fingerprint:
+        raise HttpError(422, f"{HEADER} was already used with a different request.")
+    if "error" in stored:
+        raise HttpError(stored["status"], stored["error"])
+    data = stored["data"]
+    if reissue is not None:
+        data = {**data, **await reissue(data)}
+    return stored["status"], data
+
+
+def idempotent(scope: str, redact: tuple = (), reissue: Optional[Callable[[dict], Awaitable[dict]]] = None):
+    """
+    Honours an Idempotency-Key header on an async ninja view. The first response (2xx-4xx, including HttpErrors) is
+    kept in the cache for IDEMPOTENCY_KEY_TTL_SECONDS per user and scope, and retries with the same key and body get
+    it back without the view running again. A duplicate that arrives while the first is still running waits for its
+    response (up to IDEMPOTENCY_WAIT_SECONDS, then 409) instead of running concurrently. 5xx responses and unhandled
+    exceptions are not kept, so those can be retried. Without the header the view runs as usual.
+
+    Top-level response fields named in `redact` (credentials) are never written to the cache; on replay `reissue` is
+    awaited with the stored body and returns fresh values for them.
+
+    Goes below the route decorator, so it runs after authentication. Views must return dicts or Schemas.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            request = _request_from(args, kwargs)
+            key = request.headers.get(HEADER)
+            if key is None:
+                return await view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise HttpError(400, f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.")
+
+            fingerprint = hashlib.sha256(request.body).hexdigest()
+            response_key, lock_key = _cache_keys(scope, request, key, fingerprint)
+            token = uuid.uuid4().hex
+            deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                stored = await cache.aget(response_key)
+                if stored is not None:
+                    return await _replay(fingerprint, stored, reissue)
+                if await cache.aadd(lock_key, {"token": token, "fingerprint": fingerprint},
+                                    timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+                    break
+                holder = await cache.aget(lock_key)
+                if holder is not None and holder["fingerprint"] != fingerprint:
+                    raise HttpError(422, f"{HEADER} was already used with a different request.")
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise HttpError(409, f"A request with this {HEADER} is still being processed.")
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+            try:
+                try:
+                    result = await view(*args, **kwargs)
+                except HttpError as error:
+                    if error.status_code < 500:
+                        await cache.aset(response_key, {"fingerprint": fingerprint, "status": error.status_code,
+                                                        "error": error.message},
+                                         timeout=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+                    raise
+                stored = _stored(fingerprint, result, redact)
+                if stored["status"] < 500:
+                    await cache.aset(response_key, stored, timeout=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+                return result
+            finally:
+                holder = await cache.aget(lock_key)
+                if holder is not None and holder["token"] == token:
+                    await cache.adelete(lock_key)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from .semaphore import get_semaphore, hold_slot
+
+
+class LLMUnavailableError(Exception):
+    pass
+
+
+def get_client():
+    # openai is only needed by processes that actually talk to the LLM
+    from openai import OpenAI
+    return OpenAI(api_key=settings.OPENROUTER_API_KEY, base_url=settings.OPENROUTER_API_BASE,
+                  timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+
+def get_llm_semaphore():
+    # The lease outlives the request timeout, so only a crashed holder ever loses its slot
+    return get_semaphore("llm", lease_seconds=settings.LLM_REQUEST_TIMEOUT_SECONDS + 30)
+
+
+def chat_completion(messages: list, batch: bool = False, **kwargs) -> str:
+    """
+    Every call holds one of LLM_MAX_CONCURRENCY slots shared by all workers. Batch callers are held to fewer slots,
+    so interactive requests always have LLM_INTERACTIVE_RESERVED_SLOTS free while nightly jobs run.
+    """
+    if not settings.OPENROUTER_API_KEY:
+        raise LLMUnavailableError("OPENROUTER_API_KEY is not configured.")
+    limit = settings.LLM_MAX_CONCURRENCY - (settings.LLM_INTERACTIVE_RESERVED_SLOTS if batch else 0)
+    with hold_slot(get_llm_semaphore(), limit=max(limit, 1), wait_seconds=settings.LLM_SLOT_WAIT_SECONDS):
+        response = get_client().chat.completions.create(model=settings.LLM_MODEL_NAME, messages=messages, **kwargs)
+    return response.choices[0].message.content
@@ -0,0 +1,114 @@
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Optional
+
+from django.utils import timezone
+from kombu.exceptions import ChannelError
+
+from subscription.models import UserSubscription
+from .redis_client import get_redis
+
+PREMIUM_QUEUE = "llm_premium"
+STANDARD_QUEUE = "llm_standard"
+BATCH_QUEUE = "llm_batch"
+LLM_QUEUES = (PREMIUM_QUEUE, STANDARD_QUEUE, BATCH_QUEUE)
+
+MAX_PRIORITY = 9
+WAIT_SAMPLES_PER_QUEUE = 1000
+
+_local_wait_samples = defaultdict(lambda: deque(maxlen=WAIT_SAMPLES_PER_QUEUE))
+
+
+@dataclass(frozen=True)
+class LLMRoute:
+    queue: str
+    priority: int  # PlanTier.priority: 0-9, higher is served first
+
+    @property
+    def broker_priority(self) -> int:
+        # Kombu's Redis transport serves priority step 0 first, the reverse of PlanTier.priority
+        return MAX_PRIORITY - self.priority
+
+
+def tier_priority(user_id: int) -> int:
+    return UserSubscription.objects.filter(
+        user_id=user_id, status=UserSubscription.SubscriptionStatus.ACTIVE, expire_date__gte=timezone.now()
+    ).values_list('plan_tier__priority', flat=True).first() or 0
+
+
+def route_for(user_id: Optional[int] = None, batch: bool = False) -> LLMRoute:
+    """Interactive work goes to the premium or standard queue by the user's tier; background work to the batch queue."""
+    if batch or user_id is None:
+        return LLMRoute(BATCH_QUEUE, 0)
+    priority = min(tier_priority(user_id), MAX_PRIORITY)
+    return LLMRoute(PREMIUM_QUEUE if priority > 0 else STANDARD_QUEUE, priority)
+
+
+def enqueue(task, *args, user_id: Optional[int] = None, batch: bool = False, **kwargs):
+    """apply_async an LLM-bound task on its tier's queue. The task must accept `queue` and `enqueued_at` kwargs."""
+    route = route_for(user_id, batch)
+    return task.apply_async(
+        args=args,
+        kwargs={**kwargs, "queue": route.queue, "enqueued_at": time.time()},
+        queue=route.queue,
+        priority=route.broker_priority,
+    )
+
+
+def record_wait(queue: Optional[str], enqueued_at: Optional[float]) -> Optional[float]:
+    if not queue or enqueued_at is None:
+        return None
+    wait = max(0.0, time.time() - enqueued_at)
+    client = get_redis()
+    if client is None:
+        _local_wait_samples[queue].append(wait)
+    else:
+        key = f"llm:wait:{queue}"
+        client.pipeline(transaction=False).lpush(key, round(wait, 3)).ltrim(key, 0, WAIT_SAMPLES_PER_QUEUE - 1).execute()
+    return wait
+
+
+def _wait_samples(queue: str) -> list:
+    client = get_redis()
+    if client is None:
+        return list(_local_wait_samples[queue])
+    return [float(sample) for sample in client.lrange(f"llm:wait:{queue}", 0, -1)]
+
+
+def _percentile(sorted_values: list, percent: int) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))], 3)
+
+
+def queue_depths() -> dict:
+    from .celery import app
+
+    depths = dict.fromkeys(LLM_QUEUES)
+    try:
+        with app.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1)
+            for queue in LLM_QUEUES:
+                try:
+                    depths[queue] = connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+                except ChannelError:
+                    depths[queue] = 0  # Redis drops a queue's lists once they are empty
+    except Exception:
+        pass  # Broker unreachable; depths stay unknown
+    return depths
+
+
+def queue_stats() -> dict:
+    """Broker depth and wait-time percentiles over the recent samples of each LLM queue."""
+    depths = queue_depths()
+    stats = {}
+    for queue in LLM_QUEUES:
+        waits = sorted(_wait_samples(queue))
+        stats[queue] = {
+            "depth": depths[queue],
+            "wait_p50": _percentile(waits, 50),
+            "wait_p95": _percentile(waits, 95),
+            "samples": len(waits),
+        }
+    return stats
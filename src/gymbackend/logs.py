@@ -0,0 +1,183 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# Attributes every LogRecord has; anything else on a record came from `extra` and is written as a JSON field
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Correlation fields (request_id, transaction_id, task_id...) for whatever is running in this context
+_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Adds fields to every record logged inside the block, including from sync_to_async threads it starts."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def set_context(**fields) -> Token:
+    """
+    Replaces the correlation fields for the rest of the current context, e.g. at the start of a Celery task. Pass the
+    returned token to reset_context() when that work ends.
+    """
+    return _context.set(fields)
+
+
+def reset_context(token: Token):
+    _context.reset(token)
+
+
+def current_context() -> dict:
+    return _context.get()
+
+
+class ContextFilter(logging.Filter):
+    """Copies the correlation fields onto the record. Runs in the caller's thread, before the record is queued."""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps LOG_SAMPLE_RATES[event or logger name] of records below WARNING. Kept records carry `sample_rate` so
+    counts can be scaled back up downstream. Warnings and errors are never sampled.
+    """
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rates = settings.LOG_SAMPLE_RATES
+        rate = rates.get(getattr(record, "event", None), rates.get(record.name))
+        if rate is None or rate >= 1:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=dt_timezone.utc),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str, option=orjson.OPT_UTC_Z).decode()
+
+
+class QueueingHandler(QueueHandler):
+    """
+    Hands records to a background thread that formats and writes them, so a slow or blocked stdout never stalls
+    the caller. The queue is bounded: when it is full, records are dropped and counted instead of waiting, and the
+    count is reported by the next record that gets through.
+    """
+
+    def __init__(self, stream=None, queue_size: int = 10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self._pid = None
+        self._listener = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # A forked worker inherits the handler but not the listener thread
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+                self._listener.start()
+                self._pid = os.getpid()
+                atexit.register(self.stop)
+
+    def prepare(self, record):
+        # Only what must be captured now: the message and traceback text. JSON formatting happens in the listener.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if self.dropped:
+            record.dropped_records = self.dropped
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped -= getattr(record, "dropped_records", 0)
+
+    def stop(self):
+        """Writes out whatever is still queued. Registered with atexit; safe to call more than once."""
+        listener, self._listener, self._pid = self._listener, None, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+
+
+def _request_id(request) -> str:
+    incoming = request.headers.get(REQUEST_ID_HEADER, "")
+    return incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+@sync_and_async_middleware
+def request_context_middleware(get_response):
+    """Tags every record logged while serving a request with its request id, echoed in the X-Request-ID header."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.id = _request_id(request)
+            with log_context(request_id=request.id):
+                response = await get_response(request)
+            response[REQUEST_ID_HEADER] = request.id
+            return response
+    else:
+        def middleware(request):
+            request.id = _request_id(request)
+            with log_context(request_id=request.id):
+                response = get_response(request)
+            response[REQUEST_ID_HEADER] = request.id
+            return response
+    return middleware
@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .redis_client import get_redis
+
+REDIS_KEY_PREFIX = "metrics:"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+@dataclass(frozen=True)
+class Family:
+    name: str
+    kind: str  # "counter" or "histogram"
+    help: str
+    buckets: tuple = ()
+
+
+REQUEST_DURATION = Family("http_request_duration_seconds", "histogram", "Request latency by route.", LATENCY_BUCKETS)
+REQUEST_QUERIES = Family("http_request_db_queries", "histogram", "Database queries per request by route.",
+                         QUERY_COUNT_BUCKETS)
+DB_SECONDS = Family("http_request_db_seconds_total", "counter", "Time spent in database queries by route.")
+CACHE_HITS = Family("http_request_cache_hits_total", "counter", "Cache reads that found a value, by route.")
+CACHE_MISSES = Family("http_request_cache_misses_total", "counter", "Cache reads that found nothing, by route.")
+OUTBOUND_HTTP_SECONDS = Family("http_request_outbound_http_seconds_total", "counter",
+                               "Time spent waiting on outbound HTTP calls by route.")
+FAMILIES = (REQUEST_DURATION, REQUEST_QUERIES, DB_SECONDS, CACHE_HITS, CACHE_MISSES, OUTBOUND_HTTP_SECONDS)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+@lru_cache(maxsize=4096)
+def _request_labels(method: str, route: str, status: int) -> tuple:
+    return _labels(method=method, route=route), _labels(method=method, route=route, status=f"{status // 100}xx")
+
+
+class Registry:
+    """
+    Counters and cumulative histogram buckets, keyed by the exact Prometheus series line. Without Redis the values
+    are this process's totals. With Redis they are deltas added to shared hashes every METRICS_FLUSH_SECONDS by a
+    background thread, so a scrape of any worker reports the whole deployment.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(lambda: defaultdict(float))
+        self._histogram_keys = {}
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def inc(self, family: Family, labels: str, value: float = 1.0):
+        with self._lock:
+            self._values[family.name][f"{family.name}{{{labels}}}"] += value
+
+    def _series_for(self, family: Family, labels: str) -> tuple:
+        keys = self._histogram_keys.get((family.name, labels))
+        if keys is None:
+            buckets = tuple(f'{family.name}_bucket{{{labels},le="{bound}"}}' for bound in (*family.buckets, "+Inf"))
+            keys = self._histogram_keys[(family.name, labels)] = (
+                buckets, f"{family.name}_sum{{{labels}}}", f"{family.name}_count{{{labels}}}")
+        return keys
+
+    def observe(self, family: Family, labels: str, value: float):
+        buckets, sum_key, count_key = self._series_for(family, labels)
+        first = bisect_left(family.buckets, value)
+        with self._lock:
+            series = self._values[family.name]
+            for key in buckets[first:]:
+                series[key] += 1
+            series[sum_key] += value
+            series[count_key] += 1
+
+    def ensure_flusher(self):
+        """Starts the flush thread on first use; a forked worker inherits a dead thread and starts its own."""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_forever(self):
+        while not self._stopped.wait(settings.METRICS_FLUSH_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                pass  # Redis unreachable: drop these deltas rather than stop flushing
+
+    def flush(self):
+        client = get_redis()
+        if client is None:
+            return
+        with self._lock:
+            pending, self._values = self._values, defaultdict(lambda: defaultdict(float))
+        pipeline = client.pipeline(transaction=False)
+        for family, series in pending.items():
+            for line, value in series.items():
+                pipeline.hincrbyfloat(f"{REDIS_KEY_PREFIX}{family}", line, value)
+        pipeline.execute()
+
+    def collect(self) -> dict:
+        client = get_redis()
+        if client is None:
+            with self._lock:
+                return {family: dict(series) for family, series in self._values.items()}
+        self.flush()
+        pipeline = client.pipeline(transaction=False)
+        for family in FAMILIES:
+            pipeline.hgetall(f"{REDIS_KEY_PREFIX}{family.name}")
+        return {family.name: {line.decode(): float(value) for line, value in series.items()}
+                for family, series in zip(FAMILIES, pipeline.execute())}
+
+    def render(self) -> str:
+        values = self.collect()
+        lines = []
+        for family in FAMILIES:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for line, value in sorted(values.get(family.name, {}).items()):
+                lines.append(f"{line} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@dataclass
+class RequestStats:
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    outbound_http_seconds: float = 0.0
+
+
+# Set for the duration of an HTTP request; sync_to_async copies it into the threads that run the ORM
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def begin_request():
+    return _current.set(RequestStats())
+
+
+def end_request(token, method: str, route: str, status: int, duration: float):
+    stats = _current.get()
+    _current.reset(token)
+    labels, labels_with_status = _request_labels(method, route, status)
+    registry.observe(REQUEST_DURATION, labels_with_status, duration)
+    registry.observe(REQUEST_QUERIES, labels, stats.db_queries)
+    if stats.db_seconds:
+        registry.inc(DB_SECONDS, labels, stats.db_seconds)
+    if stats.cache_hits:
+        registry.inc(CACHE_HITS, labels, stats.cache_hits)
+    if stats.cache_misses:
+        registry.inc(CACHE_MISSES, labels, stats.cache_misses)
+    if stats.outbound_http_seconds:
+        registry.inc(OUTBOUND_HTTP_SECONDS, labels, stats.outbound_http_seconds)
+    if get_redis() is not None:
+        registry.ensure_flusher()
+    return stats
+
+
+def record_cache_read(hits: int, misses: int):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record_outbound_http(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.outbound_http_seconds += seconds
+
+
+def _db_execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def instrument_connection(connection, **kwargs):
+    if _db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_execute_wrapper)
+
+
+connection_created.connect(instrument_connection, dispatch_uid="gymbackend.metrics.instrument_connection")
+
+
+def metrics_view(request):
+    token = settings.METRICS_AUTH_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()  # Route names and traffic must not be public; set METRICS_AUTH_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
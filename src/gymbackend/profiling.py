@@ -0,0 +1,93 @@
+import cProfile
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+# cProfile allows one active profiler per process, so concurrent sampled requests skip profiling instead of waiting
+_profiler_lock = threading.Lock()
+
+
+def _route(request) -> str:
+    match = request.resolver_match
+    return match.route if match is not None else "unmatched"
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    rate = settings.PROFILING_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate or not _profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _finish_profiler(profiler: cProfile.Profile, route: str, duration: float):
+    profiler.disable()
+    _profiler_lock.release()
+    if duration * 1000 < settings.PROFILING_MIN_DURATION_MS:
+        return
+    directory = Path(settings.PROFILING_DUMP_DIR)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # The zero-padded duration prefix sorts dumps fastest first, so pruning keeps the slowest
+        profiler.dump_stats(directory / f"{int(duration * 1000):08d}ms-{slug}-{time.time_ns()}.prof")
+        dumps = sorted(directory.glob("*.prof"))
+        for stale in dumps[:max(0, len(dumps) - settings.PROFILING_MAX_DUMPS)]:
+            stale.unlink(missing_ok=True)
+    except OSError:
+        pass  # A full or read-only disk must not fail the request being profiled
+
+
+def _begin(request):
+    return metrics.begin_request(), _start_profiler(), time.perf_counter()
+
+
+def _finish(request, response, token, profiler, started):
+    duration = time.perf_counter() - started
+    route = _route(request)
+    if profiler is not None:
+        _finish_profiler(profiler, route, duration)
+    metrics.end_request(token, request.method, route, response.status_code if response is not None else 500, duration)
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Records latency, query count and time, cache hits and misses and outbound HTTP time per route (exported at
+    /metrics) and, for PROFILING_SAMPLE_RATE of requests, a cProfile dump if the request took at least
+    PROFILING_MIN_DURATION_MS. Under ASGI a profile covers everything the event loop ran during the request.
+    """
+    # Connections opened before this module was imported never fired connection_created
+    for connection in connections.all(initialized_only=True):
+        metrics.instrument_connection(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token, profiler, started = _begin(request)
+            response = None
+            try:
+                response = await get_response(request)
+                return response
+            finally:
+                _finish(request, response, token, profiler, started)
+    else:
+        def middleware(request):
+            token, profiler, started = _begin(request)
+            response = None
+            try:
+                response = get_response(request)
+                return response
+            finally:
+                _finish(request, response, token, profiler, started)
+    return middleware
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Iterable, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .redis_client import get_redis
+
+CHANNEL_PREFIX = "realtime:user:"
+HEARTBEAT_SECONDS = 15
+CLIENT_RETRY_MS = 5000
+CONNECTION_QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _channel(user_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def _frame(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class EventHub:
+    """
+    Per-process fan-out of user events to open streams. With REDIS_URL set, the hub holds one pub/sub connection and
+    subscribes to a user's channel only while that user has a stream open in this process, so any number of ASGI
+    processes can serve streams. Without Redis, events only reach streams in the publishing process.
+    """
+
+    def __init__(self):
+        self._listeners = defaultdict(set)
+        self._loop = None
+        self._pubsub = None
+        self._reader = None
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        first = not self._listeners[user_id]
+        self._listeners[user_id].add(queue)
+        if first and settings.REDIS_URL:
+            pubsub = self._get_pubsub()
+            await pubsub.subscribe(_channel(user_id))
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        listeners = self._listeners.get(user_id)
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            del self._listeners[user_id]
+            if self._pubsub is not None:
+                await self._pubsub.unsubscribe(_channel(user_id))
+
+    def _fan_out(self, user_id: int, frame: str):
+        for queue in self._listeners.get(user_id, ()):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                pass  # A stalled client misses events and resyncs over the REST API when it reconnects
+
+    def deliver_local(self, user_id: int, frame: str):
+        """Thread-safe: publishers may run in sync views or worker threads."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, user_id, frame)
+
+    def _get_pubsub(self):
+        if self._pubsub is None:
+            import redis.asyncio as aioredis
+
+            self._pubsub = aioredis.Redis.from_url(settings.REDIS_URL).pubsub(ignore_subscribe_messages=True)
+        return self._pubsub
+
+    async def _read(self):
+        try:
+            async for message in self._pubsub.listen():
+                user_id = int(message['channel'].decode().removeprefix(CHANNEL_PREFIX))
+                self._fan_out(user_id, message['data'].decode())
+        except Exception as e:
+            logger.warning("Pub/sub reader stopped: %s: %s", type(e).__name__, e,
+                           extra={"event": "realtime.reader_stopped"})
+
+
+hub = EventHub()
+
+
+def publish_many(events: Iterable[Tuple[int, str, dict]]):
+    """
+    Push (user_id, event, data) to the user's open streams. Best effort: delivery failures are dropped, since clients
+    fetch current state over the REST API whenever they (re)connect. Call after commit.
+    """
+    frames = [(user_id, _frame(event, data)) for user_id, event, data in events]
+    if not frames:
+        return
+    client = get_redis()
+    if client is None:
+        for user_id, frame in frames:
+            hub.deliver_local(user_id, frame)
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for user_id, frame in frames:
+            pipe.publish(_channel(user_id), frame)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Failed to publish %s events: %s: %s", len(frames), type(e).__name__, e,
+                       extra={"event": "realtime.publish_failed"})
+
+
+def publish(user_id: int, event: str, data: dict):
+    publish_many([(user_id, event, data)])
+
+
+def _token_user_id(request):
+    # Deferred: publishers in Celery workers import this module, and ninja_jwt pulls in ninja and pydantic
+    from ninja_jwt.exceptions import TokenError
+    from ninja_jwt.settings import api_settings as jwt_settings
+    from ninja_jwt.tokens import AccessToken
+
+    raw = request.GET.get("token")
+    header = request.headers.get("Authorization", "")
+    scheme, _, credentials = header.partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        raw = credentials
+    if not raw:
+        return None
+    try:
+        return AccessToken(raw)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+async def event_stream(request):
+    """
+    Server-sent events for the authenticated user. EventSource cannot set headers, so the access token may also be
+    passed as ?token=. The token is verified from its signature alone; no database work happens per connection.
+    """
+    user_id = _token_user_id(request)
+    if user_id is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    async def stream():
+        queue = await hub.subscribe(user_id)
+        try:
+            yield f"retry: {CLIENT_RETRY_MS}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            await hub.unsubscribe(user_id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Shared client for REDIS_URL, or None when Redis is not configured (local development and tests)."""
+    if not settings.REDIS_URL:
+        return None
+    import redis
+
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from .redis_client import get_redis
+
+# Expired leases (holders that crashed mid-call) are dropped before counting, then a slot is taken if one is free.
+# Redis TIME keeps every worker on the same clock.
+_ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms - tonumber(ARGV[1]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now_ms, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+POLL_INTERVAL_SECONDS = 0.05
+
+
+class SemaphoreTimeout(Exception):
+    pass
+
+
+class RedisSemaphore:
+    """
+    Counting semaphore shared by every process that uses the same Redis. Each holder is a member of a sorted set
+    scored by acquisition time, so a slot held by a crashed worker is released once its lease runs out.
+    """
+
+    def __init__(self, client, name: str, lease_seconds: float):
+        self.client = client
+        self.key = f"semaphore:{name}"
+        self.lease_ms = int(lease_seconds * 1000)
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+
+    def try_acquire(self, limit: int) -> Optional[str]:
+        token = uuid.uuid4().hex
+        return token if self._acquire(keys=[self.key], args=[self.lease_ms, limit, token]) else None
+
+    def release(self, token: str):
+        self.client.zrem(self.key, token)
+
+    def in_use(self) -> int:
+        return self.client.zcard(self.key)
+
+
+class LocalSemaphore:
+    """In-process stand-in used when Redis is not configured; only limits the current process."""
+
+    def __init__(self, name: str, lease_seconds: float):
+        self._holders = set()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, limit: int) -> Optional[str]:
+        with self._lock:
+            if len(self._holders) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            self._holders.add(token)
+            return token
+
+    def release(self, token: str):
+        with self._lock:
+            self._holders.discard(token)
+
+    def in_use(self) -> int:
+        return len(self._holders)
+
+
+_semaphores = {}
+
+
+def get_semaphore(name: str, lease_seconds: float):
+    if name not in _semaphores:
+        client = get_redis()
+        _semaphores[name] = (RedisSemaphore(client, name, lease_seconds) if client is not None
+                             else LocalSemaphore(name, lease_seconds))
+    return _semaphores[name]
+
+
+@contextmanager
+def hold_slot(semaphore, limit: int, wait_seconds: float):
+    """Wait up to wait_seconds for one of `limit` slots. Callers may pass a lower limit to leave headroom for others."""
+    deadline = time.monotonic() + wait_seconds
+    token = semaphore.try_acquire(limit)
+    while token is None:
+        if time.monotonic() >= deadline:
+            raise SemaphoreTimeout(f"No free slot within {wait_seconds}s (limit {limit}).")
+        time.sleep(POLL_INTERVAL_SECONDS)
+        token = semaphore.try_acquire(limit)
+    try:
+        yield
+    finally:
+        semaphore.release(token)
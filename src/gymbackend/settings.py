@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from decouple import config, AutoConfig, Csv
+import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,29 +33,40 @@ ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 # Application definition
 
+# PROCESS_ROLE selects a lean app profile. "web" serves the API and admin. "worker" runs Celery workers and beat,
+# which only need the models and task modules, so the admin, sessions, messages, static files and ninja apps are
+# skipped. Run migrate under the web role, since it has every app's tables.
+PROCESS_ROLE = config('PROCESS_ROLE', default='web')
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
     # Installed Apps
     'accounts',
     'subscription',
     'diet',
     'workout',
     'notifications',
-    # Third-Party Apps
-    'ninja',
-    'ninja_extra',
-    'rest_framework',
-    'rest_framework_simplejwt',
-    'ninja_jwt',
-    'zarinpal',
+    'exports',
+    'analytics',
 ]
 
+if PROCESS_ROLE == 'web':
+    INSTALLED_APPS = [
+        'django.contrib.admin',
+        *INSTALLED_APPS,
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        # Third-Party Apps
+        'ninja',
+        'ninja_extra',
+        'ninja_jwt',
+    ]
+
 MIDDLEWARE = [
+    'gymbackend.logs.request_context_middleware',
+    'gymbackend.profiling.request_metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gymbackend.db_router.replica_routing_middleware',
 ]
 
 ROOT_URLCONF = 'gymbackend.urls'
@@ -87,12 +100,52 @@ WSGI_APPLICATION = 'gymbackend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_URL switches to Postgres (or any dj_database_url backend); without it the local SQLite file is used.
+# DATABASE_POOL=True uses psycopg's server-side connection pool, which requires CONN_MAX_AGE=0. Otherwise
+# connections persist for DATABASE_CONN_MAX_AGE seconds. DATABASE_PGBOUNCER=True makes persistent connections
+# safe behind PgBouncer in transaction pooling mode.
+DATABASE_URL = config('DATABASE_URL', default=None)
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+DATABASE_PGBOUNCER = config('DATABASE_PGBOUNCER', default=False, cast=bool)
+
+
+def _database_from_url(url):
+    database = dj_database_url.parse(
+        url,
+        conn_max_age=0 if DATABASE_POOL else config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        conn_health_checks=not DATABASE_POOL,
+    )
+    if DATABASE_POOL:
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DATABASE_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+        }
+    if DATABASE_PGBOUNCER:
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        database.setdefault('OPTIONS', {})['prepare_threshold'] = None
+    return database
+
+
+if DATABASE_URL:
+    DATABASES = {'default': _database_from_url(DATABASE_URL)}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+    DATABASES[f'replica_{_index}'] = {**_database_from_url(_url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['gymbackend.db_router.PrimaryReplicaRouter']
+# Clients that wrote within this window read from the primary, so they never miss their own write to replica lag
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=5, cast=int)
 
 
 # Password validation
@@ -131,6 +184,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -138,10 +194,6 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
 
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': (),
-}
-
 NINJA_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESfH_TOKEN_LIFETIME': timedelta(days=1),
@@ -156,31 +208,141 @@ NINJA_JWT = {
 
 
 ZARINPAL_MERCHANT_ID = 'YOUR_ZARINPAL_MERCHANT_ID' # e.g., 'XXXXXXXX-XXXX-XXXX-XXXX-XXXXXXXXXXXX'
-# ZARINPAL_WEBSERVICE_URL = 'https://api.zarinpal.com/pg/v4/payment/request.json' # For requests
-# ZARINPAL_VERIFY_URL = 'https://api.zarinpal.com/pg/v4/payment/verify.json'     # For verification
-# ZARINPAL_STARTPAY_URL_TEMPLATE = 'https://www.zarinpal.com/pg/StartPay/{authority}' # To redirect user
+# Point these at a local gateway stub (python -m benchmarks.gateway_stub) to run payments offline
+ZARINPAL_API_REQUEST_URL = config('ZARINPAL_API_REQUEST_URL', default='https://api.zarinpal.com/pg/v4/payment/request.json')
+ZARINPAL_API_VERIFY_URL = config('ZARINPAL_API_VERIFY_URL', default='https://api.zarinpal.com/pg/v4/payment/verify.json')
+ZARINPAL_STARTPAY_URL_TEMPLATE = config('ZARINPAL_STARTPAY_URL_TEMPLATE', default='https://www.zarinpal.com/pg/StartPay/{}')
+ZARINPAL_API_DIRECT_DEBIT_URL = config('ZARINPAL_API_DIRECT_DEBIT_URL', default='https://api.zarinpal.com/pg/v4/payman/checkout.json')
 
 
 PAYMENT_CALLBACK_DOMAIN = "http://localhost:8000"  # need to change later
+# Shared async client used for payment gateway calls (gymbackend.http_client)
+OUTBOUND_HTTP_TIMEOUT_SECONDS = config("OUTBOUND_HTTP_TIMEOUT_SECONDS", default=10, cast=float)
+OUTBOUND_HTTP_MAX_CONNECTIONS = config("OUTBOUND_HTTP_MAX_CONNECTIONS", default=100, cast=int)
 # Or if frontend handles the immediate redirect and then calls backend:
 # FRONTEND_PAYMENT_SUCCESS_URL = "http://localhost:3000/payment/success"
 # FRONTEND_PAYMENT_FAILURE_URL = "http://localhost:3000/payment/failure"
 
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0' 
+REDIS_URL = config('REDIS_URL', default=None)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'gymbackend.cache.InstrumentedRedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'gymbackend.cache.InstrumentedLocMemCache',
+    }
+}
+
+# Idempotency-Key replays (gymbackend.idempotency); the lock must outlive the slowest request it guards
+IDEMPOTENCY_KEY_TTL_SECONDS = config('IDEMPOTENCY_KEY_TTL_SECONDS', default=24 * 60 * 60, cast=int)
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=60, cast=int)
+IDEMPOTENCY_WAIT_SECONDS = config('IDEMPOTENCY_WAIT_SECONDS', default=15, cast=float)
+
+# Sharded nightly jobs (gymbackend.batch_jobs): user-id ranges per run, and how long shard checkpoints are kept
+BATCH_JOB_SHARDS = config('BATCH_JOB_SHARDS', default=8, cast=int)
+BATCH_JOB_PROGRESS_TTL_SECONDS = config('BATCH_JOB_PROGRESS_TTL_SECONDS', default=2 * 24 * 60 * 60, cast=int)
+
+# JSON lines on stdout, written by a background thread (gymbackend.logs.QueueingHandler)
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+# Fraction of sub-WARNING records kept, by `extra={"event": ...}` name or logger name
+LOG_SAMPLE_RATES = {
+    'django.request': 0.05,  # ninja_extra's per-request access line
+    'payment.gateway_call': 0.1,
+}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {'()': 'gymbackend.logs.SamplingFilter'},
+        'context': {'()': 'gymbackend.logs.ContextFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'gymbackend.logs.JSONFormatter'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'gymbackend.logs.QueueingHandler',
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'json',
+            'filters': ['sampling', 'context'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replaces Django's DEBUG-only console handler, which would print every record a second time
+        'django': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Per-route request metrics, exported at /metrics (gymbackend.metrics) to scrapers sending the token as a Bearer header;
+# with no token the endpoint is open only when DEBUG is on
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default=None)
+METRICS_FLUSH_SECONDS = 10
+# Sampled cProfile dumps; only requests slower than PROFILING_MIN_DURATION_MS are kept, the slowest first
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_MIN_DURATION_MS = config('PROFILING_MIN_DURATION_MS', default=500, cast=int)
+PROFILING_DUMP_DIR = config('PROFILING_DUMP_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_DUMPS = config('PROFILING_MAX_DUMPS', default=50, cast=int)
+
+
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Redis emulates priorities with one list per step; tier priority picks the step (see gymbackend.llm_queues)
+CELERY_BROKER_TRANSPORT_OPTIONS = {'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Keep the LOGGING configuration below in workers instead of Celery's own root handler
+CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+CELERY_TASK_ROUTES = {
+    'workout.tasks.personalize_workout_plan': {'queue': 'llm_standard'},
+}
 
 
 OPENROUTER_API_KEY = config("OPENROUTER_API_KEY", default=None)
 OPENROUTER_API_BASE = config("OPENROUTER_API_BASE", default="https://openrouter.ai/api/v1")
 LLM_MODEL_NAME = config("LLM_MODEL_NAME", default="deepseek/deepseek-chat:free")
+LLM_REQUEST_TIMEOUT_SECONDS = config("LLM_REQUEST_TIMEOUT_SECONDS", default=60, cast=int)
+LLM_MAX_CONCURRENCY = config("LLM_MAX_CONCURRENCY", default=8, cast=int)
+LLM_INTERACTIVE_RESERVED_SLOTS = config("LLM_INTERACTIVE_RESERVED_SLOTS", default=2, cast=int)
+LLM_SLOT_WAIT_SECONDS = 20
+WORKOUT_PLAN_NIGHTLY_PERSONALIZATION = config("WORKOUT_PLAN_NIGHTLY_PERSONALIZATION", default=False, cast=bool)
 
 
 WORKOUT_PLAN_GENERATION_INTERVAL_DAYS = config('WORKOUT_PLAN_GENERATION_INTERVAL_DAYS', default=7, cast=int)
-WORKOUT_PLAN_ACTIVE_DURATION_DAYS = config('WORKOUT_PLAN_ACTIVE_DURATION_DAYS', default=7, cast=int)
\ No newline at end of file
+WORKOUT_PLAN_ACTIVE_DURATION_DAYS = config('WORKOUT_PLAN_ACTIVE_DURATION_DAYS', default=7, cast=int)
+# Plan exports still PENDING this long after their render was queued are queued again (exports.services)
+PLAN_EXPORT_RENDER_TIMEOUT_SECONDS = config('PLAN_EXPORT_RENDER_TIMEOUT_SECONDS', default=10 * 60, cast=int)
+
+
+NOTIFICATION_CHANNELS = {
+    'in_app': {'BACKEND': 'notifications.channels.InAppChannel', 'CONCURRENCY': 4, 'BATCH_SIZE': 500},
+    'stub': {'BACKEND': 'notifications.channels.LocalStubChannel', 'CONCURRENCY': 2, 'BATCH_SIZE': 500},
+}
+NOTIFICATION_DEFAULT_CHANNELS = config('NOTIFICATION_DEFAULT_CHANNELS', default='in_app', cast=Csv())
+NOTIFICATION_UNREAD_COUNTER_TTL_SECONDS = 24 * 60 * 60
+NOTIFICATION_DISPATCH_BATCH_SIZE = config('NOTIFICATION_DISPATCH_BATCH_SIZE', default=1000, cast=int)
+NOTIFICATION_DISPATCH_TIME_BUDGET_SECONDS = 50
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_CLAIM_TIMEOUT_SECONDS = 300
+SUBSCRIPTION_EXPIRY_REMINDER_DAYS = config('SUBSCRIPTION_EXPIRY_REMINDER_DAYS', default=3, cast=int)
+# Coupon slots reserved by payments still unsettled after this are given back (subscription.coupons)
+COUPON_RESERVATION_TTL_SECONDS = config('COUPON_RESERVATION_TTL_SECONDS', default=60 * 60, cast=int)
+# Auto-renewal billing (subscription.renewals): subscriptions expiring within the window are charged through their
+# direct debit mandate. A failed charge is retried after each of the RENEWAL_RETRY_DAYS in turn, then auto-renewal is
+# switched off. RENEWAL_CONCURRENCY bounds the gateway calls in flight per worker.
+RENEWAL_WINDOW_DAYS = config('RENEWAL_WINDOW_DAYS', default=4, cast=int)
+RENEWAL_RETRY_DAYS = config('RENEWAL_RETRY_DAYS', default='1,2', cast=Csv(int))
+RENEWAL_CONCURRENCY = config('RENEWAL_CONCURRENCY', default=20, cast=int)
+RENEWAL_CLAIM_TIMEOUT_SECONDS = 60 * 60
+# Gateway responses of settled transactions older than this move to compressed storage (subscription.archive)
+PAYMENT_PAYLOAD_ARCHIVE_AFTER_DAYS = config('PAYMENT_PAYLOAD_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+# Analytics rollups re-read rows changed this long before their watermark, to catch late-committing transactions
+ANALYTICS_WATERMARK_OVERLAP_SECONDS = config('ANALYTICS_WATERMARK_OVERLAP_SECONDS', default=300, cast=int)
\ No newline at end of file
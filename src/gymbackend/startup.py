@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# What each process has to import before it can serve its first request or task
+ROLE_ENTRYPOINTS = {
+    "web": "import django; django.setup(); import gymbackend.urls",
+    "worker": "import django; django.setup(); from gymbackend.celery import app; app.loader.import_default_modules()",
+}
+
+# Slow to import and only needed by a few code paths; these must be imported inside the functions that use them
+DEFERRED_MODULES = ("openai", "docx", "lxml", "requests", "rest_framework", "zarinpal")
+
+# Modules a process of each role must not load at startup
+EXCLUDED_MODULES = {
+    "web": DEFERRED_MODULES,
+    "worker": DEFERRED_MODULES + ("ninja", "ninja_extra", "ninja_jwt", "httpx"),
+}
+
+# Cold start budgets (fastest of a few runs) enforced by gymbackend.tests.StartupBudgetTests
+STARTUP_BUDGET_SECONDS = {"web": 2.5, "worker": 1.5}
+
+
+@dataclass
+class StartupReport:
+    role: str
+    seconds: float
+    unexpected_modules: list
+    # Top-level package -> seconds spent importing its modules (self time), when measured with import_times=True
+    import_seconds: dict = field(default_factory=dict)
+
+
+def _parse_import_times(stderr: str) -> dict:
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module = line.removeprefix("import time:").split("|")
+        totals[module.strip().split(".")[0]] += int(self_us) / 1_000_000
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def measure_startup(role: str, import_times: bool = False) -> StartupReport:
+    """
+    Starts a fresh interpreter with PROCESS_ROLE=role, runs the role's entrypoint imports and reports the wall time,
+    which of the role's EXCLUDED_MODULES got loaded and, with import_times, where the import time went. -X importtime
+    slows the run down, so its wall time is not comparable to a plain run.
+    """
+    code = (f"{ROLE_ENTRYPOINTS[role]}; import sys, json; "
+            f"print(json.dumps([name for name in {EXCLUDED_MODULES[role]!r} if name in sys.modules]))")
+    command = [sys.executable, *(["-X", "importtime"] if import_times else []), "-c", code]
+    env = {**os.environ, "PROCESS_ROLE": role, "DJANGO_SETTINGS_MODULE": "gymbackend.settings"}
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{role} startup failed:\n{result.stderr}")
+    return StartupReport(role, seconds, json.loads(result.stdout.strip().splitlines()[-1]),
+                         _parse_import_times(result.stderr) if import_times else {})
@@ -0,0 +1,419 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from ninja.errors import HttpError
+from ninja_jwt.tokens import AccessToken
+
+from subscription.models import PlanTier
+
+from . import batch_jobs, http_client, metrics
+from .celery import app
+from .idempotency import idempotent
+from .logs import ContextFilter, JSONFormatter, QueueingHandler, SamplingFilter, current_context, log_context
+from .renderers import ORJSONRenderer
+from .startup import STARTUP_BUDGET_SECONDS, measure_startup
+from .db_router import PIN_COOKIE, PrimaryReplicaRouter, reads_from_primary, replica_routing_middleware, use_primary
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class DatabaseRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _token(self, user_id):
+        token = AccessToken()
+        token["user_id"] = user_id
+        return token
+
+    def _run(self, request, view):
+        return replica_routing_middleware(lambda req: view(req) or HttpResponse())(request)
+
+    def test_reads_use_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_safe_request_reads_from_replica_until_it_writes(self):
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(None))
+            self.router.db_for_write(None)
+            routes.append(self.router.db_for_read(None))
+
+        response = self._run(self.factory.get("/"), view)
+        self.assertEqual(routes, ['replica_0', DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_recent_writer_and_unsafe_methods_stay_on_primary(self):
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(None))
+
+        pinned = self.factory.get("/")
+        pinned.COOKIES[PIN_COOKIE] = "1"
+        self._run(pinned, view)
+        self._run(self.factory.post("/"), view)
+        with use_primary():
+            view(None)
+        self.assertEqual(routes, [DEFAULT_DB_ALIAS] * 3)
+
+    def test_signed_in_writer_is_pinned_without_cookies(self):
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(None))
+            if request.method == "POST":
+                self.router.db_for_write(None)
+
+        cache.clear()
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {self._token(42)}"}
+        response = self._run(self.factory.post("/", **headers), view)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self._run(self.factory.get("/", **headers), view)
+        self._run(self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {self._token(7)}"), view)
+        self.assertEqual(routes, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS, 'replica_0'])
+
+    def test_views_marked_for_the_primary_skip_the_replica(self):
+        routes = []
+
+        @reads_from_primary
+        def view(request):
+            routes.append(self.router.db_for_read(None))
+
+        self._run(self.factory.get("/api/payment/callback"), view)
+        self.assertEqual(routes, [DEFAULT_DB_ALIAS])
+
+    def test_transactions_read_from_primary(self):
+        routes = []
+
+        def view(request):
+            with mock.patch.object(connections[DEFAULT_DB_ALIAS], "in_atomic_block", True):
+                routes.append(self.router.db_for_read(None))
+
+        self._run(self.factory.get("/"), view)
+        self.assertEqual(routes, [DEFAULT_DB_ALIAS])
+
+
+class AsyncJWTAuthTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="auth@example.com", username="auth_user", name="Auth", family_name="User", password="x")
+
+    def _headers(self, token):
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def test_valid_token_authenticates_async_views(self):
+        response = self.client.get("/api/users/profile", **self._headers(AccessToken.for_user(self.user)))
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(response.json()["user"]["email"], "auth@example.com")
+
+    def test_invalid_or_inactive_credentials_are_rejected(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.client.get("/api/users/profile", **self._headers("garbage")).status_code, 401)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/users/profile", **self._headers(token)).status_code, 401)
+        # Optional auth hands anonymous requests to IsAuthenticated, which answers 403
+        self.assertEqual(self.client.get("/api/subscription/tiers", **self._headers(token)).status_code, 403)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_renders_datetimes_decimals_and_uuids(self):
+        key = uuid.UUID("12345678-1234-5678-1234-567812345678")
+        body = ORJSONRenderer().render(None, {
+            "at": datetime(2025, 1, 2, 3, 4, 5, 678000, tzinfo=dt_timezone.utc),
+            "on": date(2025, 1, 2),
+            "price": Decimal("150000.10"),
+            "id": key,
+            "rest": timedelta(minutes=2),
+            "by_week": {1: "x"},
+        }, response_status=200)
+        self.assertEqual(json.loads(body), {
+            "at": "2025-01-02T03:04:05.678000Z",
+            "on": "2025-01-02",
+            "price": "150000.10",
+            "id": str(key),
+            "rest": "P0DT00H02M00S",
+            "by_week": {"1": "x"},
+        })
+
+    def test_malformed_body_is_a_bad_request(self):
+        response = self.client.post("/api/auth/login", data=b"{not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email="metrics@example.com", username="metrics_user", name="Metrics", family_name="User", password="x")
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+        cache.clear()
+        patcher = mock.patch.object(metrics, "registry", metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _metric(self, series):
+        with override_settings(METRICS_AUTH_TOKEN="scrape"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape")
+        for line in response.content.decode().splitlines():
+            if line.startswith(series + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return None
+
+    def test_latency_and_queries_are_recorded_per_route(self):
+        self.client.get("/api/users/profile", **self.headers)
+        self.client.get("/api/users/profile", **self.headers)
+        labels = 'method="GET",route="api/users/profile"'
+        self.assertEqual(self._metric(f'http_request_duration_seconds_count{{{labels},status="2xx"}}'), 2)
+        self.assertGreaterEqual(self._metric(f"http_request_db_queries_sum{{{labels}}}"), 4)
+        self.assertGreater(self._metric(f"http_request_db_seconds_total{{{labels}}}"), 0)
+
+    def test_cache_reads_and_outbound_http_are_recorded(self):
+        self.client.get("/api/notifications/unread-count", **self.headers)
+        self.client.get("/api/notifications/unread-count", **self.headers)
+        labels = 'method="GET",route="api/notifications/unread-count"'
+        self.assertEqual(self._metric(f"http_request_cache_misses_total{{{labels}}}"), 1)
+        self.assertEqual(self._metric(f"http_request_cache_hits_total{{{labels}}}"), 2)  # The rebuild re-reads once
+
+        plan = PlanTier.objects.create(name="Pro", price=1000, duration_days=30, max_requests=1, is_active=True)
+        gateway = httpx.MockTransport(lambda request: httpx.Response(200, json={"data": {"authority": "M1"}}))
+        with mock.patch.object(http_client, "transport", gateway):
+            self.client.post("/api/subscription/initiate-payment", data={"plan_tier_id": plan.id},
+                             content_type="application/json", **self.headers)
+        self.assertGreater(self._metric('http_request_outbound_http_seconds_total{method="POST",'
+                                        'route="api/subscription/initiate-payment"}'), 0)
+
+    def test_metrics_endpoint_can_require_a_token(self):
+        with override_settings(METRICS_AUTH_TOKEN="scrape"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape").status_code, 200)
+
+    def test_metrics_endpoint_without_a_token_is_only_open_in_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_requests_leave_the_redis_flush_to_a_background_thread(self):
+        redis = mock.Mock()
+        self.addCleanup(metrics.registry._stopped.set)
+        with mock.patch.object(metrics, "get_redis", return_value=redis), \
+                override_settings(METRICS_FLUSH_SECONDS=0.05):
+            self.client.get("/api/users/profile", **self.headers)
+            redis.pipeline.assert_not_called()
+            deadline = time.monotonic() + 5
+            while not redis.pipeline.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        redis.pipeline.return_value.hincrbyfloat.assert_any_call(
+            "metrics:http_request_duration_seconds",
+            'http_request_duration_seconds_count{method="GET",route="api/users/profile",status="2xx"}', 1)
+
+    def test_sampled_profiles_keep_only_the_slowest_dumps(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PROFILING_SAMPLE_RATE=1, PROFILING_MIN_DURATION_MS=0, PROFILING_DUMP_DIR=directory,
+                PROFILING_MAX_DUMPS=2):
+            for _ in range(3):
+                self.client.get("/api/users/profile", **self.headers)
+            dumps = sorted(path.name for path in Path(directory).glob("*.prof"))
+        self.assertEqual(len(dumps), 2)
+        self.assertTrue(all(name.endswith(".prof") and "api_users_profile" in name for name in dumps))
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def _record(self, level=logging.INFO, **extra):
+        record = logging.LogRecord("subscription.services", level, __file__, 1, "Payment %s", ("A1",), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_request_id_is_echoed_or_generated(self):
+        response = self.client.get("/api/subscription/tiers", HTTP_X_REQUEST_ID="edge-42")
+        self.assertEqual(response["X-Request-ID"], "edge-42")
+        generated = self.client.get("/api/subscription/tiers", HTTP_X_REQUEST_ID="not a valid id!")["X-Request-ID"]
+        self.assertRegex(generated, r"^[0-9a-f]{32}$")
+
+    def test_records_are_written_as_json_with_context_fields(self):
+        stream = io.StringIO()
+        handler = QueueingHandler(stream=stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(ContextFilter())
+        logger = logging.getLogger("gymbackend.tests.structured")
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        with log_context(request_id="r1", transaction_id="A1"):
+            logger.warning("Payment %s verified", "A1", extra={"event": "payment.verified"})
+        handler.stop()
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "Payment A1 verified")
+        self.assertEqual(entry["level"], "WARNING")
+        self.assertEqual((entry["event"], entry["request_id"], entry["transaction_id"]), ("payment.verified", "r1", "A1"))
+        self.assertTrue(entry["timestamp"].endswith("Z"))
+
+    def test_full_queue_drops_records_and_reports_the_count(self):
+        handler = QueueingHandler(stream=io.StringIO(), queue_size=1)
+        handler._pid = os.getpid()  # No listener, so nothing drains the queue
+        for _ in range(3):
+            handler.emit(self._record())
+        self.assertEqual(handler.dropped, 2)
+        handler.queue.get_nowait()
+        handler.emit(self._record())
+        self.assertEqual(handler.queue.get_nowait().dropped_records, 2)
+
+    def test_task_context_is_cleared_when_the_task_ends(self):
+        eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", eager)
+        seen = []
+
+        @app.task(name="tests.logged")
+        def logged():
+            seen.append(current_context().get("task"))
+
+        with log_context(request_id="r1"):
+            logged.delay()
+            self.assertEqual(current_context(), {"request_id": "r1"})
+        self.assertEqual(seen, ["tests.logged"])
+        self.assertEqual(current_context(), {})
+
+    @override_settings(LOG_SAMPLE_RATES={"payment.gateway_call": 0.0, "subscription.services": 0.5})
+    def test_sampling_drops_high_volume_events_but_never_warnings(self):
+        sampler = SamplingFilter()
+        self.assertFalse(sampler.filter(self._record(event="payment.gateway_call")))
+        self.assertTrue(sampler.filter(self._record(logging.WARNING, event="payment.gateway_call")))
+        with mock.patch("gymbackend.logs.random.random", return_value=0.1):
+            record = self._record()
+            self.assertTrue(sampler.filter(record))
+        self.assertEqual(record.sample_rate, 0.5)
+
+
+class IdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def _view(self, delay=0.0, status=201):
+        @idempotent("tests")
+        async def view(request):
+            self.calls += 1
+            await asyncio.sleep(delay)
+            if status >= 400:
+                raise HttpError(status, "failed")
+            return status, {"call": self.calls}
+        return view
+
+    def _request(self, key="key-1", body=b"{}", auth=None, address="127.0.0.1"):
+        request = RequestFactory().post("/", data=body, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key,
+                                        REMOTE_ADDR=address)
+        request.auth = auth
+        return request
+
+    async def test_concurrent_duplicates_wait_for_the_first_response(self):
+        view = self._view(delay=0.2)
+        results = await asyncio.gather(*(view(self._request()) for _ in range(3)))
+        self.assertEqual(results, [(201, {"call": 1})] * 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(await view(self._request(key="key-2")), (201, {"call": 2}))
+
+    async def test_client_errors_are_replayed_and_server_errors_retried(self):
+        for status, expected_calls in ((404, 1), (503, 3)):
+            with self.subTest(status=status):
+                self.calls = 0
+                view = self._view(status=status)
+                for _ in range(3):
+                    with self.assertRaises(HttpError) as raised:
+                        await view(self._request(key=str(status)))
+                    self.assertEqual(raised.exception.status_code, status)
+                self.assertEqual(self.calls, expected_calls)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.1)
+    async def test_reused_key_with_another_body_or_still_running_is_rejected(self):
+        view = self._view(delay=0.5)
+        user = mock.Mock(pk=1, is_authenticated=True)
+        first = asyncio.ensure_future(view(self._request(auth=user)))
+        await asyncio.sleep(0.05)
+        for body, status in ((b'{"other": 1}', 422), (b"{}", 409)):
+            with self.assertRaises(HttpError) as raised:
+                await view(self._request(body=body, auth=user))
+            self.assertEqual(raised.exception.status_code, status)
+        await first
+        self.assertEqual(self.calls, 1)
+
+    async def test_anonymous_keys_are_scoped_to_the_client_and_body(self):
+        view = self._view()
+        self.assertEqual(await view(self._request()), (201, {"call": 1}))
+        self.assertEqual(await view(self._request()), (201, {"call": 1}))
+        self.assertEqual(await view(self._request(address="10.0.0.9")), (201, {"call": 2}))
+        self.assertEqual(await view(self._request(body=b'{"other": 1}')), (201, {"call": 3}))
+
+    async def test_redacted_fields_are_reissued_on_replay(self):
+        @idempotent("tests.tokens", redact=("token",), reissue=lambda data: asyncio.sleep(0, {"token": "fresh"}))
+        async def view(request):
+            return 201, {"user": 1, "token": "secret"}
+
+        self.assertEqual(await view(self._request()), (201, {"user": 1, "token": "secret"}))
+        self.assertEqual(await view(self._request()), (201, {"user": 1, "token": "fresh"}))
+
+
+class StartupBudgetTests(SimpleTestCase):
+    def test_each_role_starts_within_budget_without_deferred_modules(self):
+        for role, budget in STARTUP_BUDGET_SECONDS.items():
+            with self.subTest(role=role):
+                reports = [measure_startup(role) for _ in range(3)]
+                self.assertEqual(reports[0].unexpected_modules, [])
+                self.assertLess(min(report.seconds for report in reports), budget)
+
+
+class ShardedBatchJobTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        self.fail_at = 36
+        batch_jobs.sharded_job("tests.sharded", bounds=lambda **params: (1, 100), chunk_size=10)(self._handler)
+        eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", eager)
+
+    def _handler(self, user_id_from, user_id_to, factor):
+        if user_id_from == self.fail_at:
+            self.fail_at = None
+            raise RuntimeError("worker lost")
+        self.calls.append((user_id_from, user_id_to))
+        return {"processed": (user_id_to - user_id_from) * factor}
+
+    def test_split_covers_the_range_once(self):
+        self.assertEqual(batch_jobs.split(1, 100, 4), [[1, 26], [26, 51], [51, 76], [76, 101]])
+        self.assertEqual(batch_jobs.split(5, 7, 8), [[5, 6], [6, 7], [7, 8]])
+
+    def test_shards_resume_from_their_checkpoint_and_finished_runs_are_skipped(self):
+        with self.assertLogs("gymbackend.batch_jobs") as logs:
+            self.assertEqual(batch_jobs.dispatch("tests.sharded", run="r1", shards=4, factor=2), 4)
+        self.assertIn("finished 4 shards: {'processed': 200}", logs.output[-1])
+        self.assertIsNone(self.fail_at)
+        # The failed chunk was retried; the chunk before it in its shard was not redone
+        self.assertEqual(sorted(self.calls), [(1, 11), (11, 21), (21, 26), (26, 36), (36, 46), (46, 51), (51, 61),
+                                              (61, 71), (71, 76), (76, 86), (86, 96), (96, 101)])
+
+        progress = batch_jobs.progress("tests.sharded", run="r1")
+        self.assertEqual(progress["ranges"], [[1, 26], [26, 51], [51, 76], [76, 101]])
+        self.assertEqual([shard["done"] for shard in progress["shards"]], [True] * 4)
+
+        self.calls = []
+        batch_jobs.dispatch("tests.sharded", run="r1", shards=4, factor=2)
+        self.assertEqual(self.calls, [])
+
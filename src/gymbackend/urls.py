@@ -14,11 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.apps import apps
 from django.contrib import admin
 from django.urls import path
 from .api import api
+from .metrics import metrics_view
+from .realtime import event_stream
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('api/events/stream', event_stream, name='event_stream'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', api.urls)
 ]
+
+# Worker processes (PROCESS_ROLE=worker) run without the admin but still import this module to reverse() URLs
+if apps.is_installed('django.contrib.admin'):
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -1,3 +1,22 @@
 from django.contrib import admin
 
 # Register your models here.
+
+from .models import NotificationOutbox, InboxNotification
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'channel', 'user', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'channel', 'kind')
+    search_fields = ('=dedupe_key',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'claimed_at', 'sent_at')
+
+
+@admin.register(InboxNotification)
+class InboxNotificationAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'user', 'title', 'is_read', 'created_at')
+    list_filter = ('is_read', 'kind')
+    raw_id_fields = ('user', 'outbox')
+    readonly_fields = ('created_at', 'read_at')
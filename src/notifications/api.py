@@ -0,0 +1,37 @@
+from ninja import Router, Query
+from ninja_jwt.authentication import JWTAuth
+
+from . import inbox
+from .schemas import (
+    InboxPageSchemaOut, UnreadCountSchemaOut, MarkReadSchemaIn, MarkReadSchemaOut, ErrorDetailSchema
+)
+
+notifications_router = Router(auth=JWTAuth())
+
+MAX_PAGE_SIZE = 100
+
+
+@notifications_router.get("/", response={200: InboxPageSchemaOut, 400: ErrorDetailSchema})
+def list_notifications(request, cursor: str = None, limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                       unread_only: bool = False):
+    try:
+        items, next_cursor = inbox.list_page(request.auth.id, cursor=cursor, limit=limit, unread_only=unread_only)
+    except inbox.InvalidCursor as e:
+        return 400, {"detail": str(e)}
+    return 200, {"items": items, "next_cursor": next_cursor, "unread_count": inbox.unread_count(request.auth.id)}
+
+
+@notifications_router.get("/unread-count", response=UnreadCountSchemaOut)
+def get_unread_count(request):
+    return {"unread_count": inbox.unread_count(request.auth.id)}
+
+
+@notifications_router.post("/mark-read", response=MarkReadSchemaOut)
+def mark_read(request, payload: MarkReadSchemaIn):
+    updated = inbox.mark_read(request.auth.id, payload.ids)
+    return {"updated": updated, "unread_count": inbox.unread_count(request.auth.id)}
+
+
+@notifications_router.post("/mark-all-read", response=MarkReadSchemaOut)
+def mark_all_read(request):
+    return {"updated": inbox.mark_all_read(request.auth.id), "unread_count": 0}
@@ -0,0 +1,79 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+
+from gymbackend import realtime
+from .inbox import increment_unread, reset_unread
+from .models import InboxNotification
+
+
+@dataclass
+class DeliveryResult:
+    sent_ids: List[int] = field(default_factory=list)
+    errors: Dict[int, str] = field(default_factory=dict)
+
+
+class BaseChannel:
+    """A delivery backend. Outbox ids are stable across retries and should be used as idempotency keys."""
+
+    def __init__(self, concurrency: int = 1, batch_size: int = 500, **options):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.options = options
+
+    def send_batch(self, notifications: Sequence) -> DeliveryResult:
+        raise NotImplementedError
+
+
+class LocalStubChannel(BaseChannel):
+    """Records deliveries in memory instead of sending them, like Django's locmem email backend."""
+
+    sent = []
+
+    def send_batch(self, notifications):
+        LocalStubChannel.sent.extend(
+            {"id": n.id, "user_id": n.user_id, "kind": n.kind, "payload": n.payload} for n in notifications
+        )
+        return DeliveryResult(sent_ids=[n.id for n in notifications])
+
+
+class InAppChannel(BaseChannel):
+    """Delivers into the user's inbox. The outbox id is unique on inbox rows, so a retried batch never duplicates."""
+
+    def send_batch(self, notifications):
+        delivered = set(InboxNotification.objects.filter(outbox_id__in=[n.id for n in notifications])
+                        .values_list('outbox_id', flat=True))
+        new_items = [
+            InboxNotification(
+                user_id=n.user_id, outbox_id=n.id, kind=n.kind, created_at=n.created_at,
+                title=n.payload.get("title", ""), body=n.payload.get("body", ""), data=n.payload.get("data", {}),
+            )
+            for n in notifications if n.id not in delivered
+        ]
+        if new_items:
+            try:
+                with transaction.atomic():
+                    InboxNotification.objects.bulk_create(new_items)
+                increment_unread(item.user_id for item in new_items)
+            except IntegrityError:
+                # A concurrent delivery of the same rows got some in first. Which ones this call inserted is unknown,
+                # so the counters of the users involved are rebuilt from the database instead of incremented
+                InboxNotification.objects.bulk_create(new_items, ignore_conflicts=True)
+                reset_unread(item.user_id for item in new_items)
+            realtime.publish_many(
+                (item.user_id, "notification", {"kind": item.kind, "title": item.title, "body": item.body,
+                                                "data": item.data, "created_at": item.created_at})
+                for item in new_items
+            )
+        return DeliveryResult(sent_ids=[n.id for n in notifications])
+
+
+@lru_cache(maxsize=None)
+def get_channel(name: str) -> BaseChannel:
+    config = dict(settings.NOTIFICATION_CHANNELS[name])
+    backend = import_string(config.pop('BACKEND'))
+    return backend(**{key.lower(): value for key, value in config.items()})
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .channels import DeliveryResult, get_channel
+from .models import NotificationOutbox
+
+DeliveryStatus = NotificationOutbox.DeliveryStatus
+
+RETRY_BACKOFF_SECONDS = [30, 120, 600, 3600]
+
+
+def claim_batch(batch_size: int) -> list:
+    """Move a batch of due rows to SENDING; rows left SENDING past the claim timeout (crashed worker) are reclaimed."""
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS)
+    with transaction.atomic():
+        ids = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=DeliveryStatus.PENDING, available_at__lte=now) |
+                    Q(status=DeliveryStatus.SENDING, claimed_at__lt=stale_before))
+            .order_by('available_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        NotificationOutbox.objects.filter(id__in=ids).update(
+            status=DeliveryStatus.SENDING, claimed_at=now, attempts=F('attempts') + 1
+        )
+    return list(NotificationOutbox.objects.filter(id__in=ids).only('id', 'user_id', 'channel', 'kind', 'payload',
+                                                                   'attempts', 'created_at'))
+
+
+def _send(channel, semaphore, notifications) -> DeliveryResult:
+    with semaphore:
+        try:
+            return channel.send_batch(notifications)
+        except Exception as e:
+            return DeliveryResult(errors={n.id: f"{type(e).__name__}: {e}" for n in notifications})
+
+
+def _send_in_worker_thread(job) -> DeliveryResult:
+    try:
+        return _send(*job)
+    finally:
+        connections.close_all()
+
+
+def deliver(notifications: list) -> DeliveryResult:
+    """Fan a claimed batch out to its channels, never running more than a channel's concurrency at once."""
+    by_channel = defaultdict(list)
+    for notification in notifications:
+        by_channel[notification.channel].append(notification)
+
+    jobs = []
+    channel_concurrency = {}
+    result = DeliveryResult()
+    for name, items in by_channel.items():
+        try:
+            channel = get_channel(name)
+        except KeyError:
+            result.errors.update({n.id: f"Unknown channel '{name}'" for n in items})
+            continue
+        channel_concurrency[name] = channel.concurrency
+        semaphore = threading.BoundedSemaphore(channel.concurrency)
+        for start in range(0, len(items), channel.batch_size):
+            jobs.append((channel, semaphore, items[start:start + channel.batch_size]))
+
+    if len(jobs) == 1:
+        partials = [_send(*jobs[0])]
+    elif jobs:
+        with ThreadPoolExecutor(max_workers=min(len(jobs), sum(channel_concurrency.values()))) as pool:
+            partials = list(pool.map(_send_in_worker_thread, jobs))
+    else:
+        partials = []
+    for partial in partials:
+        result.sent_ids.extend(partial.sent_ids)
+        result.errors.update(partial.errors)
+    return result
+
+
+def record_outcomes(notifications: list, result: DeliveryResult):
+    now = timezone.now()
+    if result.sent_ids:
+        NotificationOutbox.objects.filter(id__in=result.sent_ids).update(
+            status=DeliveryStatus.SENT, sent_at=now, last_error=''
+        )
+
+    retry_rows = []
+    for notification in notifications:
+        if notification.id not in result.errors:
+            continue
+        notification.last_error = result.errors[notification.id]
+        if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            notification.status = DeliveryStatus.FAILED
+        else:
+            backoff = RETRY_BACKOFF_SECONDS[min(notification.attempts, len(RETRY_BACKOFF_SECONDS)) - 1]
+            notification.status = DeliveryStatus.PENDING
+            notification.available_at = now + timedelta(seconds=backoff)
+        retry_rows.append(notification)
+    if retry_rows:
+        NotificationOutbox.objects.bulk_update(retry_rows, ['status', 'available_at', 'last_error'])
+
+
+def dispatch_pending(batch_size: int = None, time_budget_seconds: float = None) -> dict:
+    """Drain the outbox batch by batch until it is empty or the time budget runs out."""
+    batch_size = batch_size or settings.NOTIFICATION_DISPATCH_BATCH_SIZE
+    deadline = time.monotonic() + (time_budget_seconds or settings.NOTIFICATION_DISPATCH_TIME_BUDGET_SECONDS)
+    totals = {"sent": 0, "failed": 0, "drained": True}
+    while True:
+        if time.monotonic() >= deadline:
+            totals["drained"] = False
+            break
+        notifications = claim_batch(batch_size)
+        if not notifications:
+            break
+        result = deliver(notifications)
+        record_outcomes(notifications, result)
+        totals["sent"] += len(result.sent_ids)
+        totals["failed"] += len(result.errors)
+    return totals
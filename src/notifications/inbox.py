@@ -0,0 +1,98 @@
+import base64
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import InboxNotification
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _unread_key(user_id: int) -> str:
+    return f"notifications:unread:{user_id}"
+
+
+def unread_count(user_id: int) -> int:
+    """Badge count from the cache; on a miss it is rebuilt once from the partial unread index."""
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = InboxNotification.objects.filter(user_id=user_id, is_read=False).count()
+        # add() rather than set(): a counter created by a concurrent rebuild wins over ours
+        cache.add(key, count, timeout=settings.NOTIFICATION_UNREAD_COUNTER_TTL_SECONDS)
+        count = cache.get(key, count)
+    return max(count, 0)
+
+
+def _adjust_unread(user_id: int, delta: int):
+    # Only counters that already exist are adjusted; a missing one is rebuilt from the database on the next read
+    try:
+        count = cache.incr(_unread_key(user_id), delta)
+    except ValueError:
+        return
+    if count < 0:
+        cache.delete(_unread_key(user_id))
+
+
+def increment_unread(user_ids: Iterable[int]):
+    for user_id, delta in Counter(user_ids).items():
+        _adjust_unread(user_id, delta)
+
+
+def reset_unread(user_ids: Iterable[int]):
+    """Drops the counters, so the next read rebuilds them from the database."""
+    cache.delete_many([_unread_key(user_id) for user_id in set(user_ids)])
+
+
+def mark_read(user_id: int, ids: Iterable[int]) -> int:
+    updated = InboxNotification.objects.filter(user_id=user_id, id__in=list(ids), is_read=False).update(
+        is_read=True, read_at=timezone.now()
+    )
+    if updated:
+        _adjust_unread(user_id, -updated)
+    return updated
+
+
+def mark_all_read(user_id: int) -> int:
+    updated = InboxNotification.objects.filter(user_id=user_id, is_read=False).update(
+        is_read=True, read_at=timezone.now()
+    )
+    cache.set(_unread_key(user_id), 0, timeout=settings.NOTIFICATION_UNREAD_COUNTER_TTL_SECONDS)
+    return updated
+
+
+def encode_cursor(notification: InboxNotification) -> str:
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor.") from e
+
+
+def list_page(user_id: int, cursor: Optional[str] = None, limit: int = 20, unread_only: bool = False):
+    """
+    Newest-first page of a user's inbox. Seeks past the cursor's (created_at, id) instead of using OFFSET, so every
+    page is a bounded index range scan. Returns (items, next_cursor).
+    """
+    qs = InboxNotification.objects.filter(user_id=user_id)
+    if unread_only:
+        qs = qs.filter(is_read=False)
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id))
+    items = list(qs.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
@@ -1,3 +1,62 @@
 from django.db import models
 
 # Create your models here.
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class NotificationOutbox(models.Model):
+    class DeliveryStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENDING = 'sending', 'Sending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='outbox_notifications')
+    channel = models.CharField(max_length=20)
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=255, unique=True,
+                                  help_text="Channel-scoped key that makes enqueueing the same notification a no-op")
+    status = models.CharField(max_length=20, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Notification outbox"
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'claimed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} via {self.channel} for user {self.user_id} ({self.status})"
+
+
+class InboxNotification(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='inbox_notifications')
+    outbox = models.OneToOneField(NotificationOutbox, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='inbox_item',
+                                  help_text="Outbox row this was delivered from; makes redelivery a no-op")
+    kind = models.CharField(max_length=50)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    is_read = models.BooleanField(default=False)
+    read_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (created_at, id) backwards within one user's inbox
+            models.Index(fields=['user', '-created_at', '-id'], name='inbox_user_created_idx'),
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='inbox_user_unread_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for user {self.user_id}{'' if self.is_read else ' (unread)'}"
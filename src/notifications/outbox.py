@@ -0,0 +1,41 @@
+from typing import Iterable, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import NotificationOutbox
+
+DISPATCH_DEBOUNCE_KEY = "notifications:dispatch-scheduled"
+DISPATCH_DEBOUNCE_SECONDS = 5
+
+
+def _schedule_dispatch():
+    from .tasks import dispatch_notification_outbox
+
+    if cache.add(DISPATCH_DEBOUNCE_KEY, 1, timeout=DISPATCH_DEBOUNCE_SECONDS):
+        dispatch_notification_outbox.delay()
+
+
+def enqueue_many(rows: Iterable[Tuple[int, str, dict, str]], channels: Optional[Sequence[str]] = None,
+                 batch_size: int = 1000) -> int:
+    """
+    Write (user_id, kind, payload, dedupe_key) rows to the outbox on the caller's connection, so they commit or
+    roll back with the caller's transaction. Re-enqueueing an existing dedupe_key is silently ignored.
+    """
+    channels = channels or settings.NOTIFICATION_DEFAULT_CHANNELS
+    entries = [
+        NotificationOutbox(user_id=user_id, channel=channel, kind=kind, payload=payload,
+                           dedupe_key=f"{channel}:{dedupe_key}")
+        for user_id, kind, payload, dedupe_key in rows
+        for channel in channels
+    ]
+    if entries:
+        NotificationOutbox.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+        # robust: a broker outage must not fail the caller after its commit; beat picks the rows up anyway
+        transaction.on_commit(_schedule_dispatch, robust=True)
+    return len(entries)
+
+
+def enqueue(user_id: int, kind: str, payload: dict, dedupe_key: str, channels: Optional[Sequence[str]] = None) -> int:
+    return enqueue_many([(user_id, kind, payload, dedupe_key)], channels=channels)
@@ -0,0 +1,36 @@
+from ninja import Schema
+from typing import List, Optional
+from datetime import datetime
+
+
+class InboxNotificationSchemaOut(Schema):
+    id: int
+    kind: str
+    title: str
+    body: str
+    data: dict
+    is_read: bool
+    created_at: datetime
+
+
+class InboxPageSchemaOut(Schema):
+    items: List[InboxNotificationSchemaOut]
+    next_cursor: Optional[str] = None
+    unread_count: int
+
+
+class UnreadCountSchemaOut(Schema):
+    unread_count: int
+
+
+class MarkReadSchemaIn(Schema):
+    ids: List[int]
+
+
+class MarkReadSchemaOut(Schema):
+    updated: int
+    unread_count: int
+
+
+class ErrorDetailSchema(Schema):
+    detail: str
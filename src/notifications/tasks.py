@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from .dispatcher import dispatch_pending
+
+
+@shared_task(name="notifications.tasks.dispatch_notification_outbox")
+def dispatch_notification_outbox():
+    totals = dispatch_pending()
+    if not totals["drained"]:
+        dispatch_notification_outbox.delay()
+    return f"Sent {totals['sent']} notifications, {totals['failed']} failed."
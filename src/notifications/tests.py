@@ -1,3 +1,198 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ninja_jwt.tokens import AccessToken
+from unittest import mock
+
+from gymbackend import realtime
+
+from subscription.models import PlanTier, UserSubscription
+from subscription.tasks import queue_subscription_expiry_reminders
+from .channels import InAppChannel, LocalStubChannel
+from .dispatcher import dispatch_pending, claim_batch
+from .inbox import unread_count
+from .models import NotificationOutbox, InboxNotification
+from .outbox import enqueue, enqueue_many
+
+User = get_user_model()
+DeliveryStatus = NotificationOutbox.DeliveryStatus
+
+
+@override_settings(NOTIFICATION_DEFAULT_CHANNELS=['stub'])
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        LocalStubChannel.sent = []
+        self.user = User.objects.create_user(
+            email="notify@example.com", username="notify", name="Notify", family_name="User", password="pw"
+        )
+
+    def test_enqueue_is_deduplicated(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue(self.user.id, "test", {"title": "Hi"}, dedupe_key="test:1")
+            enqueue(self.user.id, "test", {"title": "Hi again"}, dedupe_key="test:1")
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    def test_dispatch_delivers_batches_and_marks_sent(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue_many((self.user.id, "test", {"n": i}, f"test:{i}") for i in range(25))
+
+        totals = dispatch_pending(batch_size=10)
+
+        self.assertEqual(totals["sent"], 25)
+        self.assertEqual(len(LocalStubChannel.sent), 25)
+        self.assertEqual(NotificationOutbox.objects.filter(status=DeliveryStatus.SENT).count(), 25)
+        self.assertEqual(dispatch_pending()["sent"], 0)
+
+    def test_failed_delivery_is_retried_then_given_up(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue(self.user.id, "test", {}, dedupe_key="test:fail")
+
+        with mock.patch.object(LocalStubChannel, "send_batch", side_effect=ConnectionError("down")), \
+                self.settings(NOTIFICATION_MAX_ATTEMPTS=2):
+            self.assertEqual(dispatch_pending()["failed"], 1)
+            notification = NotificationOutbox.objects.get()
+            self.assertEqual(notification.status, DeliveryStatus.PENDING)
+            self.assertGreater(notification.available_at, timezone.now())
+            self.assertIn("down", notification.last_error)
+
+            NotificationOutbox.objects.update(available_at=timezone.now())
+            dispatch_pending()
+            self.assertEqual(NotificationOutbox.objects.get().status, DeliveryStatus.FAILED)
+
+    def test_stale_claims_are_reclaimed(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue(self.user.id, "test", {}, dedupe_key="test:stale")
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+        NotificationOutbox.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(dispatch_pending()["sent"], 1)
+
+    def test_expiry_reminders_are_queued_once(self):
+        plan = PlanTier.objects.create(name="Gold", price=100, duration_days=30)
+        UserSubscription.objects.create(
+            user=self.user, plan_tier=plan, status=UserSubscription.SubscriptionStatus.ACTIVE,
+            start_date=timezone.now(), expire_date=timezone.now() + timedelta(days=3, hours=2)
+        )
+        with self.captureOnCommitCallbacks(execute=False):
+            queue_subscription_expiry_reminders()
+            queue_subscription_expiry_reminders()
+        reminder = NotificationOutbox.objects.get()
+        self.assertEqual(reminder.kind, "subscription_expiring")
+        self.assertIn("Gold", reminder.payload["body"])
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="inbox@example.com", username="inbox", name="Inbox", family_name="User",
+            password="SecurePassword123!"
+        )
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "inbox@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        self.auth_headers = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+
+    def _deliver(self, count):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue_many(
+                ((self.user.id, "test", {"title": f"Note {i}", "body": "", "data": {"n": i}}, f"test:{i}")
+                 for i in range(count)),
+                channels=["in_app"],
+            )
+        dispatch_pending()
+
+    def test_in_app_delivery_is_idempotent(self):
+        self._deliver(3)
+        self.assertEqual(InboxNotification.objects.count(), 3)
+
+        NotificationOutbox.objects.update(status=DeliveryStatus.PENDING)
+        dispatch_pending()
+        self.assertEqual(InboxNotification.objects.count(), 3)
+        self.assertEqual(self.client.get("/api/notifications/unread-count", **self.auth_headers).json(),
+                         {"unread_count": 3})
+
+    def test_racing_deliveries_do_not_inflate_the_unread_count(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            enqueue_many(((self.user.id, "test", {"title": f"Note {i}"}, f"test:{i}") for i in range(3)),
+                         channels=["in_app"])
+        outbox_rows = list(NotificationOutbox.objects.order_by("id"))
+        # Another worker delivered the first row after this one checked what was already delivered
+        InboxNotification.objects.create(user=self.user, outbox_id=outbox_rows[0].id, kind="test", title="Note 0")
+        self.assertEqual(unread_count(self.user.id), 1)
+
+        with mock.patch.object(InboxNotification.objects, "filter", return_value=InboxNotification.objects.none()):
+            InAppChannel().send_batch(outbox_rows)
+        self.assertEqual(InboxNotification.objects.count(), 3)
+        self.assertEqual(unread_count(self.user.id), 3)
+
+    def test_cursor_pagination_walks_whole_inbox(self):
+        self._deliver(5)
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/api/notifications/", params, **self.auth_headers).json()
+            seen.extend(item["data"]["n"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [4, 3, 2, 1, 0])
+
+        response = self.client.get("/api/notifications/", {"cursor": "not-a-cursor"}, **self.auth_headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_counters_follow_mark_read(self):
+        self._deliver(4)
+        ids = list(InboxNotification.objects.order_by('id').values_list('id', flat=True))
+
+        response = self.client.post("/api/notifications/mark-read", data=json.dumps({"ids": ids[:2]}),
+                                    content_type="application/json", **self.auth_headers)
+        self.assertEqual(response.json(), {"updated": 2, "unread_count": 2})
+
+        cache.clear()
+        self.assertEqual(self.client.get("/api/notifications/unread-count", **self.auth_headers).json(),
+                         {"unread_count": 2})
+
+        response = self.client.post("/api/notifications/mark-all-read", **self.auth_headers)
+        self.assertEqual(response.json(), {"updated": 2, "unread_count": 0})
+        page = self.client.get("/api/notifications/", {"unread_only": True}, **self.auth_headers).json()
+        self.assertEqual(page["items"], [])
+
+
+class RealtimeStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="stream@example.com", username="stream", name="Stream", family_name="User", password="pw"
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_stream_requires_valid_token(self):
+        self.assertEqual(self.client.get("/api/events/stream").status_code, 401)
+        self.assertEqual(self.client.get("/api/events/stream", {"token": "bogus"}).status_code, 401)
+
+    async def test_stream_receives_events_for_its_user_only(self):
+        response = await self.async_client.get("/api/events/stream", {"token": self.token})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+
+        realtime.publish(self.user.id + 1, "notification", {"title": "Not yours"})
+        realtime.publish(self.user.id, "notification", {"title": "Hi"})
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertEqual(chunk, b'event: notification\ndata: {"title": "Hi"}\n\n')
+
+        # A client disconnect cancels the pending read, which must release the hub subscription
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(self.user.id, realtime.hub._listeners)
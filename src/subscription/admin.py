@@ -1,49 +1,75 @@
+import json
+
 from django.contrib import admin
+from django.utils import timezone
+from django.utils.html import format_html
 
 # Register your models here.
 
-from .models import PlanTier, UserSubscription, PaymentTransaction
+from gymbackend.admin_tools import EstimatedCountPaginator, IndexedSearchMixin
+from .models import PlanTier, UserSubscription, PaymentTransaction, Coupon, CouponRedemption, SubscriptionRenewal
+
+# Zarinpal authorities are an A or S followed by 35 digits; any other term is taken as the start of an email
+AUTHORITY_PATTERN = r"[AS]\d{35}"
+EMAIL_PREFIX_SEARCH = (r"\S+", "user__email__istartswith")
+
+
+class CurrencyFilter(admin.SimpleListFilter):
+    title = "currency"
+    parameter_name = "currency"
+
+    def lookups(self, request, model_admin):
+        # From the handful of plan tiers, instead of a DISTINCT over every transaction
+        return [(currency, currency) for currency in
+                PlanTier.objects.order_by("currency").values_list("currency", flat=True).distinct()]
+
+    def queryset(self, request, queryset):
+        return queryset.filter(currency=self.value()) if self.value() else queryset
 
 
 @admin.register(PlanTier)
 class PlanTierAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'currency', 'duration_days', 'max_requests', 'is_active')
+    list_display = ('name', 'price', 'currency', 'duration_days', 'max_requests', 'priority', 'is_active')
     list_filter = ('is_active', 'currency')
     search_fields = ('name',)
 
 
 @admin.register(UserSubscription)
-class UserSubscriptionAdmin(admin.ModelAdmin):
+class UserSubscriptionAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
     'user', 'plan_tier', 'status', 'start_date', 'expire_date', 'is_active', 'latest_payment_transaction_id')
-    list_filter = ('status', 'plan_tier__name')
-    search_fields = ('user__email', 'latest_payment_transaction_id')
+    # plan_tier lists its options from the tiers table; plan_tier__name ran a DISTINCT over every subscription
+    list_filter = ('status', 'plan_tier')
+    list_select_related = ('user', 'plan_tier')
+    search_lookups = ((AUTHORITY_PATTERN, "latest_payment_transaction_id"), EMAIL_PREFIX_SEARCH)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     raw_id_fields = ('user', 'plan_tier')
     readonly_fields = ('created_at', 'updated_at')
     actions = ['check_and_update_status']
 
     def check_and_update_status(self, request, queryset):
-        updated_count = 0
-        for sub in queryset:
-            old_status = sub.status
-            new_status = sub.update_status()
-            if old_status != new_status:
-                updated_count += 1
+        now = timezone.now()
+        updated_count = queryset.filter(
+            status=UserSubscription.SubscriptionStatus.ACTIVE, expire_date__lt=now
+        ).update(status=UserSubscription.SubscriptionStatus.EXPIRED, updated_at=now)
         self.message_user(request, f"{updated_count} subscriptions had their status updated.")
 
     check_and_update_status.short_description = "Check and Update Expiry Status"
 
 
 @admin.register(PaymentTransaction)
-class PaymentTransactionAdmin(admin.ModelAdmin):
+class PaymentTransactionAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
     'gateway_transaction_id', 'user', 'plan_tier_purchased', 'amount_display', 'status', 'request_timestamp',
     'verification_timestamp')
-    list_filter = ('status', 'payment_gateway', 'currency', 'request_timestamp')
-    search_fields = ('user__email', 'gateway_transaction_id', 'plan_tier_purchased__name')
+    list_filter = ('status', CurrencyFilter, 'request_timestamp')
+    list_select_related = ('user', 'plan_tier_purchased')
+    search_lookups = ((AUTHORITY_PATTERN, "gateway_transaction_id"), EMAIL_PREFIX_SEARCH)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     raw_id_fields = ('user', 'plan_tier_purchased', 'user_subscription_updated')
-    readonly_fields = (
-    'request_timestamp', 'verification_timestamp', 'gateway_response_on_request', 'gateway_response_on_verify')
+    readonly_fields = ('request_timestamp', 'verification_timestamp', 'gateway_responses_display')
 
     fieldsets = (
         (None, {'fields': ('user', 'plan_tier_purchased', 'user_subscription_updated')}),
@@ -51,10 +77,51 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
          {'fields': ('payment_gateway', 'gateway_transaction_id', 'amount', 'currency', 'status', 'description')}),
         ('Timestamps', {'fields': ('request_timestamp', 'verification_timestamp')}),
         ('Gateway Raw Responses',
-         {'classes': ('collapse',), 'fields': ('gateway_response_on_request', 'gateway_response_on_verify')}),
+         {'classes': ('collapse',), 'fields': ('gateway_responses_display',)}),
     )
 
+    def get_queryset(self, request):
+        # Only the change form shows the raw gateway responses; gateway_responses() loads them on access
+        return super().get_queryset(request).defer('gateway_response_on_request', 'gateway_response_on_verify')
+
+    def gateway_responses_display(self, obj):
+        # Hot columns for recent transactions, the compressed archive for old ones
+        return format_html("<pre>{}</pre>", json.dumps(obj.gateway_responses(), indent=2, ensure_ascii=False))
+
+    gateway_responses_display.short_description = "Gateway responses"
+
     def amount_display(self, obj):
         return f"{obj.amount} {obj.currency}"
 
-    amount_display.short_description = "Amount"
\ No newline at end of file
+    amount_display.short_description = "Amount"
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code', 'discount_type', 'value', 'max_redemptions', 'redeemed_count', 'starts_at', 'ends_at',
+                    'is_active')
+    list_filter = ('is_active', 'discount_type')
+    search_fields = ('code',)
+    filter_horizontal = ('plan_tiers',)
+    readonly_fields = ('redeemed_count', 'created_at')
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('coupon', 'user', 'transaction', 'status', 'discount_amount', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('coupon', 'user', 'transaction')
+    search_fields = ('=coupon__code',)
+    raw_id_fields = ('coupon', 'user', 'transaction')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(SubscriptionRenewal)
+class SubscriptionRenewalAdmin(admin.ModelAdmin):
+    list_display = ('subscription', 'enabled', 'plan_tier', 'attempts', 'next_attempt_on', 'last_attempt_at',
+                    'pending_authority')
+    list_filter = ('enabled',)
+    list_select_related = ('subscription__user', 'subscription__plan_tier', 'plan_tier')
+    search_fields = ('=pending_authority',)
+    raw_id_fields = ('subscription',)
+    readonly_fields = ('last_attempt_at', 'claim_token', 'pending_authority', 'updated_at')
@@ -1,8 +1,13 @@
+from datetime import date
+from ninja import Query
 from ninja_extra import api_controller, route
-from ninja_extra.permissions import IsAuthenticated
-from django.http import HttpRequest
-from typing import List
+from ninja_extra.permissions import IsAdminUser, IsAuthenticated
+from django.http import HttpRequest, StreamingHttpResponse
+from typing import List, Literal
 
+from gymbackend.auth import OptionalAsyncJWTAuth
+from gymbackend.db_router import reads_from_primary
+from gymbackend.idempotency import idempotent
 from .schemas import (
     PlanTierSchema,
     UserSubscriptionSchema,
@@ -10,69 +15,118 @@ from .schemas import (
     PaymentInitiationResponseSchema,
     ErrorDetailSchema,
     MessageResponseSchema,
-    PaymentVerificationResponseSchema
+    PaymentVerificationResponseSchema,
+    AutoRenewalSchema,
+    AutoRenewalRequestSchema
 )
-from . import services
-from .models import PlanTier
+from . import renewals, services
+from .coupons import CouponError
+from .exports import aiter_transaction_export
+from .models import PlanTier, UserSubscription
 
 
-@api_controller("/subscription", tags=["Subscription"])
+@api_controller("/subscription", tags=["Subscription"], auth=OptionalAsyncJWTAuth())
 class SubscriptionController:
     @route.get("/tiers", response={200: List[PlanTierSchema], 403: ErrorDetailSchema}, permissions=[IsAuthenticated])
-    def list_tiers(self, request: HttpRequest):
+    async def list_tiers(self, request: HttpRequest):
         user = request.auth
         if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
             return 403, {"detail": "User not properly authenticated."}
 
-        return PlanTier.objects.filter(is_active=True)
+        return [tier async for tier in PlanTier.objects.filter(is_active=True)]
 
     @route.post(
         "/initiate-payment",
         permissions=[IsAuthenticated],
         response={
             200: PaymentInitiationResponseSchema,
+            400: ErrorDetailSchema,
             403: ErrorDetailSchema,
             404: ErrorDetailSchema,
             500: ErrorDetailSchema,
             503: ErrorDetailSchema}
     )
-    def initiate_payment(self, request: HttpRequest, payload: PaymentInitiationRequestSchema):
+    @idempotent("subscription.initiate_payment")
+    async def initiate_payment(self, request: HttpRequest, payload: PaymentInitiationRequestSchema):
         user = request.auth
         if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
             return 403, {"detail": "User not properly authenticated."}
 
         try:
-            result = services.initiate_zarinpal_payment(user, payload.plan_tier_id)
-            return 200, PaymentInitiationResponseSchema(payment_url=result.get("payment_url"), authority=result.get("authority"))
+            result = await services.initiate_zarinpal_payment(user, payload.plan_tier_id, coupon_code=payload.coupon_code)
+            return 200, PaymentInitiationResponseSchema(payment_url=result.get("payment_url"), authority=result.get("authority"),
+                                                        amount=result.get("amount"), currency=result.get("currency"))
         except PlanTier.DoesNotExist:
             return 404, {"detail": "Plan tier not found or inactive."}
+        except CouponError as e:
+            return 400, {"detail": str(e)}
         except (ConnectionError, ValueError) as e:
             return 503, {"detail": str(e)}
         except Exception as e:
             return 500, {"detail": "An unexpected error occurred."}
 
     @route.get("/status", permissions=[IsAuthenticated], response={200: UserSubscriptionSchema, 403: ErrorDetailSchema})
-    def get_subscription_status(self, request: HttpRequest):
+    @reads_from_primary  # May mark the subscription expired
+    async def get_subscription_status(self, request: HttpRequest):
         user = request.auth
         if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
             return 403, {"detail": "User not properly authenticated."}
 
-        subscription = services.get_user_subscription_details(user)
+        subscription = await services.get_user_subscription_details(user)
         if not subscription:
             return 200, UserSubscriptionSchema(id=-1, status="none", is_active=False)
         return 200, subscription
 
     @route.post("/cancel-immediately", permissions=[IsAuthenticated], response={200: MessageResponseSchema, 400: ErrorDetailSchema, 403: ErrorDetailSchema})
-    def cancel_subscription_now(self, request: HttpRequest):
+    async def cancel_subscription_now(self, request: HttpRequest):
         user = request.auth
         if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
             return 403, {"detail": "User not properly authenticated."}
 
-        if services.cancel_user_subscription_immediately(user):
+        if await services.cancel_user_subscription_immediately(user):
             return 200, {"message": "Subscription has been cancelled immediately."}
         else:
             return 400, {"detail": "No active subscription found to cancel or already cancelled."}
 
+    @route.get("/auto-renew", permissions=[IsAuthenticated], response={200: AutoRenewalSchema, 403: ErrorDetailSchema})
+    async def get_auto_renewal(self, request: HttpRequest):
+        user = request.auth
+        if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
+            return 403, {"detail": "User not properly authenticated."}
+
+        renewal = await renewals.get_auto_renewal(user)
+        if not renewal:
+            return 200, AutoRenewalSchema(enabled=False, mandate_active=False)
+        return 200, renewal
+
+    @route.put("/auto-renew", permissions=[IsAuthenticated], response={
+        200: AutoRenewalSchema, 400: ErrorDetailSchema, 403: ErrorDetailSchema, 404: ErrorDetailSchema})
+    async def set_auto_renewal(self, request: HttpRequest, payload: AutoRenewalRequestSchema):
+        user = request.auth
+        if not user or not (hasattr(user, 'is_authenticated') and user.is_authenticated):
+            return 403, {"detail": "User not properly authenticated."}
+
+        try:
+            return 200, await renewals.set_auto_renewal(user, payload.enabled, plan_tier_id=payload.plan_tier_id)
+        except UserSubscription.DoesNotExist:
+            return 400, {"detail": "No subscription found to renew."}
+        except PlanTier.DoesNotExist:
+            return 404, {"detail": "Plan tier not found or inactive."}
+
+    @route.get("/transactions/export", permissions=[IsAdminUser], response={400: ErrorDetailSchema, 403: ErrorDetailSchema})
+    async def export_transactions(self, request: HttpRequest, start: date, end: date,
+                                  export_format: Literal["csv", "jsonl"] = Query("csv", alias="format"),
+                                  gzip: bool = False):
+        if end <= start:
+            return 400, {"detail": "end must be after start."}
+
+        filename = f"transactions-{start}-{end}.{export_format}" + (".gz" if gzip else "")
+        content_type = "application/gzip" if gzip else ("text/csv" if export_format == "csv" else "application/x-ndjson")
+        return StreamingHttpResponse(
+            aiter_transaction_export(start, end, export_format, compress=gzip), content_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
 
 @api_controller("/payment", tags=["Payment Callback"])
 class PaymentCallbackController:
@@ -83,14 +137,15 @@ class PaymentCallbackController:
             500: ErrorDetailSchema
         }
     )
-    def payment_gateway_callback(self, request: HttpRequest):
+    @reads_from_primary  # The payment was written moments ago and is settled here
+    async def payment_gateway_callback(self, request: HttpRequest):
         authority = request.GET.get('Authority')
         status_from_callback = request.GET.get('Status')
         if not authority or not status_from_callback:
             return 400, {"detail": "Missing payment authority or status from gateway."}
 
         try:
-            verification_result = services.verify_zarinpal_payment(authority, status_from_callback)
+            verification_result = await services.verify_zarinpal_payment(authority, status_from_callback)
         except Exception as e:
             return 500, {"detail": "An error occurred while verifying payment. Please contact support."}
 
@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from .models import PaymentPayloadArchive, PaymentTransaction
+
+
+def archive_gateway_payloads(cutoff, batch_size: int = 1000) -> int:
+    """
+    Moves the gateway responses of settled transactions requested before `cutoff` into PaymentPayloadArchive, one
+    keyset batch per database transaction, and clears them from the hot table. Payloads written to a transaction
+    after it was archived are merged into its archive on the next run. Returns the number of transactions archived.
+    """
+    candidates = (
+        PaymentTransaction.objects
+        .filter(request_timestamp__lt=cutoff)
+        .exclude(status=PaymentTransaction.TransactionStatus.PENDING)
+        .exclude(gateway_response_on_request__isnull=True, gateway_response_on_verify__isnull=True)
+        .order_by('id')
+        .values_list('id', 'gateway_response_on_request', 'gateway_response_on_verify')
+    )
+    archived_count = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so a payload written concurrently is not cleared before it has been archived
+            batch = list(candidates.filter(id__gt=last_id).select_for_update()[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            ids = [transaction_id for transaction_id, _, _ in batch]
+            existing = {archive.transaction_id: archive.payloads()
+                        for archive in PaymentPayloadArchive.objects.filter(transaction_id__in=ids)}
+            archives = []
+            for transaction_id, on_request, on_verify in batch:
+                payloads = existing.get(transaction_id, {})
+                payloads.update({kind: value for kind, value in (("request", on_request), ("verify", on_verify))
+                                 if value is not None})
+                archives.append(PaymentPayloadArchive(transaction_id=transaction_id,
+                                                      payload=PaymentPayloadArchive.compress(payloads)))
+            PaymentPayloadArchive.objects.bulk_create(archives, update_conflicts=True, unique_fields=['transaction'],
+                                                      update_fields=['payload', 'archived_at'])
+            PaymentTransaction.objects.filter(id__in=ids).update(gateway_response_on_request=None,
+                                                                 gateway_response_on_verify=None)
+        archived_count += len(batch)
+    return archived_count
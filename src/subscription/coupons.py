@@ -0,0 +1,293 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from gymbackend.redis_client import get_redis
+from .models import Coupon, CouponRedemption, PaymentTransaction, PlanTier
+
+RedemptionStatus = CouponRedemption.RedemptionStatus
+HELD_STATUSES = (RedemptionStatus.RESERVED, RedemptionStatus.REDEEMED)
+PAID_STATUSES = (PaymentTransaction.TransactionStatus.VERIFIED, PaymentTransaction.TransactionStatus.SUCCESSFUL)
+
+# The counter holds a coupon's taken slots (reservations plus redemptions). It is seeded from the database the first
+# time it is used (ARGV[2]; -1 asks the caller for the seed) and afterwards only moves by INCR/DECR, so concurrent
+# redemptions of one code never wait on a row lock.
+_RESERVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if ARGV[2] == '' then
+        return -1
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'NX')
+end
+if tonumber(redis.call('GET', KEYS[1])) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+return 1
+"""
+# Releases and late redemptions leave an unseeded counter alone; its seed will count them
+_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+"""
+# Resets the counter to the database count, unless it moved since it was read (ARGV[1]) while that was counted
+_RESYNC_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class CouponError(Exception):
+    """The coupon cannot be applied; the message is meant for the user."""
+
+
+class RedisCouponCounter:
+    """Redemption slots shared by every process that uses the same Redis."""
+
+    def __init__(self, client):
+        self._client = client
+        self._reserve = client.register_script(_RESERVE_SCRIPT)
+        self._adjust = client.register_script(_ADJUST_SCRIPT)
+        self._resync = client.register_script(_RESYNC_SCRIPT)
+
+    @staticmethod
+    def _key(coupon_id: int) -> str:
+        return f"coupon:{coupon_id}:taken"
+
+    def try_reserve(self, coupon_id: int, limit: int, seed: Callable[[], int]) -> bool:
+        taken = self._reserve(keys=[self._key(coupon_id)], args=[limit, ""])
+        if taken == -1:
+            taken = self._reserve(keys=[self._key(coupon_id)], args=[limit, seed()])
+        return taken == 1
+
+    def adjust(self, coupon_id: int, delta: int):
+        self._adjust(keys=[self._key(coupon_id)], args=[delta])
+
+    def peek(self, coupon_ids: list) -> dict:
+        """Current counts of the seeded counters among `coupon_ids`."""
+        values = self._client.mget([self._key(coupon_id) for coupon_id in coupon_ids]) if coupon_ids else []
+        return {coupon_id: int(value) for coupon_id, value in zip(coupon_ids, values) if value is not None}
+
+    def resync(self, coupon_id: int, seen: int, taken: int) -> bool:
+        return self._resync(keys=[self._key(coupon_id)], args=[seen, taken]) == 1
+
+
+class LocalCouponCounter:
+    """In-process stand-in used when Redis is not configured; only counts the current process's reservations."""
+
+    def __init__(self):
+        self._taken = {}
+        self._lock = threading.Lock()
+
+    def try_reserve(self, coupon_id: int, limit: int, seed: Callable[[], int]) -> bool:
+        with self._lock:
+            if coupon_id not in self._taken:
+                self._taken[coupon_id] = seed()
+            if self._taken[coupon_id] >= limit:
+                return False
+            self._taken[coupon_id] += 1
+            return True
+
+    def adjust(self, coupon_id: int, delta: int):
+        with self._lock:
+            if coupon_id in self._taken:
+                self._taken[coupon_id] += delta
+
+    def peek(self, coupon_ids: list) -> dict:
+        with self._lock:
+            return {coupon_id: self._taken[coupon_id] for coupon_id in coupon_ids if coupon_id in self._taken}
+
+    def resync(self, coupon_id: int, seen: int, taken: int) -> bool:
+        with self._lock:
+            if self._taken.get(coupon_id) != seen:
+                return False
+            self._taken[coupon_id] = taken
+            return True
+
+
+_counter = None
+
+
+def get_counter():
+    global _counter
+    if _counter is None:
+        client = get_redis()
+        _counter = RedisCouponCounter(client) if client is not None else LocalCouponCounter()
+    return _counter
+
+
+@dataclass(frozen=True)
+class CouponReservation:
+    coupon_id: int
+    code: str
+    limited: bool
+    once_per_user: bool
+    original_amount: Decimal
+    discount_amount: Decimal
+
+    @property
+    def amount(self) -> Decimal:
+        return self.original_amount - self.discount_amount
+
+
+def discount_for(coupon: Coupon, price: Decimal) -> Decimal:
+    if coupon.discount_type == Coupon.DiscountType.PERCENT:
+        discount = (price * coupon.value / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    else:
+        discount = coupon.value
+    return min(discount, price)
+
+
+def _held_count(coupon_id: int) -> int:
+    return CouponRedemption.objects.filter(coupon_id=coupon_id, status__in=HELD_STATUSES).count()
+
+
+def _release_abandoned(coupon: Coupon, user):
+    """
+    A user who left the gateway page and starts over gives up the reservation of their unpaid payment, instead of
+    waiting COUPON_RESERVATION_TTL_SECONDS for the reconcile task to release it.
+    """
+    for transaction in PaymentTransaction.objects.filter(
+            coupon_redemption__coupon=coupon, coupon_redemption__status=RedemptionStatus.RESERVED, user=user,
+            status=PaymentTransaction.TransactionStatus.PENDING):
+        release(transaction)
+
+
+def reserve_coupon(user, plan: PlanTier, code: str) -> CouponReservation:
+    """
+    Checks `code` against `plan` and takes one of the coupon's redemption slots. The slot is held until the payment
+    settles: record_reservation ties it to the payment, or cancel_reservation gives it back if none was created.
+    """
+    coupon = Coupon.objects.filter(code=code.strip().upper()).first()
+    if coupon is None or not coupon.is_open():
+        raise CouponError("This coupon code is not valid.")
+    plan_ids = set(coupon.plan_tiers.values_list('id', flat=True))
+    if plan_ids and plan.id not in plan_ids:
+        raise CouponError("This coupon does not apply to this plan.")
+    discount = discount_for(coupon, plan.price)
+    if discount >= plan.price:
+        raise CouponError("This coupon does not apply to this plan.")
+    if coupon.once_per_user:
+        _release_abandoned(coupon, user)
+        # Fails fast before the gateway is called; record_reservation enforces it against concurrent payments
+        if CouponRedemption.objects.filter(coupon=coupon, user=user, status__in=HELD_STATUSES).exists():
+            raise CouponError("You have already used this coupon.")
+    limited = coupon.max_redemptions is not None
+    if limited and not get_counter().try_reserve(coupon.id, coupon.max_redemptions, lambda: _held_count(coupon.id)):
+        raise CouponError("This coupon has been fully redeemed.")
+    return CouponReservation(coupon.id, coupon.code, limited, coupon.once_per_user, plan.price, discount)
+
+
+def cancel_reservation(reservation: CouponReservation):
+    """Gives back the slot of a reservation whose payment was never created."""
+    if reservation.limited:
+        get_counter().adjust(reservation.coupon_id, -1)
+
+
+def record_reservation(reservation: CouponReservation, transaction: PaymentTransaction) -> CouponRedemption:
+    """
+    Ties the reservation to its payment. If another payment of the same user already holds a once-per-user coupon,
+    the payment is marked failed and CouponError is raised; the caller still owns the slot and must cancel it.
+    """
+    try:
+        with db_transaction.atomic():
+            return CouponRedemption.objects.create(
+                coupon_id=reservation.coupon_id, user_id=transaction.user_id, transaction=transaction,
+                original_amount=reservation.original_amount, discount_amount=reservation.discount_amount,
+                once_per_user=reservation.once_per_user,
+            )
+    except IntegrityError:
+        PaymentTransaction.objects.filter(id=transaction.id).update(
+            status=PaymentTransaction.TransactionStatus.FAILED, description="Coupon already used by this user")
+        raise CouponError("You have already used this coupon.")
+
+
+def _move(transaction_id: int, from_status: str, to_status: str) -> Optional[dict]:
+    """Moves the transaction's redemption between statuses; returns it only if this call made the change."""
+    redemption = CouponRedemption.objects.filter(transaction_id=transaction_id, status=from_status).values(
+        'id', 'coupon_id', 'coupon__max_redemptions').first()
+    if redemption is None:
+        return None
+    updated = CouponRedemption.objects.filter(id=redemption['id'], status=from_status).update(
+        status=to_status, updated_at=timezone.now())
+    return redemption if updated else None
+
+
+def redeem(transaction: PaymentTransaction):
+    """Marks the coupon of a verified payment used. A reservation released as stale takes its slot again."""
+    if _move(transaction.id, RedemptionStatus.RESERVED, RedemptionStatus.REDEEMED):
+        return
+    # The payment has been made, so it is honoured even if the coupon filled up in the meantime. A once-per-user
+    # coupon the user has since used on another payment stays released: both payments are honoured, one use counts.
+    try:
+        with db_transaction.atomic():
+            redemption = _move(transaction.id, RedemptionStatus.RELEASED, RedemptionStatus.REDEEMED)
+    except IntegrityError:
+        return
+    if redemption and redemption['coupon__max_redemptions'] is not None:
+        get_counter().adjust(redemption['coupon_id'], 1)
+
+
+def release(transaction: PaymentTransaction):
+    """Gives back the coupon slot of a failed payment."""
+    redemption = _move(transaction.id, RedemptionStatus.RESERVED, RedemptionStatus.RELEASED)
+    if redemption and redemption['coupon__max_redemptions'] is not None:
+        get_counter().adjust(redemption['coupon_id'], -1)
+
+
+def _resync_counters():
+    """
+    Resets the redemption counters to the reserved and redeemed rows in the database. This gives back slots that a
+    worker took and then lost before it recorded a reservation. A counter that moves while the rows are counted is
+    left for the next run.
+    """
+    counter = get_counter()
+    seen = counter.peek(list(Coupon.objects.filter(max_redemptions__isnull=False).values_list('id', flat=True)))
+    held = dict(CouponRedemption.objects.filter(coupon_id__in=seen, status__in=HELD_STATUSES).values(
+        'coupon_id').annotate(held=Count('id')).values_list('coupon_id', 'held'))
+    return sum(counter.resync(coupon_id, taken, held.get(coupon_id, 0))
+               for coupon_id, taken in seen.items() if taken != held.get(coupon_id, 0))
+
+
+def reconcile_coupons() -> dict:
+    """
+    Releases reservations older than COUPON_RESERVATION_TTL_SECONDS whose payment never went through, resets the
+    redemption counters from the database, and writes the redeemed count of every coupon used since the last hour
+    back to Coupon.redeemed_count.
+    """
+    now = timezone.now()
+    stale = CouponRedemption.objects.filter(
+        status=RedemptionStatus.RESERVED,
+        created_at__lt=now - timedelta(seconds=settings.COUPON_RESERVATION_TTL_SECONDS),
+    ).exclude(transaction__status__in=PAID_STATUSES).values_list('id', 'coupon_id', 'coupon__max_redemptions')
+    released = 0
+    slots = Counter()
+    for redemption_id, coupon_id, max_redemptions in stale.iterator():
+        if CouponRedemption.objects.filter(id=redemption_id, status=RedemptionStatus.RESERVED).update(
+                status=RedemptionStatus.RELEASED, updated_at=now):
+            released += 1
+            if max_redemptions is not None:
+                slots[coupon_id] += 1
+    for coupon_id, count in slots.items():
+        get_counter().adjust(coupon_id, -count)
+    resynced = _resync_counters()
+
+    touched = CouponRedemption.objects.filter(updated_at__gte=now - timedelta(hours=1)).values('coupon_id')
+    coupons = list(Coupon.objects.filter(id__in=touched).annotate(
+        redeemed=Count('redemptions', filter=Q(redemptions__status=RedemptionStatus.REDEEMED))))
+    for coupon in coupons:
+        coupon.redeemed_count = coupon.redeemed
+    Coupon.objects.bulk_update(coupons, ['redeemed_count'])
+    return {"released": released, "resynced": resynced, "coupons": len(coupons)}
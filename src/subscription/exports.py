@@ -0,0 +1,106 @@
+import csv
+import io
+import zlib
+from datetime import date, datetime, time, timezone as dt_timezone
+
+import orjson
+from asgiref.sync import sync_to_async
+
+from .models import PaymentTransaction
+
+# Columns finance gets; the gateway_response_* JSON blobs are never read
+EXPORT_FIELDS = (
+    "id", "gateway_transaction_id", "user_id", "user__email", "plan_tier_purchased__name", "amount", "currency",
+    "status", "payment_gateway", "request_timestamp", "verification_timestamp", "description",
+)
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def transaction_export_queryset(start: date, end: date):
+    """Transactions requested on or after `start` and before `end` (UTC dates), oldest first, as value tuples."""
+    return (
+        PaymentTransaction.objects
+        .filter(request_timestamp__gte=datetime.combine(start, time.min, dt_timezone.utc),
+                request_timestamp__lt=datetime.combine(end, time.min, dt_timezone.utc))
+        .order_by("request_timestamp", "id")
+        .values_list(*EXPORT_FIELDS)
+    )
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int)):
+        return value
+    return str(value)  # Decimal amounts keep their exact digits
+
+
+class ExportEncoder:
+    """Turns batches of export rows into CSV or JSON lines bytes, gzip-compressed when `compress` is set."""
+
+    def __init__(self, export_format: str, compress: bool = False):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}; expected one of {EXPORT_FORMATS}.")
+        self.export_format = export_format
+        self._compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _encoded(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
+
+    def header(self) -> bytes:
+        if self.export_format != "csv":
+            return b""
+        self._writer.writerow(field.replace("__", "_") for field in EXPORT_FIELDS)
+        return self._encoded(self._drain())
+
+    def encode(self, rows) -> bytes:
+        if self.export_format == "csv":
+            self._writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows)
+            data = self._drain()
+        else:
+            data = b"".join(
+                orjson.dumps({field.replace("__", "_"): _jsonable(value) for field, value in zip(EXPORT_FIELDS, row)})
+                + b"\n" for row in rows)
+        return self._encoded(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def iter_transaction_export(start: date, end: date, export_format: str, compress: bool = False,
+                            chunk_size: int = 2000):
+    """
+    Yields the export as bytes, one piece per `chunk_size` rows. Rows are fetched with QuerySet.iterator (a server-side
+    cursor on PostgreSQL), so memory use does not grow with the size of the range.
+    """
+    encoder = ExportEncoder(export_format, compress)
+    yield encoder.header()
+    batch = []
+    for row in transaction_export_queryset(start, end).iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield encoder.encode(batch)
+            batch = []
+    yield encoder.encode(batch) + encoder.finish()
+
+
+async def aiter_transaction_export(*args, **kwargs):
+    """
+    iter_transaction_export for ASGI responses, which would otherwise buffer a sync iterator whole. Each chunk is
+    produced in the thread-sensitive sync thread, so the cursor stays on one connection between chunks.
+    """
+    chunks = iter_transaction_export(*args, **kwargs)
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
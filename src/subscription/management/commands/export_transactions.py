@@ -0,0 +1,35 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from subscription.exports import EXPORT_FORMATS, iter_transaction_export
+
+
+class Command(BaseCommand):
+    help = "Stream payment transactions requested in [start, end) to a CSV or JSON lines file, optionally gzipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=date.fromisoformat, help="First day (UTC, YYYY-MM-DD), inclusive.")
+        parser.add_argument("end", type=date.fromisoformat, help="Last day (UTC, YYYY-MM-DD), exclusive.")
+        parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output", "-o", default="-", help="File to write; '-' (the default) writes to stdout.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched and written per batch.")
+
+    def handle(self, *args, start, end, export_format, gzip, output, chunk_size, **options):
+        if end <= start:
+            raise CommandError("end must be after start.")
+
+        chunks = iter_transaction_export(start, end, export_format, compress=gzip, chunk_size=chunk_size)
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        written = 0
+        with open(output, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                written += len(chunk)
+        self.stderr.write(f"wrote {written} bytes to {output}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantier',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=0, help_text='0-9; higher tiers are served first by the AI job queues'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0002_plantier_priority'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['request_timestamp', 'id'], name='subscriptio_request_e9a687_idx'),
+        ),
+    ]
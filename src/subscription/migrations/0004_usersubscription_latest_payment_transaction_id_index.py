@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0003_paymenttransaction_request_timestamp_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['latest_payment_transaction_id'], name='subscriptio_latest__130dc5_idx'),
+        ),
+    ]
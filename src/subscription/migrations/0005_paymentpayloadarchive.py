@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_usersubscription_latest_payment_transaction_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentPayloadArchive',
+            fields=[
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload_archive', serialize=False, to='subscription.paymenttransaction')),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
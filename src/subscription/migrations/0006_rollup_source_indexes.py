@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0005_paymentpayloadarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['verification_timestamp', 'id'], name='subscriptio_verific_fc7dfb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['updated_at', 'id'], name='subscriptio_updated_8db506_idx'),
+        ),
+    ]
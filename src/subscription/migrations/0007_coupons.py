@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0006_rollup_source_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='Matched case-insensitively; stored upper case', max_length=40, unique=True)),
+                ('discount_type', models.CharField(choices=[('percent', 'Percent'), ('fixed', 'Fixed amount')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=0, help_text="Percent off (1-99), or an amount off in the plan's currency", max_digits=10)),
+                ('max_redemptions', models.PositiveIntegerField(blank=True, help_text='Leave empty for no limit', null=True)),
+                ('once_per_user', models.BooleanField(default=True)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('redeemed_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan_tiers', models.ManyToManyField(blank=True, help_text='Plans the coupon applies to; none means every plan', related_name='coupons', to='subscription.plantier')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('reserved', 'Reserved'), ('redeemed', 'Redeemed'), ('released', 'Released')], default='reserved', max_length=10)),
+                ('original_amount', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('discount_amount', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='redemptions', to='subscription.coupon')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemption', to='subscription.paymenttransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coupon', 'user'], name='subscriptio_coupon__c64784_idx'), models.Index(fields=['status', 'created_at'], name='subscriptio_status_acfde5_idx'), models.Index(fields=['updated_at'], name='subscriptio_updated_5c2613_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0007_coupons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionRenewal',
+            fields=[
+                ('subscription', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='renewal', serialize=False, to='subscription.usersubscription')),
+                ('enabled', models.BooleanField(default=True)),
+                ('mandate_signature', models.CharField(blank=True, help_text='Zarinpal direct debit (Payman) signature granted by the user', max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Failed charges for the current period')),
+                ('next_attempt_on', models.DateField(blank=True, help_text='Retry date after a failed charge', null=True)),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('claim_token', models.CharField(blank=True, editable=False, max_length=40)),
+                ('pending_authority', models.CharField(blank=True, editable=False, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plan_tier', models.ForeignKey(blank=True, help_text='Plan to renew to; empty renews the current plan', null=True, on_delete=django.db.models.deletion.SET_NULL, to='subscription.plantier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['enabled', 'next_attempt_on'], name='subscriptio_enabled_7e6b57_idx')],
+            },
+        ),
+    ]
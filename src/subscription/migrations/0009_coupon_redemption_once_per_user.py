@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0008_subscription_renewals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='couponredemption',
+            name='once_per_user',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='couponredemption',
+            constraint=models.UniqueConstraint(condition=models.Q(('once_per_user', True), ('status__in', ['reserved', 'redeemed'])), fields=('coupon', 'user'), name='one_held_redemption_per_user'),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import zlib
+
+import orjson
 from django.db import models
 
 # Create your models here.
@@ -13,6 +16,7 @@ class PlanTier(models.Model):
     currency = models.CharField(max_length=3, default="IRT")
     duration_days = models.PositiveIntegerField(default=30)
     max_requests = models.PositiveIntegerField(default=10, help_text="Max AI generation requests for this tier during its duration")
+    priority = models.PositiveSmallIntegerField(default=0, help_text="0-9; higher tiers are served first by the AI job queues")
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
 
@@ -37,6 +41,14 @@ class UserSubscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Admin search by authority
+            models.Index(fields=['latest_payment_transaction_id']),
+            # Analytics rollups read changes since their watermark (analytics.rollups)
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.user.email} - {self.plan_tier.name if self.plan_tier else 'No Plan'} (Expires: {self.expire_date})"
 
@@ -44,10 +56,21 @@ class UserSubscription(models.Model):
     def is_active(self):
         return self.status == self.SubscriptionStatus.ACTIVE and self.expire_date and self.expire_date >= timezone.now()
 
+    def _expire(self):
+        # Conditional on the stored row, so a renewal or payment written since this instance was loaded is kept
+        return UserSubscription.objects.filter(pk=self.pk, status=self.SubscriptionStatus.ACTIVE,
+                                               expire_date__lt=timezone.now())
+
     def update_status(self):
         if self.status == self.SubscriptionStatus.ACTIVE and self.expire_date and self.expire_date < timezone.now():
-            self.status = self.SubscriptionStatus.EXPIRED
-            self.save()
+            if self._expire().update(status=self.SubscriptionStatus.EXPIRED, updated_at=timezone.now()):
+                self.status = self.SubscriptionStatus.EXPIRED
+        return self.status
+
+    async def aupdate_status(self):
+        if self.status == self.SubscriptionStatus.ACTIVE and self.expire_date and self.expire_date < timezone.now():
+            if await self._expire().aupdate(status=self.SubscriptionStatus.EXPIRED, updated_at=timezone.now()):
+                self.status = self.SubscriptionStatus.EXPIRED
         return self.status
 
 
@@ -76,5 +99,140 @@ class PaymentTransaction(models.Model):
                                                   help_text="Full response from gateway on payment verification")
     description = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Date-range exports (subscription.exports) read in this order
+            models.Index(fields=['request_timestamp', 'id']),
+            models.Index(fields=['verification_timestamp', 'id']),
+        ]
+
     def __str__(self):
         return f"Tx {self.gateway_transaction_id} for {self.user.email} - {self.status}"
+
+    def gateway_responses(self) -> dict:
+        """Both gateway responses, read from the archive once subscription.archive has moved them there."""
+        responses = {"request": self.gateway_response_on_request, "verify": self.gateway_response_on_verify}
+        if None in responses.values():
+            archive = PaymentPayloadArchive.objects.filter(transaction_id=self.pk).first()
+            archived = archive.payloads() if archive else {}
+            responses = {kind: archived.get(kind) if value is None else value for kind, value in responses.items()}
+        return responses
+
+
+class PaymentPayloadArchive(models.Model):
+    """Gateway responses of settled transactions older than PAYMENT_PAYLOAD_ARCHIVE_AFTER_DAYS, zlib-compressed JSON."""
+    transaction = models.OneToOneField(PaymentTransaction, on_delete=models.CASCADE, primary_key=True,
+                                       related_name='payload_archive')
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def payloads(self) -> dict:
+        return orjson.loads(zlib.decompress(self.payload))
+
+    @staticmethod
+    def compress(payloads: dict) -> bytes:
+        return zlib.compress(orjson.dumps(payloads), 6)
+
+
+class Coupon(models.Model):
+    class DiscountType(models.TextChoices):
+        PERCENT = 'percent', 'Percent'
+        FIXED = 'fixed', 'Fixed amount'
+
+    code = models.CharField(max_length=40, unique=True, help_text="Matched case-insensitively; stored upper case")
+    discount_type = models.CharField(max_length=10, choices=DiscountType.choices, default=DiscountType.PERCENT)
+    value = models.DecimalField(max_digits=10, decimal_places=0,
+                                help_text="Percent off (1-99), or an amount off in the plan's currency")
+    plan_tiers = models.ManyToManyField(PlanTier, blank=True, related_name='coupons',
+                                        help_text="Plans the coupon applies to; none means every plan")
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for no limit")
+    once_per_user = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    # Written by the reconcile task (subscription.coupons), never per redemption, so flash sales do not contend on it
+    redeemed_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+    def is_open(self, now=None) -> bool:
+        now = now or timezone.now()
+        return (self.is_active and (self.starts_at is None or self.starts_at <= now)
+                and (self.ends_at is None or now < self.ends_at))
+
+
+class CouponRedemption(models.Model):
+    """One use of a coupon, tied to the payment it discounted. RESERVED holds a slot until the payment settles."""
+    class RedemptionStatus(models.TextChoices):
+        RESERVED = 'reserved', 'Reserved'
+        REDEEMED = 'redeemed', 'Redeemed'
+        RELEASED = 'released', 'Released'
+
+    coupon = models.ForeignKey(Coupon, on_delete=models.PROTECT, related_name='redemptions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    transaction = models.OneToOneField(PaymentTransaction, on_delete=models.CASCADE, related_name='coupon_redemption')
+    status = models.CharField(max_length=10, choices=RedemptionStatus.choices, default=RedemptionStatus.RESERVED)
+    original_amount = models.DecimalField(max_digits=10, decimal_places=0)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=0)
+    # Copied from the coupon so the database can enforce one held redemption per user
+    once_per_user = models.BooleanField(default=False, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['coupon', 'user'], name='one_held_redemption_per_user',
+                condition=models.Q(once_per_user=True, status__in=['reserved', 'redeemed']),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['coupon', 'user']),
+            # Stale reservations are released by the reconcile task
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon} for {self.user_id} - {self.status}"
+
+
+class SubscriptionRenewal(models.Model):
+    """
+    Auto-renewal intent for a subscription and the state of its billing attempts (subscription.renewals). Charges go
+    through the Zarinpal direct debit mandate the user signed; without a mandate signature nothing is charged. The API
+    only records the intent: staff enter the signature in the admin once the user has signed the mandate with Zarinpal.
+    """
+    subscription = models.OneToOneField(UserSubscription, on_delete=models.CASCADE, primary_key=True,
+                                        related_name='renewal')
+    enabled = models.BooleanField(default=True)
+    plan_tier = models.ForeignKey(PlanTier, on_delete=models.SET_NULL, null=True, blank=True,
+                                  help_text="Plan to renew to; empty renews the current plan")
+    mandate_signature = models.CharField(max_length=255, blank=True,
+                                         help_text="Zarinpal direct debit (Payman) signature granted by the user")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Failed charges for the current period")
+    next_attempt_on = models.DateField(null=True, blank=True, help_text="Retry date after a failed charge")
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    # Set while a billing run works on the renewal; pending_authority once the gateway has issued one for the charge
+    claim_token = models.CharField(max_length=40, blank=True, editable=False)
+    pending_authority = models.CharField(max_length=100, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['enabled', 'next_attempt_on']),
+        ]
+
+    def __str__(self):
+        return f"Renewal of {self.subscription_id} - {'on' if self.enabled else 'off'}"
+
+    @property
+    def mandate_active(self) -> bool:
+        return bool(self.mandate_signature)
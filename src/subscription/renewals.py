@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Max, Min, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from gymbackend.http_client import get_async_client
+from notifications import outbox
+from .models import PaymentTransaction, PlanTier, SubscriptionRenewal, UserSubscription
+from .services import _amount_in_rial, _log_gateway_call, _next_period
+
+logger = logging.getLogger(__name__)
+
+TransactionStatus = PaymentTransaction.TransactionStatus
+_HEADERS = {"accept": "application/json", "content-type": "application/json"}
+
+
+def _due(as_of: datetime) -> Q:
+    """Enabled renewals with a mandate, for active subscriptions expiring within the window, whose retry date is due."""
+    return (
+        Q(enabled=True, claim_token='', subscription__status=UserSubscription.SubscriptionStatus.ACTIVE,
+          subscription__expire_date__lt=as_of + timedelta(days=settings.RENEWAL_WINDOW_DAYS))
+        & ~Q(mandate_signature='')
+        & (Q(next_attempt_on__isnull=True) | Q(next_attempt_on__lte=as_of.date()))
+    )
+
+
+def _stale(now: datetime) -> Q:
+    """
+    Renewals claimed by a run that did not finish them. Measured from the current time rather than the run's `as_of`,
+    so a shard that crashes mid-run can have its claims taken over by a retry of the same run.
+    """
+    timeout = timedelta(seconds=settings.RENEWAL_CLAIM_TIMEOUT_SECONDS)
+    return ~Q(claim_token='') & Q(last_attempt_at__lt=now - timeout)
+
+
+def due_user_bounds(as_of: str) -> tuple:
+    as_of = datetime.fromisoformat(as_of)
+    bounds = SubscriptionRenewal.objects.filter(_due(as_of) | _stale(timezone.now())).aggregate(
+        low=Min('subscription__user_id'), high=Max('subscription__user_id'))
+    return bounds['low'], bounds['high']
+
+
+@dataclass
+class _Charge:
+    renewal: SubscriptionRenewal
+    plan: Optional[PlanTier]
+    amount: Decimal = Decimal(0)
+    currency: str = "IRT"
+    authority: str = ""
+    # Renewals left with an authority by an interrupted run are only verified: the charge may have gone through
+    in_flight: bool = False
+    response: Optional[dict] = None
+    error: str = ""
+    paid: bool = False
+    # The debit was sent but no answer settled it; the next run only verifies the authority
+    unsettled: bool = False
+
+
+def _gateway_error(data: dict, default: str) -> str:
+    errors = data.get("errors")
+    return str(errors.get("message", default)) if isinstance(errors, dict) else default
+
+
+async def _post(url: str, operation: str, payload: dict, charge: _Charge) -> Optional[dict]:
+    try:
+        started = time.perf_counter()
+        response = await get_async_client().post(url, json=payload, headers=_HEADERS)
+        _log_gateway_call(operation, started, response.status_code)
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        charge.error = f"Payment gateway unavailable: {e}"[:255]
+        return None
+
+
+async def _request_authority(charge: _Charge, callback_url: str):
+    subscription = charge.renewal.subscription
+    payload = {
+        "merchant_id": settings.ZARINPAL_MERCHANT_ID,
+        "amount": _amount_in_rial(charge.amount, charge.currency),
+        "currency": "IRT",
+        "callback_url": callback_url,
+        "description": f"Renewal of {charge.plan.name} for user {subscription.user.email}",
+        "metadata": {"user_id": str(subscription.user_id), "plan_tier_id": str(charge.plan.id),
+                     "email": subscription.user.email},
+    }
+    data = await _post(settings.ZARINPAL_API_REQUEST_URL, "request", payload, charge)
+    if data is None:
+        return
+    if isinstance(data.get("data"), dict) and data["data"].get("authority"):
+        charge.authority = data["data"]["authority"]
+        charge.response = data
+    else:
+        charge.error = _gateway_error(data, "Unknown error from Zarinpal.")[:255]
+
+
+async def _collect(charge: _Charge):
+    if not charge.in_flight:
+        payload = {"merchant_id": settings.ZARINPAL_MERCHANT_ID, "authority": charge.authority,
+                   "signature": charge.renewal.mandate_signature}
+        data = await _post(settings.ZARINPAL_API_DIRECT_DEBIT_URL, "direct_debit", payload, charge)
+        if data is None:
+            # The debit may have gone through before the connection failed
+            charge.unsettled = True
+            return
+        if not (isinstance(data.get("data"), dict) and data["data"].get("code") == 100):
+            charge.response = data
+            charge.error = _gateway_error(data, "The direct debit was declined.")[:255]
+            return
+    payload = {"merchant_id": settings.ZARINPAL_MERCHANT_ID,
+               "amount": _amount_in_rial(charge.amount, charge.currency), "authority": charge.authority}
+    data = await _post(settings.ZARINPAL_API_VERIFY_URL, "verify", payload, charge)
+    if data is None:
+        charge.unsettled = True
+        return
+    charge.response = data
+    # 101 means an earlier verify went through, which happens when an interrupted run is picked up again
+    charge.paid = isinstance(data.get("data"), dict) and data["data"].get("code") in (100, 101)
+    if not charge.paid:
+        charge.error = _gateway_error(data, "Verification failed.")[:255]
+
+
+async def _run_bounded(calls):
+    """Awaits the coroutines with at most RENEWAL_CONCURRENCY of them in flight."""
+    if not calls:
+        return
+    semaphore = asyncio.Semaphore(settings.RENEWAL_CONCURRENCY)
+
+    async def bounded(call):
+        async with semaphore:
+            await call
+
+    try:
+        await asyncio.gather(*(bounded(call) for call in calls))
+    finally:
+        # The loop async_to_sync runs this on ends with the call, so its pooled client goes with it
+        await get_async_client().aclose()
+
+
+def _claim(user_id_from: int, user_id_to: int, as_of: datetime, now: datetime) -> list:
+    """
+    Marks the range's due renewals, and those an interrupted run left behind, with a fresh claim token and returns
+    them. A renewal is claimed by one run at a time, so two workers on the same range never charge it twice.
+    """
+    in_range = SubscriptionRenewal.objects.filter(subscription__user_id__gte=user_id_from,
+                                                  subscription__user_id__lt=user_id_to)
+    # Claimed by a run that stopped before the gateway issued an authority: nothing can have been charged
+    in_range.filter(_stale(now), pending_authority='').update(claim_token='')
+    candidates = list(in_range.filter(_due(as_of) | _stale(now)).values_list('pk', flat=True))
+    token = uuid.uuid4().hex
+    # The claim condition is re-checked on the renewal row itself, so of two runs racing for it only one wins
+    SubscriptionRenewal.objects.filter(Q(claim_token='') | _stale(now), pk__in=candidates).update(
+        claim_token=token, last_attempt_at=now)
+    return list(SubscriptionRenewal.objects.filter(claim_token=token).select_related(
+        'plan_tier', 'subscription__plan_tier', 'subscription__user'))
+
+
+def _prepare(renewals: list) -> list:
+    pending = {
+        transaction.gateway_transaction_id: transaction
+        for transaction in PaymentTransaction.objects.filter(
+            gateway_transaction_id__in=[renewal.pending_authority for renewal in renewals if renewal.pending_authority]
+        ).select_related('plan_tier_purchased')
+    }
+    charges = []
+    for renewal in renewals:
+        if renewal.pending_authority:
+            transaction = pending.get(renewal.pending_authority)
+            charge = _Charge(renewal, None, authority=renewal.pending_authority, in_flight=True)
+            if transaction is None or transaction.plan_tier_purchased is None:
+                charge.error = "The pending payment record is incomplete."
+            else:
+                charge.plan, charge.amount, charge.currency = (transaction.plan_tier_purchased, transaction.amount,
+                                                               transaction.currency)
+            charges.append(charge)
+            continue
+        plan = renewal.plan_tier or renewal.subscription.plan_tier
+        charge = _Charge(renewal, plan)
+        if plan is None or not plan.is_active:
+            charge.error = "The plan is no longer offered."
+        else:
+            charge.amount, charge.currency = plan.price, plan.currency
+        charges.append(charge)
+    return charges
+
+
+def _record_pending(charges: list, now: datetime):
+    """Stores each authority before the charge is made, so an interrupted run can verify it later."""
+    issued = [charge for charge in charges if charge.authority and not charge.in_flight]
+    with db_transaction.atomic():
+        PaymentTransaction.objects.bulk_create([
+            PaymentTransaction(
+                user_id=charge.renewal.subscription.user_id, plan_tier_purchased=charge.plan,
+                gateway_transaction_id=charge.authority, amount=charge.amount, currency=charge.currency,
+                status=TransactionStatus.PENDING, payment_gateway="zarinpal",
+                gateway_response_on_request=charge.response,
+                description=f"Auto-renewal of {charge.plan.name}",
+            )
+            for charge in issued
+        ], batch_size=1000)
+        for charge in issued:
+            charge.renewal.pending_authority = charge.authority
+            charge.renewal.updated_at = now
+        SubscriptionRenewal.objects.bulk_update([charge.renewal for charge in issued],
+                                                ['pending_authority', 'updated_at'], batch_size=1000)
+
+
+def _settle(charges: list, as_of: datetime, now: datetime) -> dict:
+    """Writes every outcome of the batch in one transaction: payments, extended subscriptions and retry schedules."""
+    transactions = {
+        transaction.gateway_transaction_id: transaction
+        for transaction in PaymentTransaction.objects.filter(
+            gateway_transaction_id__in=[charge.authority for charge in charges if charge.authority])
+    }
+    retry_days = settings.RENEWAL_RETRY_DAYS
+    counts = {"renewed": 0, "failed": 0, "gave_up": 0, "unsettled": 0}
+    paid, notifications = [], []
+    for charge in charges:
+        renewal = charge.renewal
+        subscription = renewal.subscription
+        transaction = transactions.get(charge.authority)
+        renewal.updated_at = now
+        if charge.unsettled:
+            # Keeps the claim and the authority, so once the claim goes stale a run verifies it instead of charging
+            # again; the payment stays pending and no attempt is counted
+            renewal.last_error = charge.error
+            counts["unsettled"] += 1
+            continue
+        renewal.claim_token = renewal.pending_authority = ''
+        if transaction is not None:
+            transaction.verification_timestamp = now
+            transaction.gateway_response_on_verify = charge.response or {"error": charge.error}
+
+        if charge.paid:
+            transaction.status = TransactionStatus.VERIFIED
+            transaction.user_subscription_updated = subscription
+            renewal.attempts, renewal.next_attempt_on, renewal.last_error = 0, None, ''
+            counts["renewed"] += 1
+            paid.append(charge)
+            continue
+
+        if transaction is not None:
+            transaction.status = TransactionStatus.FAILED
+        renewal.attempts += 1
+        renewal.last_error = charge.error or "The charge did not go through."
+        if renewal.attempts <= len(retry_days):
+            renewal.next_attempt_on = as_of.date() + timedelta(days=retry_days[renewal.attempts - 1])
+            counts["failed"] += 1
+            continue
+        renewal.enabled, renewal.next_attempt_on = False, None
+        counts["gave_up"] += 1
+        notifications.append((
+            subscription.user_id, "subscription_renewal_failed",
+            {
+                "title": "Automatic renewal failed",
+                "body": "We could not renew your plan automatically. Renew it manually to keep your access.",
+                "data": {"subscription_id": subscription.id, "error": renewal.last_error},
+            },
+            f"subscription_renewal_failed:{subscription.id}:{now:%Y-%m-%d}",
+        ))
+
+    with db_transaction.atomic():
+        # The rows loaded when the batch was claimed may be out of date by now, e.g. a manual payment verified while
+        # the charges were in flight, so the new periods are computed from the locked current rows
+        subscriptions = UserSubscription.objects.select_for_update().in_bulk(
+            [charge.renewal.subscription_id for charge in paid])
+        for charge in paid:
+            subscription = subscriptions[charge.renewal.subscription_id]
+            subscription.start_date, subscription.expire_date = _next_period(subscription, charge.plan, now)
+            subscription.plan_tier = charge.plan
+            subscription.status = UserSubscription.SubscriptionStatus.ACTIVE
+            subscription.latest_payment_transaction_id = charge.authority
+            # bulk_update skips auto_now, and the analytics rollups read changes by updated_at
+            subscription.updated_at = now
+            notifications.append((
+                subscription.user_id, "subscription_renewed",
+                {
+                    "title": "Subscription renewed",
+                    "body": f"Your {charge.plan.name} plan was renewed until {subscription.expire_date:%Y-%m-%d}.",
+                    "data": {"plan_tier_id": charge.plan.id, "expire_date": subscription.expire_date.isoformat()},
+                },
+                f"subscription_renewed:{charge.authority}",
+            ))
+        PaymentTransaction.objects.bulk_update(
+            transactions.values(),
+            ['status', 'verification_timestamp', 'gateway_response_on_verify', 'user_subscription_updated'],
+            batch_size=1000)
+        UserSubscription.objects.bulk_update(
+            subscriptions.values(),
+            ['plan_tier', 'status', 'start_date', 'expire_date', 'latest_payment_transaction_id', 'updated_at'],
+            batch_size=1000)
+        SubscriptionRenewal.objects.bulk_update(
+            [charge.renewal for charge in charges],
+            ['enabled', 'attempts', 'next_attempt_on', 'last_error', 'claim_token', 'pending_authority',
+             'updated_at'],
+            batch_size=1000)
+        outbox.enqueue_many(notifications)
+    return counts
+
+
+def renew_user_range(user_id_from: int, user_id_to: int, as_of: str) -> dict:
+    """
+    Charges the due auto-renewals of users with ids in [user_id_from, user_id_to) as of the run time `as_of`
+    (ISO 8601). Authorities are requested concurrently and stored, then every mandate is charged and verified
+    concurrently, then all outcomes are written in bulk. Safe to run twice on the same range. A debit the gateway
+    did not answer is never retried as a new charge: it stays claimed and a later run verifies its authority.
+    """
+    as_of = datetime.fromisoformat(as_of)
+    now = timezone.now()
+    charges = _prepare(_claim(user_id_from, user_id_to, as_of, now))
+    if not charges:
+        return {}
+
+    callback_url = settings.PAYMENT_CALLBACK_DOMAIN + reverse('api-1.0.0:payment_callback')
+    async_to_sync(_run_bounded)([
+        _request_authority(charge, callback_url) for charge in charges
+        if not charge.in_flight and not charge.error
+    ])
+    _record_pending(charges, now)
+    async_to_sync(_run_bounded)([_collect(charge) for charge in charges if charge.authority and not charge.error])
+    counts = _settle(charges, as_of, now)
+    logger.info("Auto-renewal of users %s-%s: %s", user_id_from, user_id_to, counts,
+                extra={"event": "subscription.renewals_charged", **counts})
+    return counts
+
+
+async def get_auto_renewal(user) -> Optional[SubscriptionRenewal]:
+    return await SubscriptionRenewal.objects.filter(subscription__user=user).afirst()
+
+
+async def set_auto_renewal(user, enabled: bool, plan_tier_id: Optional[int] = None) -> SubscriptionRenewal:
+    """
+    Records the user's renewal intent. Raises UserSubscription.DoesNotExist without a subscription to renew and
+    PlanTier.DoesNotExist for an unknown or inactive plan. Switching it on clears the failed attempts.
+
+    Nothing is charged until staff enter the user's direct debit mandate signature in the admin; the API does not
+    capture mandates.
+    """
+    subscription = await UserSubscription.objects.aget(user=user)
+    plan = await PlanTier.objects.aget(id=plan_tier_id, is_active=True) if plan_tier_id else None
+    renewal, _ = await SubscriptionRenewal.objects.aget_or_create(subscription=subscription,
+                                                                  defaults={"enabled": enabled})
+    renewal.enabled = enabled
+    renewal.plan_tier = plan
+    fields = ['enabled', 'plan_tier', 'updated_at']
+    if enabled:
+        renewal.attempts, renewal.next_attempt_on, renewal.last_error = 0, None, ''
+        fields += ['attempts', 'next_attempt_on', 'last_error']
+    # Only the intent: a billing run may hold the claim fields right now
+    await renewal.asave(update_fields=fields)
+    return renewal
@@ -24,10 +24,25 @@ class UserSubscriptionSchema(Schema):
 
 class PaymentInitiationRequestSchema(Schema):
     plan_tier_id: int
+    coupon_code: Optional[str] = Field(None, max_length=40)
 
 class PaymentInitiationResponseSchema(Schema):
     payment_url: str
     authority: str
+    amount: Optional[float] = None
+    currency: Optional[str] = None
+
+class AutoRenewalSchema(Schema):
+    enabled: bool
+    plan_tier_id: Optional[int] = None
+    mandate_active: bool
+    attempts: int = 0
+    next_attempt_on: Optional[date] = None
+    last_error: Optional[str] = None
+
+class AutoRenewalRequestSchema(Schema):
+    enabled: bool
+    plan_tier_id: Optional[int] = None
 
 class ErrorDetailSchema(Schema):
     detail: str
@@ -1,30 +1,58 @@
-import requests
-import json
+import logging
+import time
+
+import httpx
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction as db_transaction
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from typing import Optional, Dict, Any
 
-from .models import PlanTier, UserSubscription, PaymentTransaction
+from gymbackend import realtime
+from gymbackend.http_client import get_async_client
+from gymbackend.logs import log_context
+from notifications import outbox
+from . import coupons
+from .models import PlanTier, UserSubscription, PaymentTransaction, SubscriptionRenewal
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def _log_gateway_call(operation: str, started: float, status_code: int):
+    logger.info("Zarinpal %s answered %s in %.0fms", operation, status_code, (time.perf_counter() - started) * 1000,
+                extra={"event": "payment.gateway_call", "operation": operation, "status_code": status_code})
 
-# Zarinpal Specific URLs (move to settings or constants if preferred)
-ZARINPAL_API_REQUEST_URL = 'https://api.zarinpal.com/pg/v4/payment/request.json'
-ZARINPAL_API_VERIFY_URL = 'https://api.zarinpal.com/pg/v4/payment/verify.json'
-ZARINPAL_STARTPAY_URL_TEMPLATE = 'https://www.zarinpal.com/pg/StartPay/{}'
 
+def _amount_in_rial(amount, currency: str) -> int:
+    return int(amount * 10) if currency == 'IRT' else int(amount)
+
+
+async def initiate_zarinpal_payment(user: User, plan_tier_id: int, coupon_code: Optional[str] = None) -> dict:
+    plan = await PlanTier.objects.aget(id=plan_tier_id, is_active=True)
+    reservation = None
+    if coupon_code:
+        reservation = await sync_to_async(coupons.reserve_coupon)(user, plan, coupon_code)
+    try:
+        return await _request_zarinpal_payment(user, plan, reservation)
+    except BaseException:
+        if reservation:
+            # The gateway refused or never answered, so no payment will settle the reservation
+            await sync_to_async(coupons.cancel_reservation)(reservation)
+        raise
 
-def initiate_zarinpal_payment(user: User, plan_tier_id: int) -> dict:
-    plan = get_object_or_404(PlanTier, id=plan_tier_id, is_active=True)
+
+async def _request_zarinpal_payment(user: User, plan: PlanTier, reservation: Optional[coupons.CouponReservation]):
     callback_url = settings.PAYMENT_CALLBACK_DOMAIN + reverse('api-1.0.0:payment_callback')
     description = f"Purchase of {plan.name} for user {user.email}"
-    amount_in_rial = int(plan.price)
-    if plan.currency == 'IRT':
-        amount_in_rial = int(plan.price * 10)
+    amount = plan.price
+    if reservation:
+        amount = reservation.amount
+        description += f" with coupon {reservation.code}"
+    amount_in_rial = _amount_in_rial(amount, plan.currency)
 
     payload = {
         "merchant_id": settings.ZARINPAL_MERCHANT_ID,
@@ -45,53 +73,116 @@ def initiate_zarinpal_payment(user: User, plan_tier_id: int) -> dict:
     }
 
     try:
-        response = requests.post(ZARINPAL_API_REQUEST_URL, json=payload, headers=headers, timeout=10)
+        started = time.perf_counter()
+        response = await get_async_client().post(settings.ZARINPAL_API_REQUEST_URL, json=payload, headers=headers)
+        _log_gateway_call("request", started, response.status_code)
         response.raise_for_status()
         response_data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Zarinpal request error: {e}")
+    except httpx.HTTPError as e:
+        logger.warning("Zarinpal request error: %s", e, extra={"event": "payment.gateway_error"})
         raise ConnectionError(f"Failed to connect to payment gateway: {e}")
-    except json.JSONDecodeError as e:
-        print(f"Zarinpal JSON decode error: {e} - Response was: {response.text}")
+    except ValueError as e:
+        logger.warning("Zarinpal JSON decode error: %s", e,
+                       extra={"event": "payment.gateway_error", "response_text": response.text[:1000]})
         raise ValueError(f"Invalid response from payment gateway: {e}")
 
     if response_data.get("data") and response_data["data"].get("authority"):
         authority = response_data["data"]["authority"]
-        transaction = PaymentTransaction.objects.create(
+        transaction = await PaymentTransaction.objects.acreate(
             user=user,
             plan_tier_purchased=plan,
             gateway_transaction_id=authority,
-            amount=plan.price,
+            amount=amount,
             currency=plan.currency,
             status=PaymentTransaction.TransactionStatus.PENDING,
             payment_gateway="zarinpal",
             gateway_response_on_request=response_data,
             description=description
         )
-        payment_url = ZARINPAL_STARTPAY_URL_TEMPLATE.format(authority)
-        return {"payment_url": payment_url, "authority": authority, "transaction_db_id": transaction.id}
+        if reservation:
+            await sync_to_async(coupons.record_reservation)(reservation, transaction)
+        payment_url = settings.ZARINPAL_STARTPAY_URL_TEMPLATE.format(authority)
+        logger.info("Payment initiated for plan %s", plan.id, extra={
+            "event": "payment.initiated", "transaction_id": authority, "user_id": user.id})
+        return {"payment_url": payment_url, "authority": authority, "transaction_db_id": transaction.id,
+                "amount": amount, "currency": plan.currency}
     else:
         error_message = response_data.get("errors", {}).get("message", "Unknown error from Zarinpal.")
-        print(f"Zarinpal payment initiation failed: {error_message} - Full response: {response_data}")
-        PaymentTransaction.objects.create(
-            user=user, plan_tier_purchased=plan, amount=plan.price, currency=plan.currency,
+        logger.warning("Zarinpal payment initiation failed: %s", error_message,
+                       extra={"event": "payment.initiation_failed", "gateway_response": response_data})
+        await PaymentTransaction.objects.acreate(
+            user=user, plan_tier_purchased=plan, amount=amount, currency=plan.currency,
             status=PaymentTransaction.TransactionStatus.FAILED, payment_gateway="zarinpal",
             gateway_response_on_request=response_data, description=f"Zarinpal init failed: {error_message}"
         )
         raise ValueError(f"Zarinpal payment initiation failed: {error_message}")
 
 
-def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from_session_or_metadata=None):
-    transaction = PaymentTransaction.objects.filter(gateway_transaction_id=authority).first()
+def _next_period(user_subscription: UserSubscription, plan: PlanTier, now) -> tuple:
+    """(start, expire) of a newly paid period, which follows on from the current one if that has not ended yet."""
+    if user_subscription.expire_date and user_subscription.expire_date > now:
+        start = user_subscription.expire_date
+    else:
+        start = now
+    return start, start + timedelta(days=plan.duration_days)
+
+
+def _activate_subscription(transaction: PaymentTransaction, plan: PlanTier) -> UserSubscription:
+    with db_transaction.atomic():
+        user_subscription, created = UserSubscription.objects.get_or_create(user=transaction.user)
+        user_subscription.start_date, user_subscription.expire_date = _next_period(user_subscription, plan, timezone.now())
+        user_subscription.plan_tier = plan
+        user_subscription.status = UserSubscription.SubscriptionStatus.ACTIVE
+        user_subscription.latest_payment_transaction_id = transaction.gateway_transaction_id
+        user_subscription.save()
+        # A manual payment starts a new period, so failed auto-renewal charges of the old one no longer count
+        SubscriptionRenewal.objects.filter(subscription=user_subscription, attempts__gt=0).update(
+            attempts=0, next_attempt_on=None, last_error='', updated_at=timezone.now())
+
+        transaction.user_subscription_updated = user_subscription
+        transaction.save()
+        coupons.redeem(transaction)
+
+        outbox.enqueue(
+            transaction.user_id, "subscription_activated",
+            {
+                "title": "Subscription activated",
+                "body": f"Your {plan.name} plan is active until {user_subscription.expire_date:%Y-%m-%d}.",
+                "data": {"plan_tier_id": plan.id, "expire_date": user_subscription.expire_date.isoformat()},
+            },
+            dedupe_key=f"subscription_activated:{transaction.gateway_transaction_id}",
+        )
+        subscription_event = {
+            "status": user_subscription.status,
+            "plan_tier_id": plan.id,
+            "start_date": user_subscription.start_date,
+            "expire_date": user_subscription.expire_date,
+        }
+        user_id = transaction.user_id
+        db_transaction.on_commit(
+            lambda: realtime.publish(user_id, "subscription.activated", subscription_event), robust=True
+        )
+    return user_subscription
+
+
+async def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from_session_or_metadata=None):
+    with log_context(transaction_id=authority):
+        return await _verify_zarinpal_payment(authority, status_from_callback)
+
+
+async def _verify_zarinpal_payment(authority: str, status_from_callback: str):
+    transaction = await PaymentTransaction.objects.select_related('user', 'plan_tier_purchased').filter(
+        gateway_transaction_id=authority).afirst()
 
     if not transaction:
-        print(f"Verification Error: No transaction found for authority {authority}")
+        logger.warning("Verification error: no transaction found", extra={"event": "payment.unknown_transaction"})
         return {"success": False, "message": "Transaction not found.", "transaction_status": "error"}
 
     if transaction.status in [PaymentTransaction.TransactionStatus.VERIFIED,
                               PaymentTransaction.TransactionStatus.SUCCESSFUL]:
-        print(f"Verification Info: Transaction {authority} already processed with status {transaction.status}.")
-        user_sub = UserSubscription.objects.filter(user=transaction.user).first()
+        logger.info("Transaction already processed with status %s", transaction.status,
+                    extra={"event": "payment.already_processed"})
+        user_sub = await UserSubscription.objects.filter(user=transaction.user).afirst()
         return {
             "success": True,
             "message": "Transaction already verified.",
@@ -104,8 +195,10 @@ def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from
         transaction.gateway_response_on_verify = {"status_from_callback": status_from_callback,
                                                   "message": "User cancelled or payment failed on gateway."}
         transaction.verification_timestamp = timezone.now()
-        transaction.save()
-        print(f"Payment for authority {authority} was not successful on gateway (Status: {status_from_callback}).")
+        await transaction.asave()
+        await sync_to_async(coupons.release)(transaction)
+        logger.info("Payment was not successful on gateway (status %s)", status_from_callback,
+                    extra={"event": "payment.not_completed"})
         return {"success": False, "message": "Payment was not completed successfully.",
                 "transaction_status": transaction.status}
 
@@ -114,29 +207,29 @@ def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from
         transaction.status = PaymentTransaction.TransactionStatus.FAILED
         transaction.gateway_response_on_verify = {"error": "Plan tier missing from transaction record."}
         transaction.verification_timestamp = timezone.now()
-        transaction.save()
+        await transaction.asave()
+        await sync_to_async(coupons.release)(transaction)
         return {"success": False, "message": "Internal error: Plan details missing.",
                 "transaction_status": transaction.status}
 
-    amount_in_rial = int(plan.price)
-    if plan.currency == 'IRT':
-        amount_in_rial = int(plan.price * 10)
-
     payload = {
         "merchant_id": settings.ZARINPAL_MERCHANT_ID,
-        "amount": amount_in_rial,
+        # What was requested at initiation, after any coupon discount
+        "amount": _amount_in_rial(transaction.amount, transaction.currency),
         "authority": authority
     }
     headers = {"accept": "application/json", "content-type": "application/json"}
 
     try:
-        response = requests.post(ZARINPAL_API_VERIFY_URL, json=payload, headers=headers, timeout=10)
+        started = time.perf_counter()
+        response = await get_async_client().post(settings.ZARINPAL_API_VERIFY_URL, json=payload, headers=headers)
+        _log_gateway_call("verify", started, response.status_code)
         response.raise_for_status()
         verification_data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Zarinpal verification API error for {authority}: {e}")
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Zarinpal verification API error: %s", e, extra={"event": "payment.gateway_error"})
         transaction.gateway_response_on_verify = {"error": f"Gateway verification API error: {e}"}
-        transaction.save()
+        await transaction.asave()
         return {"success": False,
                 "message": "Could not verify payment with gateway at this time. Please contact support.",
                 "transaction_status": transaction.status}
@@ -146,26 +239,11 @@ def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from
 
     if verification_data.get("data") and verification_data["data"].get("code") == 100:  # Code 100: Verified
         transaction.status = PaymentTransaction.TransactionStatus.VERIFIED
-        user_subscription, created = UserSubscription.objects.get_or_create(user=transaction.user)
-        user_subscription.plan_tier = plan
-        user_subscription.status = UserSubscription.SubscriptionStatus.ACTIVE
-
-        now = timezone.now()
-        if user_subscription.expire_date and user_subscription.expire_date > now and user_subscription.plan_tier == plan:
-            user_subscription.start_date = user_subscription.expire_date
-        else:
-            user_subscription.start_date = now
-
-        user_subscription.expire_date = user_subscription.start_date + timedelta(days=plan.duration_days)
-        user_subscription.latest_payment_transaction_id = transaction.gateway_transaction_id
-        user_subscription.save()
+        user_subscription = await sync_to_async(_activate_subscription)(transaction, plan)
 
-        transaction.user_subscription_updated = user_subscription
-        transaction.save()
-
-        ref_id = verification_data["data"].get("ref_id", "N/A")
-        print(
-            f"Payment for authority {authority} (Ref ID: {ref_id}) VERIFIED. Subscription for {transaction.user.email} updated.")
+        ref_id = str(verification_data["data"].get("ref_id", "N/A"))
+        logger.info("Payment verified (ref id %s); subscription active until %s", ref_id,
+                    user_subscription.expire_date, extra={"event": "payment.verified", "user_id": transaction.user_id})
         return {
             "success": True,
             "message": "Payment verified and subscription activated.",
@@ -176,20 +254,22 @@ def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from
     elif verification_data.get("data") and verification_data["data"].get(
             "code") == 101:  # Code 101: Verified but submitted before (idempotency)
         transaction.status = PaymentTransaction.TransactionStatus.VERIFIED  # Already processed
-        transaction.save()
-        user_sub = UserSubscription.objects.filter(user=transaction.user,
-                                                   latest_payment_transaction_id=transaction.gateway_transaction_id).first()
+        await transaction.asave()
+        await sync_to_async(coupons.redeem)(transaction)
+        user_sub = await UserSubscription.objects.filter(user=transaction.user,
+                                                         latest_payment_transaction_id=transaction.gateway_transaction_id).afirst()
         if not user_sub:
-            user_subscription, created = UserSubscription.objects.get_or_create(user=transaction.user)
-            print(
-                f"Payment for authority {authority} was already verified (code 101), re-checked/granted subscription.")
+            user_subscription, created = await UserSubscription.objects.aget_or_create(user=transaction.user)
+            logger.info("Payment already verified (code 101); subscription re-checked",
+                        extra={"event": "payment.already_verified"})
         else:
-            print(f"Payment for authority {authority} was already verified (code 101), subscription already active.")
+            logger.info("Payment already verified (code 101); subscription already active",
+                        extra={"event": "payment.already_verified"})
 
         return {
             "success": True,
             "message": "Payment was already verified.",
-            "ref_id": verification_data["data"].get("ref_id", "N/A"),
+            "ref_id": str(verification_data["data"].get("ref_id", "N/A")),
             "transaction_status": transaction.status,
             "subscription_active_until": user_sub.expire_date if user_sub else None
         }
@@ -197,26 +277,28 @@ def verify_zarinpal_payment(authority: str, status_from_callback: str, user_from
         error_message = verification_data.get("errors", {}).get("message", "Verification failed.")
         error_code = verification_data.get("errors", {}).get("code", "Unknown")
         transaction.status = PaymentTransaction.TransactionStatus.FAILED
-        transaction.save()
-        print(f"Zarinpal verification failed for {authority}: {error_message} (Code: {error_code})")
+        await transaction.asave()
+        await sync_to_async(coupons.release)(transaction)
+        logger.warning("Zarinpal verification failed: %s (code %s)", error_message, error_code,
+                       extra={"event": "payment.verification_failed"})
         return {"success": False, "message": f"Payment verification failed: {error_message}",
                 "transaction_status": transaction.status}
 
 
-def get_user_subscription_details(user: User) -> Optional[UserSubscription]:
+async def get_user_subscription_details(user: User) -> Optional[UserSubscription]:
     try:
-        subscription = UserSubscription.objects.select_related('plan_tier').get(user=user)
-        subscription.update_status()  # Check if expired and update
+        subscription = await UserSubscription.objects.select_related('plan_tier').aget(user=user)
+        await subscription.aupdate_status()  # Check if expired and update
         return subscription
     except UserSubscription.DoesNotExist:
         return None
 
-def cancel_user_subscription_immediately(user: User):
-    sub = UserSubscription.objects.filter(user=user).first()
+async def cancel_user_subscription_immediately(user: User):
+    sub = await UserSubscription.objects.filter(user=user).afirst()
     if sub and sub.is_active:
         sub.status = UserSubscription.SubscriptionStatus.CANCELED
         sub.expire_date = timezone.now()
-        sub.save()
-        print(f"Subscription for user {user.email} cancelled immediately.")
+        await sub.asave()
+        logger.info("Subscription cancelled immediately", extra={"event": "subscription.cancelled", "user_id": user.id})
         return True
     return False
\ No newline at end of file
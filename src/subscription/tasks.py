@@ -1,22 +1,118 @@
+import logging
+
 from celery import shared_task
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from gymbackend import batch_jobs
+from notifications import outbox
+from .archive import archive_gateway_payloads
+from .coupons import reconcile_coupons
 from .models import UserSubscription
 
+logger = logging.getLogger(__name__)
 
-@shared_task(name="subscription.tasks.update_expired_subscriptions_status")
-def update_expired_subscriptions_status():
-    print("CELERY BEAT: Running update_expired_subscriptions_status")
+
+EXPIRE_SUBSCRIPTIONS_JOB = "subscription.update_expired_subscriptions_status"
+AUTO_RENEWAL_JOB = "subscription.run_auto_renewals"
+
+
+@batch_jobs.sharded_job(EXPIRE_SUBSCRIPTIONS_JOB, chunk_size=5000)
+def _expire_subscriptions_range(user_id_from, user_id_to):
     expired_subs_updated_count = 0
     subscriptions_to_check = UserSubscription.objects.filter(
+        user_id__gte=user_id_from, user_id__lt=user_id_to,
         status=UserSubscription.SubscriptionStatus.ACTIVE,
         expire_date__lt=timezone.now()
-    )
+    ).exclude(renewal__claim_token__gt='')  # A renewal run is charging for it; that run settles or releases it
     for sub in subscriptions_to_check:
         old_status = sub.status
         new_status = sub.update_status()
         if old_status != new_status:
             expired_subs_updated_count += 1
-            print(f"Subscription for {sub.user.email} updated from {old_status} to {new_status}")
+            logger.info("Subscription %s updated from %s to %s", sub.id, old_status, new_status,
+                        extra={"event": "subscription.status_changed", "subscription_id": sub.id, "user_id": sub.user_id})
+    return {"expired": expired_subs_updated_count}
+
+
+@shared_task(name="subscription.tasks.update_expired_subscriptions_status")
+def update_expired_subscriptions_status():
+    shards = batch_jobs.dispatch(EXPIRE_SUBSCRIPTIONS_JOB)
+    logger.info("Dispatched %s shards of %s", shards, EXPIRE_SUBSCRIPTIONS_JOB,
+                extra={"event": "subscription.expiry_dispatched", "count": shards})
+    return f"Dispatched {shards} shards."
+
+
+def _auto_renewal_bounds(as_of):
+    # renewals pulls in httpx; keep it out of worker startup
+    from .renewals import due_user_bounds
+    return due_user_bounds(as_of)
+
+
+@batch_jobs.sharded_job(AUTO_RENEWAL_JOB, bounds=_auto_renewal_bounds, chunk_size=1000)
+def _auto_renew_range(user_id_from, user_id_to, as_of):
+    from .renewals import renew_user_range
+    return renew_user_range(user_id_from, user_id_to, as_of)
+
+
+@shared_task(name="subscription.tasks.run_auto_renewals")
+def run_auto_renewals():
+    # The first dispatch of the day fixes as_of, so a resumed run selects the same renewals
+    shards = batch_jobs.dispatch(AUTO_RENEWAL_JOB, as_of=timezone.now().isoformat())
+    logger.info("Dispatched %s shards of %s", shards, AUTO_RENEWAL_JOB,
+                extra={"event": "subscription.renewals_dispatched", "count": shards})
+    return f"Dispatched {shards} shards."
+
+
+@shared_task(name="subscription.tasks.queue_subscription_expiry_reminders")
+def queue_subscription_expiry_reminders(chunk_size=5000):
+    days = settings.SUBSCRIPTION_EXPIRY_REMINDER_DAYS
+    window_start = timezone.now() + timedelta(days=days)
+    expiring = UserSubscription.objects.filter(
+        status=UserSubscription.SubscriptionStatus.ACTIVE,
+        expire_date__gte=window_start,
+        expire_date__lt=window_start + timedelta(days=1),
+    ).order_by('id').values_list('id', 'user_id', 'expire_date', 'plan_tier__name')
+
+    queued_count = 0
+    last_id = 0
+    while True:
+        chunk = list(expiring.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        with transaction.atomic():
+            queued_count += outbox.enqueue_many(
+                (
+                    user_id, "subscription_expiring",
+                    {
+                        "title": "Your plan expires soon",
+                        "body": f"Your {plan_name or 'subscription'} plan expires in {days} days.",
+                        "data": {"subscription_id": sub_id, "expire_date": expire_date.isoformat()},
+                    },
+                    f"subscription_expiring:{sub_id}:{expire_date:%Y-%m-%d}",
+                )
+                for sub_id, user_id, expire_date, plan_name in chunk
+            )
+
+    logger.info("Queued %s subscription expiry reminders", queued_count,
+                extra={"event": "subscription.expiry_reminders_queued", "count": queued_count})
+    return f"Queued {queued_count} reminders."
+
+
+@shared_task(name="subscription.tasks.archive_old_gateway_payloads")
+def archive_old_gateway_payloads(batch_size=1000):
+    cutoff = timezone.now() - timedelta(days=settings.PAYMENT_PAYLOAD_ARCHIVE_AFTER_DAYS)
+    archived_count = archive_gateway_payloads(cutoff, batch_size=batch_size)
+    logger.info("Archived gateway payloads of %s transactions", archived_count,
+                extra={"event": "payment.payloads_archived", "count": archived_count})
+    return f"Archived {archived_count} transactions."
+
 
-    print(f"CELERY BEAT: Checked and updated status for {expired_subs_updated_count} subscriptions.")
-    return f"Updated {expired_subs_updated_count} subscriptions."
\ No newline at end of file
+@shared_task(name="subscription.tasks.reconcile_coupon_redemptions")
+def reconcile_coupon_redemptions():
+    counts = reconcile_coupons()
+    logger.info("Released %s stale coupon reservations and recounted %s coupons", counts["released"], counts["coupons"],
+                extra={"event": "subscription.coupons_reconciled", **counts})
+    return f"Released {counts['released']} reservations, recounted {counts['coupons']} coupons."
@@ -1,17 +1,38 @@
 # subscription/tests.py
 
-from django.test import TestCase, Client
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import CaptureQueriesContext
 from unittest import mock
+import csv
+import gzip
+import io
+import itertools
 import json
+import os
+import tempfile
 from datetime import timedelta
 from django.utils import timezone
+import httpx
+from ninja_jwt.tokens import AccessToken
 
-from .models import PlanTier, UserSubscription, PaymentTransaction
-# Schemas are not typically imported into tests unless you want to validate raw response against them,
-# which is more advanced. Usually, you check specific fields in the response.json().
-from .services import ZARINPAL_STARTPAY_URL_TEMPLATE
+from gymbackend import http_client
+from gymbackend.celery import app as celery_app
+from gymbackend.admin_tools import EstimatedCountPaginator
+from notifications.models import NotificationOutbox
+from . import coupons, renewals
+from .renewals import renew_user_range
+from .archive import archive_gateway_payloads
+from .models import (PlanTier, UserSubscription, PaymentTransaction, PaymentPayloadArchive, Coupon,
+                     CouponRedemption, SubscriptionRenewal)
+from .tasks import (_expire_subscriptions_range, archive_old_gateway_payloads, reconcile_coupon_redemptions,
+                    run_auto_renewals)
 
 User = get_user_model()
 
@@ -55,6 +76,20 @@ class SubscriptionModelTests(TestCase):
         self.assertEqual(reloaded_expired_sub.status, UserSubscription.SubscriptionStatus.EXPIRED)
 
 
+    def test_status_check_on_a_stale_row_keeps_a_renewal(self):
+        user = User.objects.create_user(**self.user_data_raw_expired)
+        plan = PlanTier.objects.create(name="Test Plan", price=100, duration_days=30, max_requests=10, is_active=True)
+        stale = UserSubscription.objects.create(
+            user=user, plan_tier=plan, status=UserSubscription.SubscriptionStatus.ACTIVE,
+            start_date=timezone.now() - timedelta(days=31), expire_date=timezone.now() - timedelta(days=1)
+        )
+        renewed_until = timezone.now() + timedelta(days=29)
+        UserSubscription.objects.filter(id=stale.id).update(expire_date=renewed_until)
+        self.assertEqual(async_to_sync(stale.aupdate_status)(), UserSubscription.SubscriptionStatus.ACTIVE)
+        stored = UserSubscription.objects.get(id=stale.id)
+        self.assertEqual((stored.status, stored.expire_date), (UserSubscription.SubscriptionStatus.ACTIVE, renewed_until))
+
+
 class SubscriptionAPITests(TestCase):
     # !!! IMPORTANT: Replace this with the URL identified by your accounts/tests.py !!!
     TOKEN_OBTAIN_URL = "/api/token/pair"  # <<< --- !!! REPLACE THIS IF DIFFERENT !!!
@@ -118,7 +153,7 @@ class SubscriptionAPITests(TestCase):
     @mock.patch('subscription.services.initiate_zarinpal_payment')
     def test_initiate_payment_authenticated(self, mock_initiate_zarinpal):
         mock_authority = "TESTAUTH123_SUB_INIT"
-        mock_payment_url = ZARINPAL_STARTPAY_URL_TEMPLATE.format(mock_authority)
+        mock_payment_url = settings.ZARINPAL_STARTPAY_URL_TEMPLATE.format(mock_authority)
         mock_initiate_zarinpal.return_value = {
             "payment_url": mock_payment_url, "authority": mock_authority, "transaction_db_id": 1
         }
@@ -129,7 +164,7 @@ class SubscriptionAPITests(TestCase):
         self.assertEqual(response.status_code, 200, response.content.decode())
         response_data = response.json()
         self.assertEqual(response_data['authority'], mock_authority)
-        mock_initiate_zarinpal.assert_called_once_with(self.user, self.plan1.id)
+        mock_initiate_zarinpal.assert_called_once_with(self.user, self.plan1.id, coupon_code=None)
 
     def test_get_subscription_status_authenticated_no_subscription(self):
         url = self._get_api_url('get_subscription_status-subscription', "/api/subscription/status")
@@ -216,4 +251,543 @@ class SubscriptionAPITests(TestCase):
         self.assertEqual(response.status_code, 400, response.content.decode())  # Asserting 400
         response_data = response.json()
         self.assertIn("Internal verification error.", response_data.get('detail', ""))
-        mock_verify_payment.assert_called_once_with(authority, "OK")
\ No newline at end of file
+        mock_verify_payment.assert_called_once_with(authority, "OK")
+
+class ZarinpalGatewayTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="gateway@example.com", username="gateway_user", name="Gate", family_name="Way",
+            password="SecurePassword123!"
+        )
+        self.plan = PlanTier.objects.create(name="Pro", price=50000, currency="IRR", duration_days=30,
+                                            max_requests=20, is_active=True)
+        response = self.client.post("/api/token/pair", data=json.dumps(
+            {"email": "gateway@example.com", "password": "SecurePassword123!"}), content_type='application/json')
+        self.auth_headers = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['access']}"}
+        self.gateway_requests = []
+
+    def _gateway(self, responder):
+        def handler(request):
+            self.gateway_requests.append(json.loads(request.content))
+            return responder(request)
+        return mock.patch.object(http_client, 'transport', httpx.MockTransport(handler))
+
+    def test_initiate_payment_records_pending_transaction(self):
+        with self._gateway(lambda request: httpx.Response(200, json={"data": {"code": 100, "authority": "A1"}})), \
+                self.assertLogs('subscription.services', 'INFO') as logs:
+            response = self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": self.plan.id}), content_type='application/json', **self.auth_headers)
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual([record.event for record in logs.records], ["payment.gateway_call", "payment.initiated"])
+        self.assertEqual(response.json()['payment_url'], settings.ZARINPAL_STARTPAY_URL_TEMPLATE.format("A1"))
+        self.assertEqual(self.gateway_requests[0]['amount'], 50000)
+        transaction = PaymentTransaction.objects.get(gateway_transaction_id="A1")
+        self.assertEqual(transaction.status, PaymentTransaction.TransactionStatus.PENDING)
+
+    def test_initiate_payment_unknown_plan_and_unreachable_gateway(self):
+        def unreachable(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        with self._gateway(unreachable):
+            missing = self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": 999}), content_type='application/json', **self.auth_headers)
+            down = self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": self.plan.id}), content_type='application/json', **self.auth_headers)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(down.status_code, 503)
+        self.assertFalse(PaymentTransaction.objects.exists())
+
+    def test_callback_verifies_and_activates_subscription(self):
+        PaymentTransaction.objects.create(
+            user=self.user, plan_tier_purchased=self.plan, gateway_transaction_id="A2",
+            amount=self.plan.price, currency=self.plan.currency
+        )
+        with self._gateway(lambda request: httpx.Response(200, json={"data": {"code": 100, "ref_id": 42}})), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get("/api/payment/callback?Authority=A2&Status=OK")
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(response.json()['ref_id'], "42")
+        self.assertEqual(self.gateway_requests, [{"merchant_id": mock.ANY, "amount": 50000, "authority": "A2"}])
+        subscription = UserSubscription.objects.get(user=self.user)
+        self.assertTrue(subscription.is_active)
+        self.assertEqual(PaymentTransaction.objects.get(gateway_transaction_id="A2").status,
+                         PaymentTransaction.TransactionStatus.VERIFIED)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_callback_reads_the_payment_from_the_primary(self):
+        # Tests only have the default database, so a read routed to the replica would fail the callback with a 500.
+        # The test's own transaction is hidden from the router, which otherwise keeps every read on the primary.
+        PaymentTransaction.objects.create(
+            user=self.user, plan_tier_purchased=self.plan, gateway_transaction_id="A2",
+            amount=self.plan.price, currency=self.plan.currency
+        )
+        with mock.patch("gymbackend.db_router.connections", {DEFAULT_DB_ALIAS: mock.Mock(in_atomic_block=False)}):
+            # A new client: the gateway redirects the user's browser, which need not carry a primary pin
+            response = Client().get("/api/payment/callback?Authority=A2&Status=NOK")
+        self.assertEqual(response.status_code, 400, response.content.decode())
+        self.assertEqual(PaymentTransaction.objects.get(gateway_transaction_id="A2").status,
+                         PaymentTransaction.TransactionStatus.FAILED)
+
+    def test_initiate_payment_retry_with_idempotency_key_is_replayed(self):
+        cache.clear()
+        with self._gateway(lambda request: httpx.Response(
+                200, json={"data": {"code": 100, "authority": f"A{len(self.gateway_requests)}"}})):
+            responses = [self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": self.plan.id}), content_type='application/json', headers={"Idempotency-Key": "k1"},
+                **self.auth_headers) for _ in range(3)]
+            reused = self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": 999}), content_type='application/json', headers={"Idempotency-Key": "k1"},
+                **self.auth_headers)
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(len(self.gateway_requests), 1)
+        self.assertEqual(PaymentTransaction.objects.count(), 1)
+        self.assertEqual(reused.status_code, 422)
+
+    @override_settings(ZARINPAL_API_REQUEST_URL="http://gateway.test/request.json",
+                       ZARINPAL_API_VERIFY_URL="http://gateway.test/verify.json",
+                       ZARINPAL_STARTPAY_URL_TEMPLATE="http://gateway.test/pay/{}")
+    def test_gateway_urls_come_from_settings(self):
+        urls = []
+
+        def responder(request):
+            urls.append(str(request.url))
+            return httpx.Response(200, json={"data": {"code": 100, "authority": "A3", "ref_id": 7}})
+
+        with self._gateway(responder):
+            initiated = self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": self.plan.id}), content_type='application/json', **self.auth_headers)
+            self.client.get("/api/payment/callback?Authority=A3&Status=OK")
+        self.assertEqual(initiated.json()['payment_url'], "http://gateway.test/pay/A3")
+        self.assertEqual(urls, ["http://gateway.test/request.json", "http://gateway.test/verify.json"])
+
+
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(email="finance@example.com", username="finance", name="Fin",
+                                              family_name="Ance", password=None, is_staff=True)
+        self.member = User.objects.create_user(email="member@example.com", username="member", name="Mem",
+                                               family_name="Ber", password=None)
+        plan = PlanTier.objects.create(name="Pro", price=50000, currency="IRR", duration_days=30, max_requests=20)
+        for authority, requested in (("before", "2025-12-31"), ("first", "2026-01-01"), ("second", "2026-01-15"),
+                                     ("after", "2026-02-01")):
+            transaction = PaymentTransaction.objects.create(
+                user=self.member, plan_tier_purchased=plan, gateway_transaction_id=authority, amount=50000,
+                currency="IRR", gateway_response_on_request={"blob": "x" * 100})
+            PaymentTransaction.objects.filter(pk=transaction.pk).update(
+                request_timestamp=timezone.datetime.fromisoformat(f"{requested}T12:00:00+00:00"))
+
+    def _export(self, user, query):
+        return self.async_client.get(f"/api/subscription/transactions/export?{query}",
+                                     headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    async def _content(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_staff_export_streams_rows_in_range_as_csv_jsonl_and_gzip(self):
+        response = await self._export(self.staff, "start=2026-01-01&end=2026-02-01")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="transactions-2026-01-01-2026-02-01.csv"', response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO((await self._content(response)).decode())))
+        self.assertEqual(rows[0][:4], ["id", "gateway_transaction_id", "user_id", "user_email"])
+        self.assertEqual([row[1] for row in rows[1:]], ["first", "second"])
+        self.assertNotIn("blob", str(rows))
+
+        compressed = await self._export(self.staff, "start=2026-01-01&end=2026-02-01&format=jsonl&gzip=true")
+        self.assertEqual(compressed["Content-Type"], "application/gzip")
+        lines = gzip.decompress(await self._content(compressed)).splitlines()
+        self.assertEqual([json.loads(line)["gateway_transaction_id"] for line in lines], ["first", "second"])
+        self.assertEqual(json.loads(lines[0])["amount"], "50000")
+
+    async def test_export_requires_staff_and_a_valid_range(self):
+        self.assertEqual((await self._export(self.member, "start=2026-01-01&end=2026-02-01")).status_code, 403)
+        self.assertEqual((await self._export(self.staff, "start=2026-02-01&end=2026-01-01")).status_code, 400)
+        self.assertEqual((await self._export(self.staff, "start=2026-01-01&end=2026-02-01&format=xml")).status_code,
+                         422)
+
+    def test_management_command_writes_gzipped_file_in_small_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "january.csv.gz")
+            call_command("export_transactions", "2025-12-01", "2026-03-01", "--gzip", "--chunk-size", "1",
+                         "--output", path, stderr=io.StringIO())
+            with gzip.open(path, "rt") as file:
+                rows = list(csv.reader(file))
+        self.assertEqual([row[1] for row in rows[1:]], ["before", "first", "second", "after"])
+
+
+class SubscriptionAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email="admin@example.com", username="admin", name="Ad",
+                                                   family_name="Min", password=None)
+        self.client.force_login(self.admin)
+        self.plan = PlanTier.objects.create(name="Pro", price=50000, currency="IRR", duration_days=30, max_requests=20)
+
+    def _add_member(self, index):
+        member = User.objects.create_user(email=f"member{index}@example.com", username=f"member{index}", name="M",
+                                          family_name="B", password=None)
+        PaymentTransaction.objects.create(user=member, plan_tier_purchased=self.plan, amount=50000,
+                                          gateway_transaction_id=f"A{index:035d}")
+        return UserSubscription.objects.create(user=member, plan_tier=self.plan,
+                                               status=UserSubscription.SubscriptionStatus.ACTIVE,
+                                               expire_date=timezone.now() + timedelta(days=index - 2))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self._add_member(1)
+        url = reverse("admin:subscription_paymenttransaction_changelist")
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for index in range(2, 12):
+            self._add_member(index)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(any("gateway_response" in query["sql"] for query in many.captured_queries))
+
+    def test_search_routes_authorities_and_email_prefixes(self):
+        for index in range(1, 4):
+            self._add_member(index)
+        url = reverse("admin:subscription_paymenttransaction_changelist")
+        by_authority = self.client.get(url, {"q": f"A{2:035d}"}).context["cl"].result_list
+        self.assertEqual([tx.user.email for tx in by_authority], ["member2@example.com"])
+        by_email = self.client.get(url, {"q": "MEMBER3@"}).context["cl"].result_list
+        self.assertEqual([tx.gateway_transaction_id for tx in by_email], [f"A{3:035d}"])
+
+    def test_check_and_update_status_expires_lapsed_subscriptions_in_one_update(self):
+        subscriptions = [self._add_member(index) for index in range(1, 4)]  # expired 1 day ago, today, 1 day ahead
+        url = reverse("admin:subscription_usersubscription_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {"action": "check_and_update_status",
+                                   "_selected_action": [subscription.pk for subscription in subscriptions]})
+        self.assertEqual(sum(query["sql"].startswith("UPDATE") for query in queries.captured_queries), 1)
+        self.assertEqual(list(UserSubscription.objects.order_by("user__username").values_list("status", flat=True)),
+                         ["expired", "expired", "active"])
+
+    def test_paginator_counts_up_to_its_limit(self):
+        for index in range(1, 4):
+            self._add_member(index)
+        with mock.patch.object(EstimatedCountPaginator, "count_limit", 2):
+            paginator = EstimatedCountPaginator(PaymentTransaction.objects.order_by("pk"), 1)
+            self.assertEqual(paginator.count, 2)
+
+
+class GatewayPayloadArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="archive@example.com", username="archive", name="Ar",
+                                             family_name="Chive", password=None)
+        self.plan = PlanTier.objects.create(name="Pro", price=50000, currency="IRR", duration_days=30, max_requests=20)
+        self.responses = {"request": {"data": {"code": 100, "authority": "A1"}},
+                          "verify": {"data": {"code": 100, "ref_id": 42, "card_pan": "5022" * 4}}}
+
+    def _transaction(self, authority, days_old, status=PaymentTransaction.TransactionStatus.VERIFIED):
+        transaction = PaymentTransaction.objects.create(
+            user=self.user, plan_tier_purchased=self.plan, gateway_transaction_id=authority, amount=50000,
+            status=status, gateway_response_on_request=self.responses["request"],
+            gateway_response_on_verify=self.responses["verify"])
+        PaymentTransaction.objects.filter(pk=transaction.pk).update(
+            request_timestamp=timezone.now() - timedelta(days=days_old))
+        return transaction
+
+    @override_settings(PAYMENT_PAYLOAD_ARCHIVE_AFTER_DAYS=30)
+    def test_old_settled_payloads_move_to_the_archive_and_stay_readable(self):
+        archived = [self._transaction(f"old{n}", days_old=40) for n in range(3)]
+        pending = self._transaction("pending", days_old=40, status=PaymentTransaction.TransactionStatus.PENDING)
+        recent = self._transaction("recent", days_old=5)
+
+        self.assertEqual(archive_old_gateway_payloads(batch_size=2), "Archived 3 transactions.")
+        for transaction in archived:
+            transaction = PaymentTransaction.objects.get(pk=transaction.pk)
+            self.assertIsNone(transaction.gateway_response_on_request)
+            self.assertIsNone(transaction.gateway_response_on_verify)
+            self.assertEqual(transaction.gateway_responses(), self.responses)
+        for transaction in (pending, recent):
+            self.assertEqual(PaymentTransaction.objects.get(pk=transaction.pk).gateway_response_on_request,
+                             self.responses["request"])
+
+        # A payload written after archiving is merged in on the next run
+        PaymentTransaction.objects.filter(pk=archived[0].pk).update(gateway_response_on_verify={"data": {"code": 101}})
+        self.assertEqual(archive_old_gateway_payloads(), "Archived 1 transactions.")
+        self.assertEqual(PaymentPayloadArchive.objects.get(pk=archived[0].pk).payloads(),
+                         {**self.responses, "verify": {"data": {"code": 101}}})
+
+    def test_admin_change_form_shows_archived_payloads(self):
+        transaction = self._transaction("old", days_old=400)
+        archive_gateway_payloads(timezone.now())
+        self.client.force_login(User.objects.create_superuser(
+            email="admin@example.com", username="admin", name="Ad", family_name="Min", password=None))
+        response = self.client.get(reverse("admin:subscription_paymenttransaction_change", args=[transaction.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "&quot;ref_id&quot;: 42")
+
+
+class CouponTests(TestCase):
+    def setUp(self):
+        counter = mock.patch.object(coupons, "_counter", coupons.LocalCouponCounter())
+        counter.start()
+        self.addCleanup(counter.stop)
+        self.plan = PlanTier.objects.create(name="Pro", price=50000, currency="IRR", duration_days=30, max_requests=20)
+        self.coupon = Coupon.objects.create(code="flash20", value=20, max_redemptions=2)
+        self.users = [User.objects.create_user(email=f"buyer{n}@example.com", username=f"buyer{n}", name="Buy",
+                                               family_name=str(n), password=None) for n in range(3)]
+        self.gateway_requests = []
+
+    def _gateway(self):
+        def handler(request):
+            self.gateway_requests.append(json.loads(request.content))
+            if request.url.path.endswith("verify.json"):
+                return httpx.Response(200, json={"data": {"code": 100, "ref_id": 7}})
+            return httpx.Response(200, json={"data": {"code": 100, "authority": f"A{len(self.gateway_requests)}"}})
+        return mock.patch.object(http_client, "transport", httpx.MockTransport(handler))
+
+    def _initiate(self, user, code="Flash20"):
+        with self._gateway():
+            return self.client.post("/api/subscription/initiate-payment", data=json.dumps(
+                {"plan_tier_id": self.plan.id, "coupon_code": code}), content_type="application/json",
+                headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+
+    def _callback(self, authority, status):
+        with self._gateway():
+            return self.client.get(f"/api/payment/callback?Authority={authority}&Status={status}")
+
+    def test_limit_is_enforced_and_failed_payments_give_the_slot_back(self):
+        first, second = self._initiate(self.users[0]), self._initiate(self.users[1])
+        self.assertEqual([first.status_code, second.status_code], [200, 200])
+        self.assertEqual(first.json()["amount"], 40000)
+        self.assertEqual(self.gateway_requests[0]["amount"], 40000)
+
+        sold_out = self._initiate(self.users[2])
+        self.assertEqual((sold_out.status_code, sold_out.json()["detail"]), (400, "This coupon has been fully redeemed."))
+
+        # The first buyer left the gateway page and starts over: their unpaid reservation makes way for the new one
+        first = self._initiate(self.users[0])
+        self.assertEqual(first.status_code, 200, first.content.decode())
+
+        # The second buyer cancels at the gateway; the third can now take the slot
+        self._callback(second.json()["authority"], "NOK")
+        self.assertEqual(self._initiate(self.users[2]).status_code, 200)
+        self.assertEqual(list(CouponRedemption.objects.order_by("id").values_list("status", flat=True)),
+                         ["released", "released", "reserved", "reserved"])
+
+        # Verification charges the discounted amount recorded on the transaction
+        self.gateway_requests = []
+        self.assertEqual(self._callback(first.json()["authority"], "OK").status_code, 200)
+        self.assertEqual(self.gateway_requests[0]["amount"], 40000)
+        self.assertEqual(CouponRedemption.objects.get(transaction__gateway_transaction_id=first.json()["authority"])
+                         .status, CouponRedemption.RedemptionStatus.REDEEMED)
+        self.assertEqual(self._initiate(self.users[0]).json()["detail"], "You have already used this coupon.")
+
+    def test_abandoned_payment_paid_after_all_is_honoured_once(self):
+        abandoned, retried = self._initiate(self.users[0]), self._initiate(self.users[0])
+        for response in (retried, abandoned):
+            self.assertEqual(self._callback(response.json()["authority"], "OK").status_code, 200)
+        self.assertEqual(list(CouponRedemption.objects.order_by("id").values_list("status", flat=True)),
+                         ["released", "redeemed"])
+
+    def test_concurrent_payments_cannot_both_hold_a_once_per_user_coupon(self):
+        # Both reservations pass the early check before either payment is recorded
+        racing = [coupons.reserve_coupon(self.users[0], self.plan, "flash20") for _ in range(2)]
+        payments = [PaymentTransaction.objects.create(
+            user=self.users[0], plan_tier_purchased=self.plan, gateway_transaction_id=f"R{n}", amount=40000,
+            currency="IRR", status=PaymentTransaction.TransactionStatus.PENDING) for n in range(2)]
+        coupons.record_reservation(racing[0], payments[0])
+        with self.assertRaisesMessage(coupons.CouponError, "You have already used this coupon."):
+            coupons.record_reservation(racing[1], payments[1])
+        payments[1].refresh_from_db()
+        self.assertEqual(payments[1].status, PaymentTransaction.TransactionStatus.FAILED)
+        self.assertEqual(CouponRedemption.objects.count(), 1)
+
+    def test_invalid_codes_do_not_take_a_slot(self):
+        self.coupon.plan_tiers.add(PlanTier.objects.create(name="Basic", price=10000, currency="IRR"))
+        self.assertEqual(self._initiate(self.users[0]).json()["detail"], "This coupon does not apply to this plan.")
+        self.assertEqual(self._initiate(self.users[0], code="nope").json()["detail"], "This coupon code is not valid.")
+        self.assertEqual(self.gateway_requests, [])
+        self.assertEqual(coupons.get_counter()._taken, {})
+
+    def test_reconcile_gives_back_slots_lost_before_they_were_recorded(self):
+        # Two workers take the slots and die before the gateway answers, so no reservation is recorded
+        for user in self.users[:2]:
+            coupons.reserve_coupon(user, self.plan, "flash20")
+        self.assertEqual(self._initiate(self.users[2]).json()["detail"], "This coupon has been fully redeemed.")
+        self.assertEqual(coupons.reconcile_coupons()["resynced"], 1)
+        self.assertEqual(self._initiate(self.users[2]).status_code, 200)
+        self.assertEqual(coupons.get_counter()._taken, {self.coupon.id: 1})
+
+    def test_reconcile_releases_stale_reservations_and_writes_the_redeemed_count(self):
+        responses = [self._initiate(user) for user in self.users[:2]]
+        self._callback(responses[0].json()["authority"], "OK")
+        CouponRedemption.objects.filter(status=CouponRedemption.RedemptionStatus.RESERVED).update(
+            created_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(reconcile_coupon_redemptions(), "Released 1 reservations, recounted 1 coupons.")
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.redeemed_count, 1)
+        self.assertEqual(self._initiate(self.users[2]).status_code, 200)
+
+
+
+class AutoRenewalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plan = PlanTier.objects.create(name="Basic", price=50000, currency="IRT", duration_days=30)
+        self.now = timezone.now()
+        self.subscriptions = [
+            self._subscription(n, days_left, signature)
+            for n, (days_left, signature) in enumerate([(2, "mandate-0"), (2, "revoked"), (10, "mandate-2"), (2, "")])
+        ]
+        self.gateway_requests = []
+        self.authorities = itertools.count(1000)
+
+    def _subscription(self, n, days_left, signature):
+        user = User.objects.create_user(email=f"member{n}@example.com", username=f"member{n}", name="Mem",
+                                        family_name=str(n), password=None)
+        subscription = UserSubscription.objects.create(
+            user=user, plan_tier=self.plan, status=UserSubscription.SubscriptionStatus.ACTIVE,
+            start_date=self.now - timedelta(days=20), expire_date=self.now + timedelta(days=days_left))
+        SubscriptionRenewal.objects.create(subscription=subscription, mandate_signature=signature)
+        return subscription
+
+    def _gateway(self, verify_times_out=False):
+        def handler(request):
+            body = json.loads(request.content)
+            self.gateway_requests.append((request.url.path.rsplit("/", 1)[-1], body))
+            if request.url.path.endswith("verify.json") and verify_times_out:
+                raise httpx.ReadTimeout("timed out", request=request)
+            if request.url.path.endswith("request.json"):
+                return httpx.Response(200, json={"data": {"code": 100,
+                                                          "authority": f"S{next(self.authorities):035d}"}})
+            if request.url.path.endswith("checkout.json") and body["signature"] == "revoked":
+                return httpx.Response(200, json={"data": [], "errors": {
+                    "code": -80, "message": "The direct debit contract is not active."}})
+            return httpx.Response(200, json={"data": {"code": 100, "ref_id": 7}})
+        return mock.patch.object(http_client, "transport", httpx.MockTransport(handler))
+
+    def _renew(self, days=0, verify_times_out=False):
+        self.gateway_requests = []
+        with self._gateway(verify_times_out):
+            return renew_user_range(0, 10 ** 9, (self.now + timedelta(days=days)).isoformat())
+
+    def test_nightly_run_renews_due_subscriptions_and_schedules_retries(self):
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+        with self._gateway():
+            self.assertTrue(run_auto_renewals().startswith("Dispatched"))
+        # Only the two due subscriptions with a mandate are charged; the declined one is never verified
+        self.assertEqual(sorted(call for call, _ in self.gateway_requests),
+                         ["checkout.json", "checkout.json", "request.json", "request.json", "verify.json"])
+
+        renewed, declined = self.subscriptions[:2]
+        renewed.refresh_from_db()
+        self.assertEqual(renewed.expire_date, self.now + timedelta(days=32))
+        transaction = PaymentTransaction.objects.get(gateway_transaction_id=renewed.latest_payment_transaction_id)
+        self.assertEqual((transaction.status, transaction.user_subscription_updated_id),
+                         (PaymentTransaction.TransactionStatus.VERIFIED, renewed.id))
+        self.assertTrue(NotificationOutbox.objects.filter(user=renewed.user, kind="subscription_renewed").exists())
+
+        renewal = SubscriptionRenewal.objects.get(subscription=declined)
+        self.assertEqual((renewal.attempts, renewal.next_attempt_on, renewal.last_error, renewal.claim_token),
+                         (1, (self.now + timedelta(days=1)).date(), "The direct debit contract is not active.", ""))
+        self.assertEqual(PaymentTransaction.objects.get(user=declined.user).status,
+                         PaymentTransaction.TransactionStatus.FAILED)
+
+        # A second run the same day finds nothing due; the retries follow RENEWAL_RETRY_DAYS, then renewal stops
+        self.assertEqual(self._renew(), {})
+        self.assertEqual(self._renew(days=1), {"renewed": 0, "failed": 1, "gave_up": 0, "unsettled": 0})
+        self.assertEqual(self._renew(days=2), {})
+        self.assertEqual(self._renew(days=3), {"renewed": 0, "failed": 0, "gave_up": 1, "unsettled": 0})
+        renewal.refresh_from_db()
+        self.assertEqual((renewal.enabled, renewal.attempts), (False, 3))
+        self.assertTrue(NotificationOutbox.objects.filter(user=declined.user,
+                                                          kind="subscription_renewal_failed").exists())
+        self.assertEqual(self._renew(days=3), {})
+
+    def test_interrupted_runs_are_verified_or_charged_afresh(self):
+        interrupted, unstarted = self.subscriptions[0], self.subscriptions[2]
+        PaymentTransaction.objects.create(user=interrupted.user, plan_tier_purchased=self.plan,
+                                          gateway_transaction_id="S1", amount=50000, currency="IRT")
+        SubscriptionRenewal.objects.filter(subscription=interrupted).update(
+            claim_token="stale", pending_authority="S1", last_attempt_at=self.now - timedelta(hours=2))
+        SubscriptionRenewal.objects.filter(subscription=unstarted).update(
+            claim_token="stale", last_attempt_at=self.now - timedelta(hours=2))
+        UserSubscription.objects.filter(id=unstarted.id).update(expire_date=self.now + timedelta(days=1))
+        self.subscriptions[1].renewal.delete()
+
+        self.assertEqual(self._renew(), {"renewed": 2, "failed": 0, "gave_up": 0, "unsettled": 0})
+        # The interrupted charge is only verified, never charged a second time
+        self.assertEqual([call for call, body in self.gateway_requests if body.get("authority") == "S1"],
+                         ["verify.json"])
+        self.assertEqual(len(self.gateway_requests), 4)
+        self.assertEqual(PaymentTransaction.objects.get(gateway_transaction_id="S1").status,
+                         PaymentTransaction.TransactionStatus.VERIFIED)
+        self.assertEqual(UserSubscription.objects.get(id=interrupted.id).expire_date,
+                         self.now + timedelta(days=32))
+
+    def test_debit_without_an_answer_is_only_verified_later(self):
+        self.subscriptions[1].renewal.delete()
+        self.assertEqual(self._renew(verify_times_out=True), {"renewed": 0, "failed": 0, "gave_up": 0, "unsettled": 1})
+        renewal = SubscriptionRenewal.objects.get(subscription=self.subscriptions[0])
+        self.assertEqual((renewal.attempts, renewal.next_attempt_on), (0, None))
+        self.assertNotEqual((renewal.claim_token, renewal.pending_authority), ("", ""))
+        self.assertEqual(PaymentTransaction.objects.get(gateway_transaction_id=renewal.pending_authority).status,
+                         PaymentTransaction.TransactionStatus.PENDING)
+
+        # Nothing picks the charge up until its claim is stale, and then it is verified, not debited again
+        self.assertEqual(self._renew(), {})
+        with override_settings(RENEWAL_CLAIM_TIMEOUT_SECONDS=0):
+            self.assertEqual(self._renew()["renewed"], 1)
+        self.assertEqual([call for call, _ in self.gateway_requests], ["verify.json"])
+        self.assertEqual(UserSubscription.objects.get(id=self.subscriptions[0].id).expire_date,
+                         self.now + timedelta(days=32))
+
+    def test_expiry_skips_subscriptions_a_renewal_run_is_charging(self):
+        charging, lapsed = self.subscriptions[0], self.subscriptions[3]
+        UserSubscription.objects.filter(id__in=[charging.id, lapsed.id]).update(
+            expire_date=self.now - timedelta(hours=1))
+        SubscriptionRenewal.objects.filter(subscription=charging).update(claim_token="running", pending_authority="S1")
+        self.assertEqual(_expire_subscriptions_range(0, 10 ** 9), {"expired": 1})
+        statuses = dict(UserSubscription.objects.filter(id__in=[charging.id, lapsed.id]).values_list('id', 'status'))
+        self.assertEqual(statuses, {charging.id: UserSubscription.SubscriptionStatus.ACTIVE,
+                                    lapsed.id: UserSubscription.SubscriptionStatus.EXPIRED})
+
+    def test_retry_of_a_crashed_run_takes_over_its_claims(self):
+        crashed = self.subscriptions[0]
+        SubscriptionRenewal.objects.filter(subscription=crashed).update(
+            claim_token="crashed", last_attempt_at=self.now - timedelta(hours=2))
+        # The retry keeps the crashed run's as_of, which is older than the claim
+        self.assertEqual(self._renew(days=-1)["renewed"], 1)
+        self.assertEqual(UserSubscription.objects.get(id=crashed.id).expire_date, self.now + timedelta(days=32))
+
+    def test_payment_verified_during_the_run_is_not_overwritten(self):
+        manual = self.subscriptions[0]
+        self.subscriptions[1].renewal.delete()
+        record_pending = renewals._record_pending
+
+        def record_and_pay_manually(charges, now):
+            record_pending(charges, now)
+            # The user renews by hand while the automatic charge is in flight
+            UserSubscription.objects.filter(id=manual.id).update(expire_date=self.now + timedelta(days=32))
+
+        with mock.patch.object(renewals, "_record_pending", record_and_pay_manually):
+            self.assertEqual(self._renew(), {"renewed": 1, "failed": 0, "gave_up": 0, "unsettled": 0})
+        self.assertEqual(UserSubscription.objects.get(id=manual.id).expire_date, self.now + timedelta(days=62))
+
+    def test_auto_renew_endpoints(self):
+        user = User.objects.create_user(email="new@example.com", username="new", name="New", family_name="User",
+                                        password=None)
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        response = self.client.put("/api/subscription/auto-renew", data=json.dumps({"enabled": True}),
+                                   content_type="application/json", headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        member = self.subscriptions[1].user
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(member)}"}
+        SubscriptionRenewal.objects.filter(subscription__user=member).update(attempts=1, last_error="Declined")
+        response = self.client.put("/api/subscription/auto-renew", data=json.dumps(
+            {"enabled": True, "plan_tier_id": self.plan.id}), content_type="application/json", headers=headers)
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(response.json(), {"enabled": True, "plan_tier_id": self.plan.id, "mandate_active": True,
+                                           "attempts": 0, "next_attempt_on": None, "last_error": ""})
+        self.assertEqual(self.client.get("/api/subscription/auto-renew", headers=headers).json()["attempts"], 0)
+
+        response = self.client.put("/api/subscription/auto-renew", data=json.dumps(
+            {"enabled": False, "plan_tier_id": 999}), content_type="application/json", headers=headers)
+        self.assertEqual(response.status_code, 404)
@@ -1,3 +1,36 @@
 from django.contrib import admin
 
 # Register your models here.
+
+from .models import Exercise, WorkoutPlan, WorkoutSession, SetLog
+
+
+@admin.register(Exercise)
+class ExerciseAdmin(admin.ModelAdmin):
+    list_display = ('name', 'muscle_group', 'equipment', 'difficulty', 'is_compound', 'is_active')
+    list_filter = ('muscle_group', 'equipment', 'difficulty', 'is_active')
+    search_fields = ('name',)
+
+
+@admin.register(WorkoutPlan)
+class WorkoutPlanAdmin(admin.ModelAdmin):
+    list_display = ('user', 'state', 'start_date', 'end_date', 'week_number', 'created_at')
+    list_filter = ('state', 'start_date')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'updated_at')
+
+
+class SetLogInline(admin.TabularInline):
+    model = SetLog
+    raw_id_fields = ('exercise',)
+    extra = 0
+
+
+@admin.register(WorkoutSession)
+class WorkoutSessionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'performed_on', 'plan', 'created_at')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user', 'plan')
+    readonly_fields = ('client_uuid', 'created_at')
+    inlines = [SetLogInline]
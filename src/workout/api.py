@@ -0,0 +1,63 @@
+from typing import List
+
+from ninja import Router, Query
+from ninja_jwt.authentication import JWTAuth
+from django.db import transaction
+
+from accounts.models import UserProfile
+from gymbackend import llm_queues
+from .models import WorkoutPlan, PersonalRecord
+from .schemas import (
+    WorkoutPlanSchemaOut, PlanGenerationRequestSchema, ErrorDetailSchema, SessionBatchSchemaIn, SessionBatchSchemaOut,
+    ExerciseProgressSchemaOut, PersonalRecordSchemaOut, WeeklyVolumeSchemaOut
+)
+from . import progress, services, tasks
+
+workout_router = Router(auth=JWTAuth())
+
+
+@workout_router.get("/plans/current", response={200: WorkoutPlanSchemaOut, 404: ErrorDetailSchema})
+def get_current_plan(request):
+    plan = (WorkoutPlan.objects.filter(user=request.auth)
+            .exclude(state=WorkoutPlan.PlanState.ARCHIVED)
+            .order_by('start_date').first())
+    if not plan:
+        return 404, {"detail": "No current workout plan."}
+    return 200, plan
+
+
+@workout_router.post("/plans/generate", response={201: WorkoutPlanSchemaOut, 404: ErrorDetailSchema})
+def generate_plan(request, payload: PlanGenerationRequestSchema):
+    try:
+        plan = services.generate_workout_plan(request.auth)
+    except UserProfile.DoesNotExist:
+        return 404, {"detail": "User profile not found."}
+    if payload.personalize:
+        user_id = request.auth.id
+        transaction.on_commit(lambda: llm_queues.enqueue(tasks.personalize_workout_plan, plan.id, user_id=user_id))
+    return 201, plan
+
+
+@workout_router.post("/sessions/batch", response={200: SessionBatchSchemaOut, 400: ErrorDetailSchema})
+def upload_sessions(request, payload: SessionBatchSchemaIn):
+    try:
+        result = progress.record_sessions(request.auth, [session.dict() for session in payload.sessions])
+    except progress.UnknownExerciseError as e:
+        return 400, {"detail": str(e)}
+    return 200, result
+
+
+@workout_router.get("/progress/records", response=List[PersonalRecordSchemaOut])
+def list_personal_records(request):
+    return PersonalRecord.objects.filter(user=request.auth).order_by('exercise_id')
+
+
+@workout_router.get("/progress/volume", response=List[WeeklyVolumeSchemaOut])
+def get_weekly_volume(request, weeks: int = Query(12, ge=1, le=104)):
+    return progress.weekly_volume(request.auth.id, weeks)
+
+
+@workout_router.get("/progress/exercises/{exercise_id}", response=ExerciseProgressSchemaOut)
+def get_exercise_progress(request, exercise_id: int, weeks: int = Query(12, ge=1, le=104),
+                          days: int = Query(28, ge=1, le=366)):
+    return progress.exercise_progress(request.auth.id, exercise_id, weeks=weeks, days=days)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gymbackend.llm import get_llm_semaphore
+from gymbackend.llm_queues import queue_stats
+
+
+class Command(BaseCommand):
+    help = "Show depth and wait-time percentiles of the tiered LLM queues, and LLM slots in use."
+
+    def handle(self, *args, **options):
+        for queue, stats in queue_stats().items():
+            shown = {key: "-" if value is None else value for key, value in stats.items()}
+            self.stdout.write(
+                f"{queue:<14} depth={shown['depth']:<6} wait_p50={shown['wait_p50']}s "
+                f"wait_p95={shown['wait_p95']}s samples={shown['samples']}"
+            )
+        self.stdout.write(f"llm slots in use: {get_llm_semaphore().in_use()}/{settings.LLM_MAX_CONCURRENCY}")
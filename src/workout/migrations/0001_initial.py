@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('archived', 'Archived')], default='scheduled', max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('content', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_plans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'start_date'], name='workout_wor_state_0bad76_idx'), models.Index(fields=['user', 'state', 'start_date'], name='workout_wor_user_id_8bd08e_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('state', 'active')), fields=('user',), name='unique_active_workout_plan_per_user')],
+            },
+        ),
+    ]
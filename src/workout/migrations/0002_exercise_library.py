@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workoutplan',
+            name='week_number',
+            field=models.PositiveIntegerField(default=1, help_text="Consecutive week of the user's program, drives progressive overload"),
+        ),
+        migrations.CreateModel(
+            name='Exercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('muscle_group', models.CharField(choices=[('CHEST', 'Chest'), ('BACK', 'Back'), ('SHOULDERS', 'Shoulders'), ('BICEPS', 'Biceps'), ('TRICEPS', 'Triceps'), ('QUADRICEPS', 'Quadriceps'), ('HAMSTRINGS', 'Hamstrings'), ('GLUTES', 'Glutes'), ('CALVES', 'Calves'), ('CORE', 'Core')], max_length=20)),
+                ('equipment', models.CharField(choices=[('BODYWEIGHT', 'Bodyweight'), ('DUMBBELL', 'Dumbbell'), ('BARBELL', 'Barbell'), ('KETTLEBELL', 'Kettlebell'), ('MACHINE', 'Machine'), ('CABLE', 'Cable')], max_length=20)),
+                ('difficulty', models.CharField(choices=[('BEGINNER', 'Beginner'), ('INTERMEDIATE', 'Intermediate'), ('ADVANCED', 'Advanced')], max_length=20)),
+                ('is_compound', models.BooleanField(default=False)),
+                ('description', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['muscle_group', 'equipment', 'difficulty'], name='workout_exe_muscle__c0c62e_idx'), models.Index(fields=['equipment'], name='workout_exe_equipme_e48c7b_idx'), models.Index(fields=['difficulty'], name='workout_exe_difficu_421051_idx')],
+            },
+        ),
+    ]
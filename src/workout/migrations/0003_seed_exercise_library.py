@@ -0,0 +1,78 @@
+from django.db import migrations
+
+EXERCISES = [
+    # name, muscle_group, equipment, difficulty, is_compound
+    ("Push-Up", "CHEST", "BODYWEIGHT", "BEGINNER", True),
+    ("Dumbbell Bench Press", "CHEST", "DUMBBELL", "BEGINNER", True),
+    ("Barbell Bench Press", "CHEST", "BARBELL", "INTERMEDIATE", True),
+    ("Incline Dumbbell Press", "CHEST", "DUMBBELL", "INTERMEDIATE", True),
+    ("Cable Fly", "CHEST", "CABLE", "INTERMEDIATE", False),
+    ("Weighted Dip", "CHEST", "BODYWEIGHT", "ADVANCED", True),
+    ("Lat Pulldown", "BACK", "MACHINE", "BEGINNER", True),
+    ("Seated Cable Row", "BACK", "CABLE", "BEGINNER", True),
+    ("One-Arm Dumbbell Row", "BACK", "DUMBBELL", "BEGINNER", True),
+    ("Pull-Up", "BACK", "BODYWEIGHT", "INTERMEDIATE", True),
+    ("Barbell Row", "BACK", "BARBELL", "INTERMEDIATE", True),
+    ("Deadlift", "BACK", "BARBELL", "ADVANCED", True),
+    ("Dumbbell Shoulder Press", "SHOULDERS", "DUMBBELL", "BEGINNER", True),
+    ("Lateral Raise", "SHOULDERS", "DUMBBELL", "BEGINNER", False),
+    ("Overhead Press", "SHOULDERS", "BARBELL", "INTERMEDIATE", True),
+    ("Face Pull", "SHOULDERS", "CABLE", "INTERMEDIATE", False),
+    ("Push Press", "SHOULDERS", "BARBELL", "ADVANCED", True),
+    ("Dumbbell Curl", "BICEPS", "DUMBBELL", "BEGINNER", False),
+    ("Hammer Curl", "BICEPS", "DUMBBELL", "BEGINNER", False),
+    ("Barbell Curl", "BICEPS", "BARBELL", "INTERMEDIATE", False),
+    ("Cable Curl", "BICEPS", "CABLE", "INTERMEDIATE", False),
+    ("Triceps Pushdown", "TRICEPS", "CABLE", "BEGINNER", False),
+    ("Bench Dip", "TRICEPS", "BODYWEIGHT", "BEGINNER", False),
+    ("Overhead Triceps Extension", "TRICEPS", "DUMBBELL", "INTERMEDIATE", False),
+    ("Close-Grip Bench Press", "TRICEPS", "BARBELL", "ADVANCED", True),
+    ("Goblet Squat", "QUADRICEPS", "DUMBBELL", "BEGINNER", True),
+    ("Leg Press", "QUADRICEPS", "MACHINE", "BEGINNER", True),
+    ("Back Squat", "QUADRICEPS", "BARBELL", "INTERMEDIATE", True),
+    ("Bulgarian Split Squat", "QUADRICEPS", "DUMBBELL", "INTERMEDIATE", True),
+    ("Front Squat", "QUADRICEPS", "BARBELL", "ADVANCED", True),
+    ("Lying Leg Curl", "HAMSTRINGS", "MACHINE", "BEGINNER", False),
+    ("Dumbbell Romanian Deadlift", "HAMSTRINGS", "DUMBBELL", "BEGINNER", True),
+    ("Romanian Deadlift", "HAMSTRINGS", "BARBELL", "INTERMEDIATE", True),
+    ("Nordic Curl", "HAMSTRINGS", "BODYWEIGHT", "ADVANCED", False),
+    ("Glute Bridge", "GLUTES", "BODYWEIGHT", "BEGINNER", False),
+    ("Walking Lunge", "GLUTES", "DUMBBELL", "BEGINNER", True),
+    ("Hip Thrust", "GLUTES", "BARBELL", "INTERMEDIATE", True),
+    ("Kettlebell Swing", "GLUTES", "KETTLEBELL", "INTERMEDIATE", True),
+    ("Standing Calf Raise", "CALVES", "MACHINE", "BEGINNER", False),
+    ("Seated Calf Raise", "CALVES", "MACHINE", "INTERMEDIATE", False),
+    ("Plank", "CORE", "BODYWEIGHT", "BEGINNER", False),
+    ("Dead Bug", "CORE", "BODYWEIGHT", "BEGINNER", False),
+    ("Hanging Leg Raise", "CORE", "BODYWEIGHT", "INTERMEDIATE", False),
+    ("Cable Woodchop", "CORE", "CABLE", "INTERMEDIATE", False),
+    ("Ab Wheel Rollout", "CORE", "BODYWEIGHT", "ADVANCED", False),
+]
+
+
+def seed_exercises(apps, schema_editor):
+    Exercise = apps.get_model('workout', 'Exercise')
+    Exercise.objects.bulk_create(
+        [
+            Exercise(name=name, muscle_group=muscle_group, equipment=equipment, difficulty=difficulty,
+                     is_compound=is_compound)
+            for name, muscle_group, equipment, difficulty, is_compound in EXERCISES
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def remove_exercises(apps, schema_editor):
+    Exercise = apps.get_model('workout', 'Exercise')
+    Exercise.objects.filter(name__in=[row[0] for row in EXERCISES]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0002_exercise_library'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_exercises, remove_exercises),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout', '0003_seed_exercise_library'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_uuid', models.UUIDField(help_text='Generated on the device; makes re-uploading an offline session a no-op')),
+                ('performed_on', models.DateField()),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='workout.workoutplan')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SetLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('set_index', models.PositiveSmallIntegerField()),
+                ('reps', models.PositiveSmallIntegerField()),
+                ('weight', models.FloatField(default=0, help_text='kg; 0 for bodyweight')),
+                ('rpe', models.FloatField(blank=True, null=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='set_logs', to='workout.exercise')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sets', to='workout.workoutsession')),
+            ],
+            options={
+                'ordering': ['session', 'set_index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExerciseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sets', models.PositiveIntegerField(default=0)),
+                ('reps', models.PositiveIntegerField(default=0)),
+                ('volume', models.FloatField(default=0, help_text='Sum of weight x reps, kg')),
+                ('top_weight', models.FloatField(default=0)),
+                ('best_e1rm', models.FloatField(blank=True, help_text='Best estimated one-rep max, kg', null=True)),
+                ('day', models.DateField()),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workout.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise', 'day'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExerciseWeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sets', models.PositiveIntegerField(default=0)),
+                ('reps', models.PositiveIntegerField(default=0)),
+                ('volume', models.FloatField(default=0, help_text='Sum of weight x reps, kg')),
+                ('top_weight', models.FloatField(default=0)),
+                ('best_e1rm', models.FloatField(blank=True, help_text='Best estimated one-rep max, kg', null=True)),
+                ('week_start', models.DateField(help_text='Monday of the week')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workout.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'week_start'], name='workout_exe_user_id_aaba5f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise', 'week_start'), name='unique_weekly_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_weight', models.FloatField(default=0)),
+                ('max_weight_reps', models.PositiveSmallIntegerField(default=0)),
+                ('max_weight_on', models.DateField(blank=True, null=True)),
+                ('best_e1rm', models.FloatField(blank=True, null=True)),
+                ('best_e1rm_on', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workout.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise'), name='unique_personal_record')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['user', '-performed_on'], name='workout_wor_user_id_78bac0_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='workoutsession',
+            constraint=models.UniqueConstraint(fields=('user', 'client_uuid'), name='unique_workout_session_per_device_uuid'),
+        ),
+    ]
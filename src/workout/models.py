@@ -1,3 +1,166 @@
 from django.db import models
 
 # Create your models here.
+
+from django.conf import settings
+from django.db.models import Q
+
+from accounts.models import FitnessLevelChoices
+
+
+class Exercise(models.Model):
+    class MuscleGroup(models.TextChoices):
+        CHEST = 'CHEST', 'Chest'
+        BACK = 'BACK', 'Back'
+        SHOULDERS = 'SHOULDERS', 'Shoulders'
+        BICEPS = 'BICEPS', 'Biceps'
+        TRICEPS = 'TRICEPS', 'Triceps'
+        QUADRICEPS = 'QUADRICEPS', 'Quadriceps'
+        HAMSTRINGS = 'HAMSTRINGS', 'Hamstrings'
+        GLUTES = 'GLUTES', 'Glutes'
+        CALVES = 'CALVES', 'Calves'
+        CORE = 'CORE', 'Core'
+
+    class Equipment(models.TextChoices):
+        BODYWEIGHT = 'BODYWEIGHT', 'Bodyweight'
+        DUMBBELL = 'DUMBBELL', 'Dumbbell'
+        BARBELL = 'BARBELL', 'Barbell'
+        KETTLEBELL = 'KETTLEBELL', 'Kettlebell'
+        MACHINE = 'MACHINE', 'Machine'
+        CABLE = 'CABLE', 'Cable'
+
+    name = models.CharField(max_length=100, unique=True)
+    muscle_group = models.CharField(max_length=20, choices=MuscleGroup.choices)
+    equipment = models.CharField(max_length=20, choices=Equipment.choices)
+    difficulty = models.CharField(max_length=20, choices=[(tag.name, tag.value) for tag in FitnessLevelChoices])
+    is_compound = models.BooleanField(default=False)
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['muscle_group', 'equipment', 'difficulty']),
+            models.Index(fields=['equipment']),
+            models.Index(fields=['difficulty']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_muscle_group_display()})"
+
+
+class WorkoutPlan(models.Model):
+    class PlanState(models.TextChoices):
+        SCHEDULED = 'scheduled', 'Scheduled'
+        ACTIVE = 'active', 'Active'
+        ARCHIVED = 'archived', 'Archived'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='workout_plans')
+    state = models.CharField(max_length=20, choices=PlanState.choices, default=PlanState.SCHEDULED)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    week_number = models.PositiveIntegerField(default=1, help_text="Consecutive week of the user's program, drives progressive overload")
+    content = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'start_date']),
+            models.Index(fields=['user', 'state', 'start_date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=Q(state='active'), name='unique_active_workout_plan_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} plan {self.start_date} - {self.end_date} ({self.state})"
+
+
+class WorkoutSession(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='workout_sessions')
+    client_uuid = models.UUIDField(help_text="Generated on the device; makes re-uploading an offline session a no-op")
+    plan = models.ForeignKey(WorkoutPlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessions')
+    performed_on = models.DateField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-performed_on']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_uuid'], name='unique_workout_session_per_device_uuid'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} session {self.performed_on}"
+
+
+class SetLog(models.Model):
+    session = models.ForeignKey(WorkoutSession, on_delete=models.CASCADE, related_name='sets')
+    exercise = models.ForeignKey(Exercise, on_delete=models.PROTECT, related_name='set_logs')
+    set_index = models.PositiveSmallIntegerField()
+    reps = models.PositiveSmallIntegerField()
+    weight = models.FloatField(default=0, help_text="kg; 0 for bodyweight")
+    rpe = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['session', 'set_index']
+
+    def __str__(self):
+        return f"{self.exercise_id}: {self.reps} x {self.weight}kg"
+
+
+class ExerciseRollup(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name='+')
+    sets = models.PositiveIntegerField(default=0)
+    reps = models.PositiveIntegerField(default=0)
+    volume = models.FloatField(default=0, help_text="Sum of weight x reps, kg")
+    top_weight = models.FloatField(default=0)
+    best_e1rm = models.FloatField(null=True, blank=True, help_text="Best estimated one-rep max, kg")
+
+    class Meta:
+        abstract = True
+
+
+class ExerciseDailyRollup(ExerciseRollup):
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise', 'day'], name='unique_daily_rollup'),
+        ]
+
+
+class ExerciseWeeklyRollup(ExerciseRollup):
+    week_start = models.DateField(help_text="Monday of the week")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise', 'week_start'], name='unique_weekly_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'week_start']),
+        ]
+
+
+class PersonalRecord(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='personal_records')
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name='+')
+    max_weight = models.FloatField(default=0)
+    max_weight_reps = models.PositiveSmallIntegerField(default=0)
+    max_weight_on = models.DateField(null=True, blank=True)
+    best_e1rm = models.FloatField(null=True, blank=True)
+    best_e1rm_on = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise'], name='unique_personal_record'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} PR on {self.exercise_id}: {self.max_weight}kg"
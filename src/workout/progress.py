@@ -0,0 +1,202 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Exercise, WorkoutPlan, WorkoutSession, SetLog, ExerciseDailyRollup, ExerciseWeeklyRollup, PersonalRecord
+)
+
+User = get_user_model()
+
+# Epley is unreliable for long sets, so those do not produce an estimated 1RM
+E1RM_MAX_REPS = 12
+
+ROLLUP_FIELDS = ['sets', 'reps', 'volume', 'top_weight', 'best_e1rm']
+
+
+class UnknownExerciseError(ValueError):
+    pass
+
+
+def estimated_one_rep_max(weight: float, reps: int) -> Optional[float]:
+    if not weight or not reps or reps > E1RM_MAX_REPS:
+        return None
+    return round(weight if reps == 1 else weight * (1 + reps / 30), 1)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+@dataclass
+class _Aggregate:
+    sets: int = 0
+    reps: int = 0
+    volume: float = 0
+    top_weight: float = 0
+    best_e1rm: Optional[float] = None
+
+    def add(self, weight: float, reps: int):
+        self.sets += 1
+        self.reps += reps
+        self.volume += weight * reps
+        self.top_weight = max(self.top_weight, weight)
+        e1rm = estimated_one_rep_max(weight, reps)
+        if e1rm is not None and (self.best_e1rm is None or e1rm > self.best_e1rm):
+            self.best_e1rm = e1rm
+
+    def merge_into(self, row):
+        row.sets += self.sets
+        row.reps += self.reps
+        row.volume = round(row.volume + self.volume, 2)
+        row.top_weight = max(row.top_weight, self.top_weight)
+        if self.best_e1rm is not None and (row.best_e1rm is None or self.best_e1rm > row.best_e1rm):
+            row.best_e1rm = self.best_e1rm
+
+
+def _merge_rollups(model, period_field: str, user_id: int, aggregates: Dict[tuple, _Aggregate]):
+    """Add aggregates onto the existing (exercise, period) rows, touching only the rows this batch affects."""
+    existing = {
+        (row.exercise_id, getattr(row, period_field)): row
+        for row in model.objects.filter(
+            user_id=user_id,
+            exercise_id__in={exercise_id for exercise_id, _ in aggregates},
+            **{f"{period_field}__in": {period for _, period in aggregates}},
+        )
+    }
+    to_create, to_update = [], []
+    for (exercise_id, period), aggregate in aggregates.items():
+        row = existing.get((exercise_id, period))
+        if row is None:
+            row = model(user_id=user_id, exercise_id=exercise_id, **{period_field: period})
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        aggregate.merge_into(row)
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, ROLLUP_FIELDS)
+
+
+def _update_personal_records(user_id: int, entries: List[tuple]) -> List[dict]:
+    records = {
+        record.exercise_id: record
+        for record in PersonalRecord.objects.filter(user_id=user_id, exercise_id__in={e[0] for e in entries})
+    }
+    changed, new_records = {}, {}
+    for exercise_id, day, weight, reps in sorted(entries, key=lambda e: e[1]):
+        record = records.get(exercise_id)
+        if record is None:
+            record = records[exercise_id] = PersonalRecord(user_id=user_id, exercise_id=exercise_id)
+        if weight > record.max_weight or (weight == record.max_weight and weight and reps > record.max_weight_reps):
+            record.max_weight, record.max_weight_reps, record.max_weight_on = weight, reps, day
+            changed[exercise_id] = record
+            new_records[(exercise_id, "max_weight")] = {"value": weight, "on": day}
+        e1rm = estimated_one_rep_max(weight, reps)
+        if e1rm is not None and (record.best_e1rm is None or e1rm > record.best_e1rm):
+            record.best_e1rm, record.best_e1rm_on = e1rm, day
+            changed[exercise_id] = record
+            new_records[(exercise_id, "e1rm")] = {"value": e1rm, "on": day}
+
+    now = timezone.now()
+    for record in changed.values():
+        record.updated_at = now
+    PersonalRecord.objects.bulk_create([r for r in changed.values() if r.pk is None])
+    PersonalRecord.objects.bulk_update(
+        [r for r in changed.values() if r.pk is not None],
+        ['max_weight', 'max_weight_reps', 'max_weight_on', 'best_e1rm', 'best_e1rm_on', 'updated_at'],
+    )
+    return [{"exercise_id": exercise_id, "kind": kind, **value} for (exercise_id, kind), value in new_records.items()]
+
+
+def apply_rollups(user_id: int, entries: List[tuple]) -> List[dict]:
+    """Fold (exercise_id, day, weight, reps) set entries into the daily, weekly and PR tables. Returns new PRs."""
+    daily, weekly = defaultdict(_Aggregate), defaultdict(_Aggregate)
+    for exercise_id, day, weight, reps in entries:
+        daily[(exercise_id, day)].add(weight, reps)
+        weekly[(exercise_id, week_start(day))].add(weight, reps)
+    _merge_rollups(ExerciseDailyRollup, 'day', user_id, daily)
+    _merge_rollups(ExerciseWeeklyRollup, 'week_start', user_id, weekly)
+    return _update_personal_records(user_id, entries)
+
+
+def record_sessions(user, sessions: List[dict]) -> dict:
+    """
+    Store a batch of logged sessions and fold their sets into the rollups in the same transaction. Sessions are
+    keyed by the device's client_uuid, so a batch that is re-sent after a dropped connection is skipped, not counted
+    twice. Logged sets are append-only; the rollups rely on that.
+    """
+    exercise_ids = {s['exercise_id'] for session in sessions for s in session['sets']}
+    known = set(Exercise.objects.filter(id__in=exercise_ids).values_list('id', flat=True))
+    if exercise_ids - known:
+        raise UnknownExerciseError(f"Unknown exercise ids: {sorted(exercise_ids - known)}")
+
+    with transaction.atomic():
+        # Serialises uploads per user, so concurrent batches cannot both create the same rollup row
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk'))
+        seen = set(WorkoutSession.objects.filter(
+            user=user, client_uuid__in=[s['client_uuid'] for s in sessions]
+        ).values_list('client_uuid', flat=True))
+        duplicates = [s['client_uuid'] for s in sessions if s['client_uuid'] in seen]
+
+        plan_ids = set(WorkoutPlan.objects.filter(
+            user=user, id__in={s.get('plan_id') for s in sessions if s.get('plan_id')}
+        ).values_list('id', flat=True))
+
+        new_sessions = []
+        for data in sessions:
+            if data['client_uuid'] in seen:
+                continue
+            seen.add(data['client_uuid'])
+            new_sessions.append((data, WorkoutSession(
+                user=user, client_uuid=data['client_uuid'],
+                plan_id=data.get('plan_id') if data.get('plan_id') in plan_ids else None,
+                performed_on=data['performed_on'], started_at=data.get('started_at'),
+                ended_at=data.get('ended_at'), notes=data.get('notes') or '',
+            )))
+        WorkoutSession.objects.bulk_create([session for _, session in new_sessions])
+
+        set_logs, entries = [], []
+        for data, session in new_sessions:
+            for index, s in enumerate(data['sets'], start=1):
+                set_logs.append(SetLog(session=session, exercise_id=s['exercise_id'], set_index=index,
+                                       reps=s['reps'], weight=s.get('weight') or 0, rpe=s.get('rpe')))
+                entries.append((s['exercise_id'], session.performed_on, s.get('weight') or 0, s['reps']))
+        SetLog.objects.bulk_create(set_logs)
+        new_records = apply_rollups(user.id, entries) if entries else []
+
+    return {
+        "created": [session.client_uuid for _, session in new_sessions],
+        "duplicates": duplicates,
+        "new_records": new_records,
+    }
+
+
+def exercise_progress(user_id: int, exercise_id: int, weeks: int, days: int, today: Optional[date] = None) -> dict:
+    """Daily and weekly series plus the PR for one exercise; reads a bounded number of rollup rows."""
+    today = today or timezone.now().date()
+    daily = list(ExerciseDailyRollup.objects.filter(
+        user_id=user_id, exercise_id=exercise_id, day__gt=today - timedelta(days=days)
+    ).order_by('day').values('day', *ROLLUP_FIELDS))
+    weekly = list(ExerciseWeeklyRollup.objects.filter(
+        user_id=user_id, exercise_id=exercise_id, week_start__gte=week_start(today) - timedelta(weeks=weeks - 1)
+    ).order_by('week_start').values('week_start', *ROLLUP_FIELDS))
+    record = PersonalRecord.objects.filter(user_id=user_id, exercise_id=exercise_id).first()
+    return {"exercise_id": exercise_id, "daily": daily, "weekly": weekly, "personal_record": record}
+
+
+def weekly_volume(user_id: int, weeks: int, today: Optional[date] = None) -> List[dict]:
+    today = today or timezone.now().date()
+    since = week_start(today) - timedelta(weeks=weeks - 1)
+    totals = defaultdict(lambda: {"sets": 0, "volume": 0.0})
+    for start, sets, volume in ExerciseWeeklyRollup.objects.filter(
+        user_id=user_id, week_start__gte=since
+    ).values_list('week_start', 'sets', 'volume'):
+        totals[start]["sets"] += sets
+        totals[start]["volume"] += volume
+    return [{"week_start": start, "sets": t["sets"], "volume": round(t["volume"], 2)}
+            for start, t in sorted(totals.items())]
@@ -0,0 +1,95 @@
+from ninja import Schema, Field
+from typing import List, Optional
+from datetime import date, datetime
+from uuid import UUID
+
+
+class WorkoutPlanSchemaOut(Schema):
+    id: int
+    state: str
+    start_date: date
+    end_date: date
+    week_number: int
+    content: dict
+
+
+class PlanGenerationRequestSchema(Schema):
+    personalize: bool = False
+
+
+class ErrorDetailSchema(Schema):
+    detail: str
+
+
+class SetLogSchemaIn(Schema):
+    exercise_id: int
+    reps: int = Field(..., ge=1, le=1000)
+    weight: float = Field(0, ge=0, le=1000)
+    rpe: Optional[float] = Field(None, ge=0, le=10)
+
+
+class WorkoutSessionSchemaIn(Schema):
+    client_uuid: UUID
+    performed_on: date
+    plan_id: Optional[int] = None
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    notes: str = ""
+    sets: List[SetLogSchemaIn] = Field(..., max_length=200)
+
+
+class SessionBatchSchemaIn(Schema):
+    sessions: List[WorkoutSessionSchemaIn] = Field(..., min_length=1, max_length=50)
+
+
+class PersonalRecordEventSchema(Schema):
+    exercise_id: int
+    kind: str
+    value: float
+    on: date
+
+
+class SessionBatchSchemaOut(Schema):
+    created: List[UUID]
+    duplicates: List[UUID]
+    new_records: List[PersonalRecordEventSchema]
+
+
+class PersonalRecordSchemaOut(Schema):
+    exercise_id: int
+    max_weight: float
+    max_weight_reps: int
+    max_weight_on: Optional[date] = None
+    best_e1rm: Optional[float] = None
+    best_e1rm_on: Optional[date] = None
+
+
+class DailyRollupSchemaOut(Schema):
+    day: date
+    sets: int
+    reps: int
+    volume: float
+    top_weight: float
+    best_e1rm: Optional[float] = None
+
+
+class WeeklyRollupSchemaOut(Schema):
+    week_start: date
+    sets: int
+    reps: int
+    volume: float
+    top_weight: float
+    best_e1rm: Optional[float] = None
+
+
+class ExerciseProgressSchemaOut(Schema):
+    exercise_id: int
+    daily: List[DailyRollupSchemaOut]
+    weekly: List[WeeklyRollupSchemaOut]
+    personal_record: Optional[PersonalRecordSchemaOut] = None
+
+
+class WeeklyVolumeSchemaOut(Schema):
+    week_start: date
+    sets: int
+    volume: float
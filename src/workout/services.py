@@ -0,0 +1,220 @@
+import json
+from datetime import date, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q, Min, Max
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from gymbackend import llm, realtime
+from notifications import outbox
+from .models import WorkoutPlan
+from .templating import ExerciseLibrary, build_weekly_plan
+
+PlanState = WorkoutPlan.PlanState
+
+# A gap longer than this between two plans restarts progressive overload from week 1
+PROGRAM_BREAK_DAYS = 14
+
+
+def activate_user_range(today: date, user_id_from: int, user_id_to: int) -> dict:
+    """Archive and activate the plans of users with ids in [user_id_from, user_id_to), in one transaction."""
+    now = timezone.now()
+    in_range = WorkoutPlan.objects.filter(user_id__gte=user_id_from, user_id__lt=user_id_to)
+    due = in_range.filter(state=PlanState.SCHEDULED, start_date__lte=today)
+    newer_due = WorkoutPlan.objects.filter(
+        user_id=OuterRef('user_id'), state=PlanState.SCHEDULED, start_date__lte=today
+    ).filter(Q(start_date__gt=OuterRef('start_date')) | Q(start_date=OuterRef('start_date'), pk__gt=OuterRef('pk')))
+    has_due = WorkoutPlan.objects.filter(
+        user_id=OuterRef('user_id'), state=PlanState.SCHEDULED, start_date__lte=today
+    )
+
+    with transaction.atomic():
+        # Due plans that were overtaken by a newer due plan are never activated
+        skipped = due.filter(Exists(newer_due)).update(state=PlanState.ARCHIVED, updated_at=now)
+        # The current week is replaced by the incoming one, or simply ran out
+        archived = in_range.filter(state=PlanState.ACTIVE).filter(
+            Q(Exists(has_due)) | Q(end_date__lt=today)
+        ).update(state=PlanState.ARCHIVED, updated_at=now)
+        activating = list(due.values_list('id', 'user_id', 'start_date'))
+        activated = due.update(state=PlanState.ACTIVE, updated_at=now)
+        outbox.enqueue_many(
+            (
+                user_id, "workout_plan_active",
+                {
+                    "title": "Your new workout week is ready",
+                    "body": f"Your plan starting {start_date:%Y-%m-%d} is now active.",
+                    "data": {"workout_plan_id": plan_id},
+                },
+                f"workout_plan_active:{plan_id}",
+            )
+            for plan_id, user_id, start_date in activating
+        )
+
+    return {"activated": activated, "archived": archived + skipped}
+
+
+def due_plan_user_bounds(today: date) -> tuple:
+    """Lowest and highest user id with a plan to activate or archive on `today`, or (None, None)."""
+    bounds = WorkoutPlan.objects.filter(
+        Q(state=PlanState.SCHEDULED, start_date__lte=today) | Q(state=PlanState.ACTIVE, end_date__lt=today)
+    ).aggregate(low=Min('user_id'), high=Max('user_id'))
+    return bounds['low'], bounds['high']
+
+
+def activate_due_workout_plans(today: Optional[date] = None, chunk_size: int = 5000) -> dict:
+    """Archive last week's plans and activate the plans starting today, one user-id range per transaction."""
+    today = today or timezone.now().date()
+    totals = {"activated": 0, "archived": 0}
+    low, high = due_plan_user_bounds(today)
+    if low is None:
+        return totals
+
+    for user_id_from in range(low, high + 1, chunk_size):
+        counts = activate_user_range(today, user_id_from, user_id_from + chunk_size)
+        totals["activated"] += counts["activated"]
+        totals["archived"] += counts["archived"]
+    return totals
+
+
+def _next_week_number(last_end_date: Optional[date], last_week_number: Optional[int], start_date: date) -> int:
+    if last_end_date and last_week_number and (start_date - last_end_date).days <= PROGRAM_BREAK_DAYS:
+        return last_week_number + 1
+    return 1
+
+
+def _publish_plan_ready(plan: WorkoutPlan):
+    realtime.publish(plan.user_id, "workout_plan.ready", {
+        "workout_plan_id": plan.id,
+        "state": plan.state,
+        "start_date": plan.start_date,
+        "week_number": plan.week_number,
+        "personalized": "coach_notes" in plan.content,
+    })
+
+
+def generate_workout_plan(user, library: Optional[ExerciseLibrary] = None) -> WorkoutPlan:
+    """Build the user's next plan from templates: it starts today if nothing is active, otherwise after the active one."""
+    today = timezone.now().date()
+    profile = UserProfile.objects.get(user=user)
+    active = WorkoutPlan.objects.filter(user=user, state=PlanState.ACTIVE).first()
+    start_date = active.end_date + timedelta(days=1) if active else today
+    last = (WorkoutPlan.objects.filter(user=user, start_date__lt=start_date)
+            .order_by('-start_date').values('end_date', 'week_number').first())
+    week_number = _next_week_number(last and last['end_date'], last and last['week_number'], start_date)
+    content = build_weekly_plan(
+        library or ExerciseLibrary.load(), user_id=user.id, goal=profile.goal,
+        fitness_level=profile.fitness_level, week_number=week_number, start_date=start_date
+    )
+
+    try:
+        with transaction.atomic():
+            WorkoutPlan.objects.filter(user=user, state=PlanState.SCHEDULED, start_date__gte=start_date).delete()
+            plan = WorkoutPlan.objects.create(
+                user=user,
+                state=PlanState.SCHEDULED if active else PlanState.ACTIVE,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=settings.WORKOUT_PLAN_ACTIVE_DURATION_DAYS - 1),
+                week_number=week_number,
+                content=content,
+            )
+            transaction.on_commit(lambda: _publish_plan_ready(plan), robust=True)
+    except IntegrityError:
+        if active:
+            raise
+        # A concurrent request created this user's first active plan; both callers asked for it, so return that one
+        return WorkoutPlan.objects.get(user=user, state=PlanState.ACTIVE)
+    return plan
+
+
+def _generate_plans_for_profiles(profiles: list, start_date: date, library: ExerciseLibrary,
+                                 regenerate: bool) -> list:
+    end_date = start_date + timedelta(days=settings.WORKOUT_PLAN_ACTIVE_DURATION_DAYS - 1)
+    user_ids = [user_id for user_id, _, _ in profiles]
+    with transaction.atomic():
+        if regenerate:
+            WorkoutPlan.objects.filter(
+                user_id__in=user_ids, state=PlanState.SCHEDULED, start_date__gte=start_date
+            ).delete()
+        covered = set(
+            WorkoutPlan.objects.filter(user_id__in=user_ids, end_date__gte=start_date)
+            .exclude(state=PlanState.ARCHIVED)
+            .values_list('user_id', flat=True)
+        )
+        history = {
+            row['user_id']: row for row in
+            WorkoutPlan.objects.filter(user_id__in=user_ids, start_date__lt=start_date)
+            .values('user_id').annotate(last_end=Max('end_date'), last_week=Max('week_number'))
+        }
+        plans = []
+        for user_id, goal, fitness_level in profiles:
+            if user_id in covered:
+                continue
+            last = history.get(user_id, {})
+            week_number = _next_week_number(last.get('last_end'), last.get('last_week'), start_date)
+            plans.append(WorkoutPlan(
+                user_id=user_id, state=PlanState.SCHEDULED, start_date=start_date, end_date=end_date,
+                week_number=week_number,
+                content=build_weekly_plan(library, user_id=user_id, goal=goal, fitness_level=fitness_level,
+                                          week_number=week_number, start_date=start_date),
+            ))
+        return WorkoutPlan.objects.bulk_create(plans)
+
+
+def generate_plans_for_all_users(start_date: Optional[date] = None, regenerate: bool = False,
+                                 chunk_size: int = 1000) -> int:
+    """
+    Create a scheduled plan starting on start_date for every active user not already covered by a plan.
+    With regenerate=True, scheduled plans from start_date on are rebuilt (e.g. after template rule changes).
+    """
+    start_date = start_date or timezone.now().date() + timedelta(days=1)
+    library = ExerciseLibrary.load()
+    created_count = 0
+    last_user_id = 0
+
+    while True:
+        profiles = list(
+            UserProfile.objects.filter(user__is_active=True, user_id__gt=last_user_id)
+            .order_by('user_id')
+            .values_list('user_id', 'goal', 'fitness_level')[:chunk_size]
+        )
+        if not profiles:
+            break
+        last_user_id = profiles[-1][0]
+        created_count += len(_generate_plans_for_profiles(profiles, start_date, library, regenerate))
+    return created_count
+
+
+def generate_plans_for_user_range(start_date: date, user_id_from: int, user_id_to: int) -> list:
+    """generate_plans_for_all_users for the users with ids in [user_id_from, user_id_to); returns the new plans."""
+    profiles = list(
+        UserProfile.objects.filter(user__is_active=True, user_id__gte=user_id_from, user_id__lt=user_id_to)
+        .values_list('user_id', 'goal', 'fitness_level')
+    )
+    if not profiles:
+        return []
+    return _generate_plans_for_profiles(profiles, start_date, ExerciseLibrary.load(), regenerate=False)
+
+
+def personalize_workout_plan(plan: WorkoutPlan, batch: bool = False) -> WorkoutPlan:
+    profile = UserProfile.objects.get(user_id=plan.user_id)
+    messages = [
+        {"role": "system", "content": (
+            "You are a certified strength coach. You receive a structured weekly workout plan as JSON. "
+            "Do not change exercises, sets or reps. Reply with short, practical coaching notes for the week "
+            "in plain text, at most 120 words."
+        )},
+        {"role": "user", "content": json.dumps({
+            "sex": profile.sex,
+            "age": profile.age,
+            "goal": profile.goal,
+            "fitness_level": profile.fitness_level,
+            "plan": plan.content,
+        })},
+    ]
+    plan.content = {**plan.content, "coach_notes": llm.chat_completion(messages, batch=batch)}
+    plan.save(update_fields=['content', 'updated_at'])
+    _publish_plan_ready(plan)
+    return plan
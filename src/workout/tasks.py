@@ -0,0 +1,76 @@
+import logging
+from datetime import date, timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from gymbackend import batch_jobs, llm_queues
+from gymbackend.llm import LLMUnavailableError
+from . import services
+from .models import WorkoutPlan
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVATE_PLANS_JOB = "workout.activate_upcoming_workout_plans"
+GENERATE_NEXT_WEEK_JOB = "workout.generate_next_workout_week"
+
+
+def _due_plan_bounds(today):
+    return services.due_plan_user_bounds(date.fromisoformat(today))
+
+
+@batch_jobs.sharded_job(ACTIVATE_PLANS_JOB, bounds=_due_plan_bounds, chunk_size=5000)
+def _activate_plans_range(user_id_from, user_id_to, today):
+    return services.activate_user_range(date.fromisoformat(today), user_id_from, user_id_to)
+
+
+@batch_jobs.sharded_job(GENERATE_NEXT_WEEK_JOB)
+def _generate_next_week_range(user_id_from, user_id_to, start_date):
+    plans = services.generate_plans_for_user_range(date.fromisoformat(start_date), user_id_from, user_id_to)
+    if settings.WORKOUT_PLAN_NIGHTLY_PERSONALIZATION:
+        for plan in plans:
+            llm_queues.enqueue(personalize_workout_plan, plan.id, batch=True)
+    return {"generated": len(plans)}
+
+
+@shared_task(name="workout.tasks.activate_upcoming_workout_plans")
+def activate_upcoming_workout_plans():
+    today = timezone.now().date()
+    shards = batch_jobs.dispatch(ACTIVATE_PLANS_JOB, today=today.isoformat())
+    logger.info("Dispatched %s shards of %s", shards, ACTIVATE_PLANS_JOB,
+                extra={"event": "workout.plan_activation_dispatched", "count": shards})
+    return f"Dispatched {shards} shards."
+
+
+@shared_task(name="workout.tasks.schedule_next_workout_week_generation")
+def schedule_next_workout_week_generation():
+    start_date = timezone.now().date() + timedelta(days=1)
+    shards = batch_jobs.dispatch(GENERATE_NEXT_WEEK_JOB, start_date=start_date.isoformat())
+    logger.info("Dispatched %s shards of %s", shards, GENERATE_NEXT_WEEK_JOB,
+                extra={"event": "workout.plan_generation_dispatched", "count": shards})
+    return f"Dispatched {shards} shards."
+
+
+@shared_task(name="workout.tasks.regenerate_all_workout_plans")
+def regenerate_all_workout_plans(start_date=None):
+    start = date.fromisoformat(start_date) if start_date else None
+    created_count = services.generate_plans_for_all_users(start_date=start, regenerate=True)
+    return f"Regenerated {created_count} plans."
+
+
+@shared_task(bind=True, name="workout.tasks.personalize_workout_plan", max_retries=3, default_retry_delay=60)
+def personalize_workout_plan(self, plan_id, queue=None, enqueued_at=None):
+    if self.request.retries == 0:
+        llm_queues.record_wait(queue, enqueued_at)
+    plan = WorkoutPlan.objects.filter(id=plan_id).first()
+    if not plan:
+        return f"Plan {plan_id} no longer exists."
+    try:
+        services.personalize_workout_plan(plan, batch=queue == llm_queues.BATCH_QUEUE)
+    except LLMUnavailableError as e:
+        return f"Skipped personalization of plan {plan_id}: {e}"
+    except Exception as exc:
+        raise self.retry(exc=exc)
+    return f"Personalized plan {plan_id}."
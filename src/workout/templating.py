@@ -0,0 +1,164 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from .models import Exercise
+
+ENGINE_VERSION = "template-v1"
+
+DEFAULT_GOAL = 'GENERAL_FITNESS'
+DEFAULT_FITNESS_LEVEL = 'BEGINNER'
+
+LEVEL_RANK = {'BEGINNER': 0, 'INTERMEDIATE': 1, 'ADVANCED': 2}
+
+MESOCYCLE_WEEKS = 4  # three build weeks followed by one deload week
+
+# Weekly split per fitness level: (day title, muscle group slots) with the day offsets they land on
+SPLITS = {
+    'BEGINNER': {
+        'day_offsets': [0, 2, 4],
+        'days': [
+            ("Full Body A", ['QUADRICEPS', 'CHEST', 'BACK', 'SHOULDERS', 'CORE']),
+            ("Full Body B", ['HAMSTRINGS', 'BACK', 'CHEST', 'BICEPS', 'CORE']),
+            ("Full Body C", ['GLUTES', 'SHOULDERS', 'BACK', 'TRICEPS', 'CALVES']),
+        ],
+    },
+    'INTERMEDIATE': {
+        'day_offsets': [0, 1, 3, 4],
+        'days': [
+            ("Upper A", ['CHEST', 'BACK', 'SHOULDERS', 'BICEPS', 'TRICEPS']),
+            ("Lower A", ['QUADRICEPS', 'HAMSTRINGS', 'GLUTES', 'CALVES', 'CORE']),
+            ("Upper B", ['BACK', 'CHEST', 'SHOULDERS', 'TRICEPS', 'BICEPS']),
+            ("Lower B", ['HAMSTRINGS', 'QUADRICEPS', 'GLUTES', 'CORE', 'CALVES']),
+        ],
+    },
+    'ADVANCED': {
+        'day_offsets': [0, 1, 2, 3, 4, 5],
+        'days': [
+            ("Push A", ['CHEST', 'SHOULDERS', 'CHEST', 'SHOULDERS', 'TRICEPS']),
+            ("Pull A", ['BACK', 'BACK', 'BICEPS', 'SHOULDERS', 'CORE']),
+            ("Legs A", ['QUADRICEPS', 'HAMSTRINGS', 'GLUTES', 'QUADRICEPS', 'CALVES']),
+            ("Push B", ['SHOULDERS', 'CHEST', 'CHEST', 'TRICEPS', 'TRICEPS']),
+            ("Pull B", ['BACK', 'BACK', 'BICEPS', 'BICEPS', 'CORE']),
+            ("Legs B", ['HAMSTRINGS', 'QUADRICEPS', 'GLUTES', 'CALVES', 'CORE']),
+        ],
+    },
+}
+
+
+@dataclass(frozen=True)
+class RepScheme:
+    sets: int
+    reps_low: int
+    reps_high: int
+    rest_seconds: int
+    intensity: float  # fraction of estimated 1RM
+
+
+GOAL_SCHEMES = {
+    'MUSCLE_GAIN': RepScheme(sets=4, reps_low=8, reps_high=12, rest_seconds=90, intensity=0.70),
+    'STRENGTH_TRAINING': RepScheme(sets=5, reps_low=3, reps_high=5, rest_seconds=180, intensity=0.82),
+    'WEIGHT_LOSS': RepScheme(sets=3, reps_low=12, reps_high=15, rest_seconds=45, intensity=0.60),
+    'ENDURANCE': RepScheme(sets=3, reps_low=15, reps_high=20, rest_seconds=30, intensity=0.55),
+    'GENERAL_FITNESS': RepScheme(sets=3, reps_low=10, reps_high=12, rest_seconds=60, intensity=0.65),
+}
+
+
+class ExerciseLibrary:
+    """In-memory index of active exercises by muscle group, equipment and difficulty, loaded with one query."""
+
+    def __init__(self, exercises: Iterable[dict]):
+        self._by_muscle: Dict[str, List[dict]] = defaultdict(list)
+        for exercise in exercises:
+            self._by_muscle[exercise['muscle_group']].append(exercise)
+        for candidates in self._by_muscle.values():
+            candidates.sort(key=lambda e: (not e['is_compound'], e['id']))
+        self._candidates_cache: Dict[tuple, List[dict]] = {}
+
+    @classmethod
+    def load(cls) -> "ExerciseLibrary":
+        return cls(Exercise.objects.filter(is_active=True).values(
+            'id', 'name', 'muscle_group', 'equipment', 'difficulty', 'is_compound'
+        ))
+
+    def candidates(self, muscle_group: str, fitness_level: str, equipment: Optional[frozenset] = None) -> List[dict]:
+        key = (muscle_group, fitness_level, equipment)
+        if key not in self._candidates_cache:
+            max_rank = LEVEL_RANK.get(fitness_level, 0)
+            self._candidates_cache[key] = [
+                e for e in self._by_muscle.get(muscle_group, [])
+                if LEVEL_RANK[e['difficulty']] <= max_rank and (equipment is None or e['equipment'] in equipment)
+            ]
+        return self._candidates_cache[key]
+
+
+def _prescription(scheme: RepScheme, is_compound: bool, week_number: int) -> dict:
+    position = (week_number - 1) % MESOCYCLE_WEEKS
+    mesocycle = (week_number - 1) // MESOCYCLE_WEEKS
+    base_intensity = scheme.intensity + min(mesocycle, 4) * 0.01
+
+    if position == MESOCYCLE_WEEKS - 1:
+        return {
+            "sets": max(2, scheme.sets - 1),
+            "reps": scheme.reps_low,
+            "rest_seconds": scheme.rest_seconds,
+            "intensity": round(base_intensity * 0.85, 3),
+        }
+
+    # Double progression: reps climb through the range, load climbs 2.5% per week
+    reps_step = (scheme.reps_high - scheme.reps_low) / 2
+    return {
+        "sets": scheme.sets + (1 if position == 2 and is_compound else 0),
+        "reps": scheme.reps_low + round(reps_step * position),
+        "rest_seconds": scheme.rest_seconds,
+        "intensity": round(base_intensity + 0.025 * position, 3),
+    }
+
+
+def build_weekly_plan(library: ExerciseLibrary, *, user_id: int, goal: Optional[str], fitness_level: Optional[str],
+                      week_number: int, start_date: date, equipment: Optional[frozenset] = None) -> dict:
+    goal = goal if goal in GOAL_SCHEMES else DEFAULT_GOAL
+    fitness_level = fitness_level if fitness_level in SPLITS else DEFAULT_FITNESS_LEVEL
+    scheme = GOAL_SCHEMES[goal]
+    split = SPLITS[fitness_level]
+    mesocycle = (week_number - 1) // MESOCYCLE_WEEKS
+
+    days = []
+    for day_index, ((title, slots), offset) in enumerate(zip(split['days'], split['day_offsets'])):
+        used_ids = set()
+        exercises = []
+        for slot_index, muscle_group in enumerate(slots):
+            candidates = library.candidates(muscle_group, fitness_level, equipment)
+            if not candidates:
+                continue
+            # Exercise choice rotates per user and per mesocycle, but stays fixed within one so load can progress
+            seed = user_id + mesocycle + day_index * 7 + slot_index
+            for attempt in range(len(candidates)):
+                exercise = candidates[(seed + attempt) % len(candidates)]
+                if exercise['id'] not in used_ids:
+                    break
+            else:
+                continue
+            used_ids.add(exercise['id'])
+            exercises.append({
+                "exercise_id": exercise['id'],
+                "name": exercise['name'],
+                "muscle_group": exercise['muscle_group'],
+                "equipment": exercise['equipment'],
+                **_prescription(scheme, exercise['is_compound'], week_number),
+            })
+        days.append({
+            "date": (start_date + timedelta(days=offset)).isoformat(),
+            "title": title,
+            "exercises": exercises,
+        })
+
+    return {
+        "engine": ENGINE_VERSION,
+        "goal": goal,
+        "fitness_level": fitness_level,
+        "week_number": week_number,
+        "phase": "deload" if (week_number - 1) % MESOCYCLE_WEEKS == MESOCYCLE_WEEKS - 1 else "build",
+        "days": days,
+    }
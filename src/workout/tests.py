@@ -1 +1,290 @@
-from django.test import TestCase
\ No newline at end of file
+import json
+import time
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import date, timedelta
+
+from gymbackend import batch_jobs, llm, llm_queues
+from gymbackend.celery import app as celery_app
+from gymbackend.semaphore import SemaphoreTimeout, hold_slot
+from notifications.models import NotificationOutbox
+from subscription.models import PlanTier, UserSubscription
+from . import tasks
+from .models import Exercise, WorkoutPlan, ExerciseDailyRollup, ExerciseWeeklyRollup, PersonalRecord
+from .progress import estimated_one_rep_max
+from .services import activate_due_workout_plans, generate_plans_for_all_users, generate_workout_plan
+from .templating import ExerciseLibrary, build_weekly_plan
+
+User = get_user_model()
+PlanState = WorkoutPlan.PlanState
+
+
+class WorkoutPlanActivationTests(TestCase):
+    def setUp(self):
+        self.today = date(2025, 6, 9)
+        self.user = User.objects.create_user(
+            email="planner@example.com", username="planner", name="Plan", family_name="User",
+            password="SecurePassword123!"
+        )
+
+    def _plan(self, state, start_offset, user=None):
+        start_date = self.today + timedelta(days=start_offset)
+        return WorkoutPlan.objects.create(
+            user=user or self.user, state=state, start_date=start_date, end_date=start_date + timedelta(days=6)
+        )
+
+    def test_new_week_replaces_previous_week(self):
+        previous = self._plan(PlanState.ACTIVE, -7)
+        upcoming = self._plan(PlanState.SCHEDULED, 0)
+        future = self._plan(PlanState.SCHEDULED, 7)
+
+        counts = activate_due_workout_plans(today=self.today)
+
+        self.assertEqual(counts, {"activated": 1, "archived": 1})
+        previous.refresh_from_db()
+        upcoming.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual(previous.state, PlanState.ARCHIVED)
+        self.assertEqual(upcoming.state, PlanState.ACTIVE)
+        self.assertEqual(future.state, PlanState.SCHEDULED)
+        self.assertEqual(
+            NotificationOutbox.objects.get().payload["data"], {"workout_plan_id": upcoming.id}
+        )
+
+    def test_nightly_task_activates_plans_through_sharded_job(self):
+        cache.clear()
+        other = User.objects.create_user(email="other@example.com", username="other", name="Other",
+                                         family_name="User", password=None)
+        self.today = timezone.now().date()
+        plans = [self._plan(PlanState.SCHEDULED, 0), self._plan(PlanState.SCHEDULED, 0, user=other)]
+
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+        self.assertEqual(tasks.activate_upcoming_workout_plans(), "Dispatched 2 shards.")
+
+        self.assertEqual({plan.state for plan in WorkoutPlan.objects.filter(id__in=[p.id for p in plans])},
+                         {PlanState.ACTIVE})
+        self.assertEqual([shard["counts"] for shard in
+                          batch_jobs.progress(tasks.ACTIVATE_PLANS_JOB)["shards"]], [{"activated": 1, "archived": 0}] * 2)
+
+    def test_only_latest_due_plan_is_activated(self):
+        missed = self._plan(PlanState.SCHEDULED, -7)
+        latest = self._plan(PlanState.SCHEDULED, -1)
+
+        activate_due_workout_plans(today=self.today)
+
+        missed.refresh_from_db()
+        latest.refresh_from_db()
+        self.assertEqual(missed.state, PlanState.ARCHIVED)
+        self.assertEqual(latest.state, PlanState.ACTIVE)
+
+    def test_expired_plan_without_replacement_is_archived(self):
+        expired = self._plan(PlanState.ACTIVE, -10)
+        current = self._plan(PlanState.ACTIVE, -2, user=User.objects.create_user(
+            email="other@example.com", username="other", name="Other", family_name="User", password="pw"
+        ))
+
+        counts = activate_due_workout_plans(today=self.today, chunk_size=1)
+
+        self.assertEqual(counts, {"activated": 0, "archived": 1})
+        expired.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(expired.state, PlanState.ARCHIVED)
+        self.assertEqual(current.state, PlanState.ACTIVE)
+
+
+class WorkoutTemplateEngineTests(TestCase):
+    def setUp(self):
+        self.library = ExerciseLibrary.load()
+        self.start_date = date(2025, 6, 9)
+
+    def _build(self, **kwargs):
+        options = dict(user_id=1, goal='MUSCLE_GAIN', fitness_level='INTERMEDIATE', week_number=1,
+                       start_date=self.start_date)
+        options.update(kwargs)
+        return build_weekly_plan(self.library, **options)
+
+    def test_split_follows_fitness_level(self):
+        self.assertEqual(len(self._build(fitness_level='BEGINNER')["days"]), 3)
+        self.assertEqual(len(self._build(fitness_level='INTERMEDIATE')["days"]), 4)
+        self.assertEqual(len(self._build(fitness_level='ADVANCED')["days"]), 6)
+
+    def test_plan_is_deterministic_and_level_appropriate(self):
+        plan = self._build(fitness_level='BEGINNER')
+        self.assertEqual(plan, self._build(fitness_level='BEGINNER'))
+        exercise_ids = [e["exercise_id"] for day in plan["days"] for e in day["exercises"]]
+        self.assertTrue(exercise_ids)
+        self.assertFalse(Exercise.objects.filter(id__in=exercise_ids).exclude(difficulty='BEGINNER').exists())
+
+    def test_progressive_overload_and_deload(self):
+        week1 = self._build(week_number=1)["days"][0]["exercises"][0]
+        week2 = self._build(week_number=2)["days"][0]["exercises"][0]
+        week4 = self._build(week_number=4)
+        self.assertGreater(week2["intensity"], week1["intensity"])
+        self.assertGreater(week2["reps"], week1["reps"])
+        self.assertEqual(week4["phase"], "deload")
+        self.assertLess(week4["days"][0]["exercises"][0]["intensity"], week1["intensity"])
+
+    def test_generate_plans_for_all_users(self):
+        users = [
+            User.objects.create_user(email=f"bulk{i}@example.com", username=f"bulk{i}", name="Bulk",
+                                     family_name="User", password="pw")
+            for i in range(3)
+        ]
+        WorkoutPlan.objects.create(user=users[0], state=PlanState.ACTIVE, start_date=self.start_date,
+                                   end_date=self.start_date + timedelta(days=13))
+        WorkoutPlan.objects.create(user=users[1], state=PlanState.ACTIVE, week_number=3,
+                                   start_date=self.start_date - timedelta(days=7),
+                                   end_date=self.start_date - timedelta(days=1))
+
+        created = generate_plans_for_all_users(start_date=self.start_date, chunk_size=2)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(WorkoutPlan.objects.get(user=users[1], state=PlanState.SCHEDULED).week_number, 4)
+        self.assertEqual(WorkoutPlan.objects.get(user=users[2]).week_number, 1)
+        self.assertEqual(generate_plans_for_all_users(start_date=self.start_date), 0)
+        self.assertEqual(generate_plans_for_all_users(start_date=self.start_date, regenerate=True), 2)
+        self.assertEqual(WorkoutPlan.objects.filter(state=PlanState.SCHEDULED).count(), 2)
+
+    def test_generate_workout_plan_follows_active_plan(self):
+        user = User.objects.create_user(email="single@example.com", username="single", name="Single",
+                                        family_name="User", password="pw")
+        first = generate_workout_plan(user)
+        second = generate_workout_plan(user)
+        self.assertEqual(first.state, PlanState.ACTIVE)
+        self.assertEqual(second.state, PlanState.SCHEDULED)
+        self.assertEqual(second.start_date, first.end_date + timedelta(days=1))
+        self.assertEqual(second.week_number, 2)
+
+    def test_concurrent_first_plan_returns_the_plan_that_won(self):
+        user = User.objects.create_user(email="racer@example.com", username="racer", name="Race",
+                                        family_name="User", password=None)
+        winner = []
+
+        def build_after_a_concurrent_request(*args, **kwargs):
+            content = build_weekly_plan(*args, **kwargs)
+            if not winner:
+                winner.append(None)
+                winner[0] = generate_workout_plan(user)
+            return content
+
+        with mock.patch("workout.services.build_weekly_plan", side_effect=build_after_a_concurrent_request):
+            plan = generate_workout_plan(user)
+
+        self.assertEqual(plan, winner[0])
+        self.assertEqual(plan.state, PlanState.ACTIVE)
+        self.assertEqual(WorkoutPlan.objects.filter(user=user).count(), 1)
+
+
+class WorkoutProgressTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            email="lifter@example.com", username="lifter", name="Lift", family_name="User",
+            password="SecurePassword123!"
+        )
+        token_response = self.client.post(
+            "/api/token/pair",
+            data=json.dumps({"email": "lifter@example.com", "password": "SecurePassword123!"}),
+            content_type="application/json"
+        )
+        self.auth_headers = {"HTTP_AUTHORIZATION": f"Bearer {token_response.json()['access']}"}
+        self.squat, self.row = Exercise.objects.order_by('id')[:2]
+
+    def _upload(self, sessions):
+        return self.client.post("/api/workouts/sessions/batch", data=json.dumps({"sessions": sessions}),
+                                content_type="application/json", **self.auth_headers)
+
+    def _session(self, performed_on, sets):
+        return {
+            "client_uuid": str(uuid.uuid4()),
+            "performed_on": performed_on.isoformat(),
+            "sets": [{"exercise_id": exercise.id, "reps": reps, "weight": weight} for exercise, reps, weight in sets],
+        }
+
+    def test_batch_upload_maintains_rollups_and_records(self):
+        monday = date(2025, 6, 9)
+        first = self._session(monday, [(self.squat, 5, 100), (self.squat, 5, 100), (self.row, 10, 60)])
+        second = self._session(monday + timedelta(days=2), [(self.squat, 3, 110)])
+
+        response = self._upload([first, second])
+        self.assertEqual(response.status_code, 200, response.content.decode())
+        self.assertEqual(len(response.json()["created"]), 2)
+
+        weekly = ExerciseWeeklyRollup.objects.get(exercise=self.squat, week_start=monday)
+        self.assertEqual((weekly.sets, weekly.reps, weekly.volume, weekly.top_weight), (3, 13, 1330, 110))
+        self.assertEqual(ExerciseDailyRollup.objects.filter(exercise=self.squat).count(), 2)
+        record = PersonalRecord.objects.get(exercise=self.squat)
+        self.assertEqual((record.max_weight, record.max_weight_on), (110, monday + timedelta(days=2)))
+        self.assertEqual(record.best_e1rm, estimated_one_rep_max(110, 3))
+
+        # An offline client re-sending the same batch must not double count
+        retry = self._upload([first, second]).json()
+        self.assertEqual((retry["created"], len(retry["duplicates"])), ([], 2))
+        self.assertEqual(ExerciseWeeklyRollup.objects.get(exercise=self.squat, week_start=monday).sets, 3)
+
+    def test_progress_endpoints_read_rollups(self):
+        today = timezone.now().date()
+        self._upload([self._session(today, [(self.squat, 5, 100)])])
+        self._upload([self._session(today, [(self.squat, 5, 105)])])
+
+        data = self.client.get(f"/api/workouts/progress/exercises/{self.squat.id}", **self.auth_headers).json()
+        self.assertEqual(data["weekly"][-1]["sets"], 2)
+        self.assertEqual(data["daily"][-1]["volume"], 1025)
+        self.assertEqual(data["personal_record"]["max_weight"], 105)
+
+        volume = self.client.get("/api/workouts/progress/volume", **self.auth_headers).json()
+        self.assertEqual(volume[-1]["volume"], 1025)
+
+        response = self._upload([self._session(today, [(Exercise(id=999999), 5, 100)])])
+        self.assertEqual(response.status_code, 400)
+
+
+class LLMQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="coachme@example.com", username="coachme", name="Coach", family_name="Me", password="pw"
+        )
+
+    def test_routes_follow_subscription_tier(self):
+        self.assertEqual(llm_queues.route_for(self.user.id), llm_queues.LLMRoute(llm_queues.STANDARD_QUEUE, 0))
+        self.assertEqual(llm_queues.route_for(self.user.id, batch=True).queue, llm_queues.BATCH_QUEUE)
+
+        gold = PlanTier.objects.create(name="Gold", price=100, priority=5)
+        UserSubscription.objects.create(
+            user=self.user, plan_tier=gold, status=UserSubscription.SubscriptionStatus.ACTIVE,
+            start_date=timezone.now(), expire_date=timezone.now() + timedelta(days=30)
+        )
+        route = llm_queues.route_for(self.user.id)
+        self.assertEqual((route.queue, route.broker_priority), (llm_queues.PREMIUM_QUEUE, 4))
+
+        with mock.patch.object(tasks.personalize_workout_plan, "apply_async") as apply_async:
+            llm_queues.enqueue(tasks.personalize_workout_plan, 42, user_id=self.user.id)
+        options = apply_async.call_args.kwargs
+        self.assertEqual((options["queue"], options["priority"], options["args"]), (llm_queues.PREMIUM_QUEUE, 4, (42,)))
+        self.assertEqual(options["kwargs"]["queue"], llm_queues.PREMIUM_QUEUE)
+
+    @override_settings(OPENROUTER_API_KEY="test", LLM_MAX_CONCURRENCY=2, LLM_INTERACTIVE_RESERVED_SLOTS=1,
+                       LLM_SLOT_WAIT_SECONDS=0)
+    def test_batch_calls_leave_interactive_slots_free(self):
+        client = mock.Mock()
+        client.chat.completions.create.return_value.choices = [mock.Mock(message=mock.Mock(content="ok"))]
+        with mock.patch.object(llm, "get_client", return_value=client), \
+                hold_slot(llm.get_llm_semaphore(), limit=2, wait_seconds=0):
+            with self.assertRaises(SemaphoreTimeout):
+                llm.chat_completion([], batch=True)
+            self.assertEqual(llm.chat_completion([]), "ok")
+        self.assertEqual(llm.get_llm_semaphore().in_use(), 0)
+
+    def test_wait_times_are_reported_per_queue(self):
+        for waited in (0.5, 1.0, 4.0):
+            llm_queues.record_wait(llm_queues.BATCH_QUEUE, time.time() - waited)
+        with mock.patch.object(llm_queues, "queue_depths", return_value=dict.fromkeys(llm_queues.LLM_QUEUES, 0)):
+            stats = llm_queues.queue_stats()[llm_queues.BATCH_QUEUE]
+        self.assertEqual(stats["samples"], 3)
+        self.assertAlmostEqual(stats["wait_p95"], 4.0, places=1)